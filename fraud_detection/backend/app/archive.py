@@ -0,0 +1,306 @@
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.models import ArchivedCount, Transaction, User
+
+logger = logging.getLogger(__name__)
+
+# Column -> storage kind in the .npz partitions
+COLUMNS = {
+    "id": "int",
+    "user_id": "int",
+    "amount": "float",
+    "merchant": "str",
+    "category": "str",
+    "hour": "int",
+    "user_age": "int",
+    "description": "nullable_str",
+    "is_fraud": "bool",
+    "fraud_probability": "float",
+    "confidence_score": "float",
+    "risk_level": "str",
+    "model_version": "nullable_str",
+    "created_at": "datetime",
+    "processed_at": "datetime",
+    "feedback_correct": "nullable_bool",
+    "feedback_notes": "nullable_str",
+    "feedback_date": "datetime",
+}
+
+_PARTITION_RE = re.compile(r"^date=(\d{4}-\d{2}-\d{2})$")
+
+
+# ---------- Writing ----------
+def _encode(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    arrays = {}
+    for name, kind in COLUMNS.items():
+        values = [row[name] for row in rows]
+        if kind == "int":
+            arrays[name] = np.asarray(values, dtype=np.int64)
+        elif kind == "float":
+            arrays[name] = np.asarray(values, dtype=np.float64)
+        elif kind == "bool":
+            arrays[name] = np.asarray(values, dtype=bool)
+        elif kind == "str":
+            arrays[name] = np.asarray(values, dtype=np.str_)
+        elif kind == "nullable_str":
+            arrays[name] = np.asarray(["" if v is None else v for v in values], dtype=np.str_)
+            arrays[f"{name}__null"] = np.asarray([v is None for v in values], dtype=bool)
+        elif kind == "nullable_bool":
+            arrays[name] = np.asarray([-1 if v is None else int(v) for v in values], dtype=np.int8)
+        elif kind == "datetime":
+            arrays[name] = np.asarray(
+                [np.datetime64("NaT") if v is None else np.datetime64(v, "us") for v in values],
+                dtype="datetime64[us]"
+            )
+    return arrays
+
+
+def _write_partition(archive_dir: str, day: str, rows: List[Dict[str, Any]]):
+    partition = os.path.join(archive_dir, f"date={day}")
+    os.makedirs(partition, exist_ok=True)
+    # Named by the batch's id range, so parts never collide
+    path = os.path.join(partition, f"part-{rows[0]['id']:012d}-{rows[-1]['id']:012d}.npz")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **_encode(rows))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _archived_ids(archive_dir: str, day: str) -> Set[int]:
+    partition = os.path.join(archive_dir, f"date={day}")
+    if not os.path.isdir(partition):
+        return set()
+    ids: Set[int] = set()
+    for name in os.listdir(partition):
+        if name.endswith(".npz"):
+            # Members load lazily, so this reads only the id column
+            with np.load(os.path.join(partition, name), allow_pickle=False) as data:
+                ids.update(data["id"].tolist())
+    return ids
+
+
+def _add_counts(conn: Connection, rows: List[Dict[str, Any]]):
+    counts: Dict[Tuple, int] = defaultdict(int)
+    for row in rows:
+        day = row["created_at"].strftime("%Y-%m-%d")
+        counts[(row["user_id"], day, row["merchant"], row["category"], bool(row["is_fraud"]))] += 1
+    if not counts:
+        return
+    conn.execute(
+        text(
+            "INSERT INTO archived_counts (user_id, day, merchant, category, is_fraud, count) "
+            "VALUES (:user_id, :day, :merchant, :category, :is_fraud, :count) "
+            "ON CONFLICT(user_id, day, merchant, category, is_fraud) DO UPDATE SET count = count + excluded.count"
+        ),
+        [
+            {"user_id": user_id, "day": day, "merchant": merchant, "category": category, "is_fraud": is_fraud, "count": n}
+            for (user_id, day, merchant, category, is_fraud), n in counts.items()
+        ]
+    )
+
+
+def archive_transactions(engine: Engine, archive_dir: str, older_than_days: int, batch_size: int = 5000) -> int:
+    """Move transactions older than the cutoff into date-partitioned .npz files.
+
+    Batches never span days, so each one becomes a single part file. A batch
+    is written (and fsync'd) before its rows are deleted and counted in the
+    same database transaction that read them. Rows a crashed run already
+    wrote are only deleted on the next run, not archived twice.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    table = Transaction.__table__
+
+    ArchivedCount.__table__.create(engine, checkfirst=True)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_created_at ON transactions (created_at)"))
+        if not conn.execute(select(func.count()).select_from(ArchivedCount.__table__)).scalar():
+            _rebuild_counts(conn, archive_dir)
+
+    moved = 0
+    # Ids already in the current day's partition, read once per day (batches go day by day)
+    day, done = None, set()
+    while True:
+        with engine.begin() as conn:
+            oldest = conn.execute(select(func.min(table.c.created_at)).where(table.c.created_at < cutoff)).scalar()
+            if oldest is None:
+                break
+            day_start = datetime.combine(oldest.date(), datetime.min.time())
+            day_end = min(day_start + timedelta(days=1), cutoff)
+            rows = [dict(row) for row in conn.execute(
+                select(table)
+                .where(table.c.created_at >= day_start, table.c.created_at < day_end)
+                .order_by(table.c.id).limit(batch_size)
+            ).mappings()]
+
+            if day != day_start.strftime("%Y-%m-%d"):
+                day = day_start.strftime("%Y-%m-%d")
+                done = _archived_ids(archive_dir, day)
+            new_rows = [row for row in rows if row["id"] not in done]
+            if new_rows:
+                _write_partition(archive_dir, day, new_rows)
+                done.update(row["id"] for row in new_rows)
+
+            conn.execute(table.delete().where(table.c.id.in_([row["id"] for row in rows])))
+            _add_counts(conn, rows)
+        moved += len(rows)
+        logger.info(f"Archived {moved} transactions so far")
+
+    return moved
+
+
+def _rebuild_counts(conn: Connection, archive_dir: str):
+    """Count partitions written before archived_counts existed.
+
+    Shards share the archive directory, so only this database's users count.
+    """
+    table = Transaction.__table__
+    users = set(conn.execute(select(User.__table__.c.id)).scalars())
+    for day in archived_days(archive_dir):
+        columns = load_archived(archive_dir, day, day)
+        if not columns:
+            continue
+        day_start = datetime.combine(day, datetime.min.time())
+        # Rows still hot (a crashed run) are counted when they are deleted
+        hot = set(conn.execute(select(table.c.id).where(
+            table.c.created_at >= day_start, table.c.created_at < day_start + timedelta(days=1)
+        )).scalars())
+        _add_counts(conn, [
+            {"user_id": user_id, "created_at": created_at.astype(datetime), "merchant": str(merchant),
+             "category": str(category), "is_fraud": is_fraud}
+            for id_, user_id, created_at, merchant, category, is_fraud in zip(
+                columns["id"].tolist(), columns["user_id"].tolist(), columns["created_at"],
+                columns["merchant"], columns["category"], columns["is_fraud"].tolist()
+            )
+            if user_id in users and id_ not in hot
+        ])
+
+
+# ---------- Reading ----------
+def archived_days(archive_dir: str) -> List[date]:
+    if not os.path.isdir(archive_dir):
+        return []
+    days = []
+    for name in os.listdir(archive_dir):
+        match = _PARTITION_RE.match(name)
+        if match:
+            days.append(date.fromisoformat(match.group(1)))
+    return sorted(days)
+
+
+def archived_counts(
+    db: Session,
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    merchant: Optional[str] = None,
+    category: Optional[str] = None,
+    is_fraud: Optional[bool] = None,
+) -> List[Tuple[date, int]]:
+    """(day, matching archived rows) for a user, newest day first, without opening partitions."""
+    query = db.query(ArchivedCount.day, func.sum(ArchivedCount.count)).filter(ArchivedCount.user_id == user_id)
+    if start_date:
+        query = query.filter(ArchivedCount.day >= start_date.isoformat())
+    if end_date:
+        query = query.filter(ArchivedCount.day <= end_date.isoformat())
+    if merchant:
+        query = query.filter(ArchivedCount.merchant.ilike(f"%{merchant}%"))
+    if category:
+        query = query.filter(ArchivedCount.category == category)
+    if is_fraud is not None:
+        query = query.filter(ArchivedCount.is_fraud == is_fraud)
+    rows = query.group_by(ArchivedCount.day).order_by(ArchivedCount.day.desc()).all()
+    return [(date.fromisoformat(day), count) for day, count in rows]
+
+
+def needs_archive(archive_dir: str, start_date: Optional[date]) -> bool:
+    """Whether a query starting at start_date reaches into archived days."""
+    days = archived_days(archive_dir)
+    return bool(days) and (start_date is None or start_date <= days[-1])
+
+
+def load_archived(
+    archive_dir: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user_id: Optional[int] = None,
+    merchant: Optional[str] = None,
+    category: Optional[str] = None,
+    is_fraud: Optional[bool] = None,
+) -> Dict[str, np.ndarray]:
+    """Filtered archived columns, deduped by id, newest first (created_at, then id)."""
+    parts = []
+    for day in archived_days(archive_dir):
+        if (start_date and day < start_date) or (end_date and day > end_date):
+            continue
+        partition = os.path.join(archive_dir, f"date={day.isoformat()}")
+        for name in sorted(os.listdir(partition)):
+            if not name.endswith(".npz"):
+                continue
+            with np.load(os.path.join(partition, name), allow_pickle=False) as data:
+                columns = {key: data[key] for key in data.files}
+            _fill_missing_columns(columns)
+
+            mask = np.ones(len(columns["id"]), dtype=bool)
+            if user_id is not None:
+                mask &= columns["user_id"] == user_id
+            if merchant:
+                mask &= np.char.find(np.char.lower(columns["merchant"]), merchant.lower()) >= 0
+            if category:
+                mask &= columns["category"] == category
+            if is_fraud is not None:
+                mask &= columns["is_fraud"] == is_fraud
+            if mask.any():
+                parts.append({key: value[mask] for key, value in columns.items()})
+
+    if not parts:
+        return {}
+    merged = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    _, first = np.unique(merged["id"], return_index=True)
+    order = first[np.lexsort((merged["id"][first], merged["created_at"][first]))[::-1]]
+    return {key: value[order] for key, value in merged.items()}
+
+
+def _fill_missing_columns(columns: Dict[str, np.ndarray]):
+    """Partitions written before a nullable column existed read it as all-null."""
+    n = len(columns["id"])
+    for name, kind in COLUMNS.items():
+        if name not in columns and kind == "nullable_str":
+            columns[name] = np.full(n, "", dtype=np.str_)
+            columns[f"{name}__null"] = np.ones(n, dtype=bool)
+
+
+def to_rows(columns: Dict[str, np.ndarray], start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Decode a slice of archived columns back into plain row dicts."""
+    if not columns:
+        return []
+    stop = len(columns["id"]) if stop is None else min(stop, len(columns["id"]))
+    rows = []
+    for i in range(start, stop):
+        row = {}
+        for name, kind in COLUMNS.items():
+            value = columns[name][i]
+            if kind in ("int", "float", "bool"):
+                value = value.item()
+            elif kind == "str":
+                value = str(value)
+            elif kind == "nullable_str":
+                value = None if columns[f"{name}__null"][i] else str(value)
+            elif kind == "nullable_bool":
+                value = None if value < 0 else bool(value)
+            elif kind == "datetime":
+                value = None if np.isnat(value) else value.astype(datetime)
+            row[name] = value
+        rows.append(row)
+    return rows
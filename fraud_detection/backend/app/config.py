@@ -17,4 +17,89 @@ class Settings(BaseSettings):
     # Model path
     MODEL_PATH: str = os.getenv("MODEL_PATH", "fraud_model.joblib")
 
+    # Full model backend: "sklearn" (StandardScaler + RandomForest pipeline at the
+    # loader's MODEL_PATH) or "xgboost" (hist-trained booster scored with inplace_predict)
+    MODEL_BACKEND: str = "sklearn"
+    XGBOOST_MODEL_PATH: str = "fraud_model.ubj"
+    XGBOOST_NTHREAD: int = 1  # threads per prediction call; 1 suits one-row requests across workers
+
+    # Two-stage cascade: a small screening model scores first and only
+    # probabilities inside [CASCADE_LOW, CASCADE_HIGH] go to the full forest
+    CASCADE_ENABLED: bool = False
+    CASCADE_LOW: float = 0.1
+    CASCADE_HIGH: float = 0.9
+    SCREENING_MODEL_PATH: str = "screening_model.joblib"  # relative to the forest model's directory
+
+    # Out-of-process inference: when set, API workers score through the sidecar
+    # (serve_inference.py) on this Unix socket and never load the model or
+    # import sklearn/pandas themselves. Empty keeps the model in-process.
+    INFERENCE_SOCKET_PATH: str = ""
+    INFERENCE_CONNECTIONS: int = 8  # sockets each API worker keeps open
+    INFERENCE_TIMEOUT: float = 5.0  # seconds per request
+    INFERENCE_WORKERS: int = 2  # sidecar processes, each holding one model copy
+    INFERENCE_BATCH_MAX_ROWS: int = 256
+    INFERENCE_BATCH_WAIT_MS: float = 2.0  # how long a batch waits to fill
+
+    # Streaming scoring (/fraud/stream, /fraud/predict/stream)
+    STREAM_BATCH_SIZE: int = 64  # transactions scored and billed together
+    STREAM_MAX_INFLIGHT: int = 256  # received but unscored messages before we stop reading
+
+    # Idempotency-Key support for /fraud/predict and /fraud/credits/purchase
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_EVICT_INTERVAL: float = 300.0  # seconds between expired-key sweeps
+
+    # Conditional GET for dashboard polling endpoints: responses are cached in
+    # memory per data version, the TTL bounds staleness of time-windowed data
+    RESPONSE_CACHE_TTL: float = 5.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10_000
+
+    # Write-behind persistence for /fraud/predict: rows are journaled locally and
+    # group-committed by a background writer instead of one commit per request.
+    # Each worker process journals to write_behind.<pid>.journal next to this path.
+    WRITE_BEHIND_ENABLED: bool = False
+    WRITE_BEHIND_JOURNAL_PATH: str = "write_behind.journal"
+    WRITE_BEHIND_BATCH_SIZE: int = 500
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.05  # seconds
+    WRITE_BEHIND_MAX_ATTEMPTS: int = 5  # tries for an isolated failing row before dead-lettering it
+    WRITE_BEHIND_MAX_BACKOFF: float = 5.0  # seconds, cap for retry backoff
+
+    # User-sharded storage: users and everything they own are hash-partitioned
+    # across SHARD_COUNT SQLite files so predict commits for different users
+    # don't serialize on one lock. SQLALCHEMY_DATABASE_URL then holds only the
+    # user directory, id blocks and global state. 0 disables sharding.
+    SHARD_COUNT: int = 0
+    SHARD_PATH_TEMPLATE: str = "fraud_app.shard{index}-of-{count}.db"
+    SHARD_ID_BLOCK_SIZE: int = 1000  # transaction ids reserved per directory round-trip
+
+    # How often each worker publishes its drift sketches for the admin report
+    DRIFT_PUBLISH_INTERVAL: float = 30.0  # seconds
+    DRIFT_SKETCH_TTL: float = 86400.0  # seconds; sketches of workers that stopped publishing are dropped
+
+    # Analytics rollups: hourly buckets older than this are folded into daily ones
+    ROLLUP_HOURLY_RETENTION_DAYS: int = 7
+    ROLLUP_COMPACT_INTERVAL: float = 3600.0  # seconds
+
+    # Rate limiting (token buckets: rate is tokens/second, burst is bucket size)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_TRUST_PROXY: bool = False  # key IPs on X-Forwarded-For (behind a proxy)
+    PREDICT_USER_RATE: float = 5.0
+    PREDICT_USER_BURST: int = 20
+    PREDICT_IP_RATE: float = 20.0
+    PREDICT_IP_BURST: int = 50
+    LOGIN_IP_RATE: float = 1.0
+    LOGIN_IP_BURST: int = 10
+
+    # Admission control: concurrent requests, requests allowed to wait, max wait
+    PREDICT_MAX_CONCURRENCY: int = 8
+    PREDICT_MAX_QUEUE: int = 32
+    LOGIN_MAX_CONCURRENCY: int = 4
+    LOGIN_MAX_QUEUE: int = 16
+    ADMISSION_QUEUE_TIMEOUT: float = 0.5  # seconds
+    ADMISSION_RETRY_AFTER: int = 1  # seconds, sent with 503 responses
+
+    # Cold storage: archive_transactions.py moves older rows to .npz partitions here
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_AFTER_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 5000
+
 settings = Settings()
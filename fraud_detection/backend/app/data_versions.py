@@ -0,0 +1,161 @@
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+GLOBAL_SCOPE = 0
+_EPOCH_SCOPE = -1
+
+# Epoch per installed database; with user shards every database contributes
+_epochs: Dict[str, int] = {}
+_epoch = 0
+
+
+def _bump(scope: str) -> str:
+    return (
+        f"INSERT INTO data_versions (scope_id, version) VALUES ({scope}, 1) "
+        "ON CONFLICT(scope_id) DO UPDATE SET version = version + 1;"
+    )
+
+
+# Every write that can change a dashboard bumps the owning user's counter and
+# the global one, whichever path it takes (ORM, write-behind, streaming,
+# feedback, archive, credit resets and purchases).
+TRIGGERS = {
+    "trg_versions_transaction_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_versions_transaction_insert AFTER INSERT ON transactions
+        BEGIN {_bump("NEW.user_id")} {_bump(str(GLOBAL_SCOPE))} END
+    """,
+    "trg_versions_transaction_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_versions_transaction_delete AFTER DELETE ON transactions
+        BEGIN {_bump("OLD.user_id")} {_bump(str(GLOBAL_SCOPE))} END
+    """,
+    "trg_versions_transaction_feedback": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_versions_transaction_feedback
+        AFTER UPDATE OF feedback_correct, feedback_notes ON transactions
+        BEGIN {_bump("NEW.user_id")} {_bump(str(GLOBAL_SCOPE))} END
+    """,
+    "trg_versions_user_credits": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_versions_user_credits AFTER UPDATE OF credits ON users
+        WHEN OLD.credits IS NOT NEW.credits
+        BEGIN {_bump("NEW.id")} {_bump(str(GLOBAL_SCOPE))} END
+    """,
+    "trg_versions_user_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_versions_user_insert AFTER INSERT ON users
+        BEGIN {_bump(str(GLOBAL_SCOPE))} END
+    """,
+    "trg_versions_user_delete": f"""
+        CREATE TRIGGER IF NOT EXISTS trg_versions_user_delete AFTER DELETE ON users
+        BEGIN {_bump(str(GLOBAL_SCOPE))} END
+    """,
+}
+
+
+def install(engine: Engine):
+    """Create the version triggers and this database's epoch."""
+    global _epoch
+    with engine.begin() as conn:
+        for ddl in TRIGGERS.values():
+            conn.execute(text(ddl))
+        # Counters restart when the database is recreated; the epoch keeps old
+        # ETags from matching the new data
+        conn.execute(
+            text("INSERT OR IGNORE INTO data_versions (scope_id, version) VALUES (:scope, :epoch)"),
+            {"scope": _EPOCH_SCOPE, "epoch": secrets.randbits(31)}
+        )
+        _epochs[str(engine.url)] = conn.execute(
+            text("SELECT version FROM data_versions WHERE scope_id = :scope"), {"scope": _EPOCH_SCOPE}
+        ).scalar()
+    _epoch = 0
+    for epoch in _epochs.values():
+        _epoch ^= epoch
+
+
+def bump_all(conn):
+    """Invalidate every ETag, for bulk loads that ran with the triggers dropped."""
+    conn.execute(text("UPDATE data_versions SET version = version + 1 WHERE scope_id != :scope"),
+                 {"scope": _EPOCH_SCOPE})
+    conn.execute(text(_bump(str(GLOBAL_SCOPE))))
+
+
+def current(db: Session, scope_id: int) -> int:
+    """One primary-key lookup; 0 for a scope that has never changed."""
+    version = db.execute(
+        text("SELECT version FROM data_versions WHERE scope_id = :scope"), {"scope": scope_id}
+    ).scalar()
+    return version or 0
+
+
+class ResponseCache:
+    """Rendered JSON bodies keyed by ETag, with a TTL and an LRU size bound."""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, body: bytes):
+        with self._lock:
+            self._entries[key] = (body, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = ResponseCache(settings.RESPONSE_CACHE_TTL, settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
+def versioned_response(
+    request: Request,
+    key: str,
+    version: Any,
+    compute: Callable[[], Any],
+) -> Response:
+    """Serve ``compute()`` behind an ETag derived from a data version.
+
+    ``key`` names the endpoint and anything else the body depends on (user id,
+    date window); ``version`` is normally ``current()`` for the scope. A
+    matching If-None-Match is answered with 304 without calling ``compute()``;
+    otherwise the body comes from the response cache or from ``compute()``.
+    """
+    etag = f'"{_epoch:x}-{key}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = _cache.get(etag)
+    if body is None:
+        body = json.dumps(jsonable_encoder(compute()), separators=(",", ":")).encode("utf-8")
+        _cache.put(etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
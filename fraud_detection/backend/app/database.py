@@ -1,21 +1,77 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import Optional
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.requests import HTTPConnection
 
 from app.config import settings
+from app.utils.jwt_handler import decode_token
+
+def make_engine(url: str):
+    # SQLite requires this connect arg
+    return create_engine(url, connect_args={"check_same_thread": False})
 
-# SQLite requires this connect arg
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
-)
+engine = make_engine(settings.SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# ---------- User shards (SHARD_COUNT > 0) ----------
+def shard_url(index: int, count: int) -> str:
+    return f"sqlite:///{settings.SHARD_PATH_TEMPLATE.format(index=index, count=count)}"
+
+def shard_index(user_id: int, count: int = settings.SHARD_COUNT) -> int:
+    # Fibonacci hashing spreads consecutive ids evenly and is stable across processes
+    return ((user_id * 0x9E3779B1) & 0xFFFFFFFF) % count
+
+shard_engines = [make_engine(shard_url(i, settings.SHARD_COUNT)) for i in range(settings.SHARD_COUNT)]
+ShardSessions = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in shard_engines]
+
+def session_for_user(user_id: int) -> Session:
+    """A session on the database holding this user's rows."""
+    if not shard_engines:
+        return SessionLocal()
+    return ShardSessions[shard_index(user_id)]()
+
+def all_engines() -> list:
+    """Every database that needs the schema: the main one plus any shards."""
+    return [engine, *shard_engines]
+
+def user_engines() -> list:
+    """The databases holding users and their rows: every shard, or the main one when unsharded."""
+    return shard_engines or [engine]
+
+# Nullable columns added after the first release; create_all() only creates missing
+# tables, so existing databases get these with ALTER TABLE at startup
+ADDED_COLUMNS = {
+    "transactions": {"model_version": "VARCHAR(50)"},
+    "drift_sketches": {"epoch": "INTEGER"},
+}
+
+def upgrade_schema(engine):
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {column["name"] for column in inspector.get_columns(table)}
+            for name, ddl_type in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+def _token_user_id(connection: HTTPConnection) -> Optional[int]:
+    authorization = connection.headers.get("authorization", "")
+    token = authorization[7:] if authorization.lower().startswith("bearer ") else connection.query_params.get("token")
+    payload = decode_token(token) if token else None
+    try:
+        return int(payload["sub"]) if payload and "sub" in payload else None
+    except ValueError:
+        return None
+
 # Dependency for routes
-def get_db():
-    db = SessionLocal()
+def get_db(connection: HTTPConnection):
+    # Sharded: authenticated requests use their user's shard, the rest the directory
+    user_id = _token_user_id(connection) if shard_engines else None
+    db = session_for_user(user_id) if user_id is not None else SessionLocal()
     try:
         yield db
     finally:
@@ -0,0 +1,158 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Confusion-matrix cell of a labelled prediction; 0/1 per cell, all 0 while unlabelled
+_CELLS = {
+    "true_positives": "{row}.is_fraud AND {row}.feedback_correct = 1",
+    "false_positives": "{row}.is_fraud AND {row}.feedback_correct = 0",
+    "true_negatives": "NOT {row}.is_fraud AND {row}.feedback_correct = 1",
+    "false_negatives": "NOT {row}.is_fraud AND {row}.feedback_correct = 0",
+}
+
+_COLUMNS = ", ".join(_CELLS)
+
+# Moves a row between cells whenever its label changes, so relabelling a
+# transaction never double counts and the counters never need a table scan.
+_DELTAS = ",\n        ".join(
+    f"(CASE WHEN {cond.format(row='NEW')} THEN 1 ELSE 0 END) - "
+    f"(CASE WHEN {cond.format(row='OLD')} THEN 1 ELSE 0 END)"
+    for cond in _CELLS.values()
+)
+_SUMS = ", ".join(f"SUM(CASE WHEN {cond.format(row='transactions')} THEN 1 ELSE 0 END)" for cond in _CELLS.values())
+_ACCUMULATE = ",\n        ".join(f"{cell} = {cell} + excluded.{cell}" for cell in _CELLS)
+
+_TRIGGER_DDL = f"""
+CREATE TRIGGER IF NOT EXISTS trg_transactions_feedback
+AFTER UPDATE OF feedback_correct ON transactions
+WHEN OLD.feedback_correct IS NOT NEW.feedback_correct
+BEGIN
+    INSERT INTO feedback_counters (model_version, risk_level, {_COLUMNS})
+    VALUES (
+        COALESCE(NEW.model_version, 'unknown'),
+        NEW.risk_level,
+        {_DELTAS}
+    )
+    ON CONFLICT(model_version, risk_level) DO UPDATE SET
+        {_ACCUMULATE};
+END
+"""
+
+
+def install(engine: Engine):
+    """Create the counter trigger and backfill counters for already labelled rows."""
+    with engine.begin() as conn:
+        conn.execute(text(_TRIGGER_DDL))
+        has_counters = conn.execute(text("SELECT 1 FROM feedback_counters LIMIT 1")).first()
+        has_labels = conn.execute(
+            text("SELECT 1 FROM transactions WHERE feedback_correct IS NOT NULL LIMIT 1")
+        ).first()
+        if has_labels and not has_counters:
+            logger.info("Backfilling feedback counters from labelled transactions")
+            rebuild(conn)
+
+
+def rebuild(conn):
+    """Recompute the counters from the transactions table (one full scan)."""
+    conn.execute(text("DELETE FROM feedback_counters"))
+    conn.execute(text(f"""
+        INSERT INTO feedback_counters (model_version, risk_level, {_COLUMNS})
+        SELECT COALESCE(model_version, 'unknown'), risk_level,
+               {_SUMS}
+        FROM transactions WHERE feedback_correct IS NOT NULL
+        GROUP BY 1, 2
+    """))
+
+
+def apply_feedback(
+    db: Session,
+    items: Sequence[Tuple[int, bool, Optional[str]]],
+    user_id: Optional[int] = None,
+) -> Tuple[List[int], List[int]]:
+    """Label transactions with one UPDATE ... FROM (VALUES ...) statement.
+
+    ``items`` are (transaction_id, feedback_correct, feedback_notes); the last
+    entry wins for repeated ids. When ``user_id`` is given only that user's
+    transactions are touched. Returns (updated ids, ids not found). The caller
+    commits.
+    """
+    latest = {transaction_id: (correct, notes) for transaction_id, correct, notes in items}
+    params: Dict[str, Any] = {"now": datetime.utcnow()}
+    values = []
+    for i, (transaction_id, (correct, notes)) in enumerate(latest.items()):
+        values.append(f"(:id{i}, :correct{i}, :notes{i})")
+        params[f"id{i}"] = transaction_id
+        params[f"correct{i}"] = int(correct)
+        params[f"notes{i}"] = notes
+
+    scope = ""
+    if user_id is not None:
+        scope = "AND transactions.user_id = :user_id"
+        params["user_id"] = user_id
+
+    updated = db.execute(text(f"""
+        WITH v(id, correct, notes) AS (VALUES {", ".join(values)})
+        UPDATE transactions
+        SET feedback_correct = v.correct, feedback_notes = v.notes, feedback_date = :now
+        FROM v
+        WHERE transactions.id = v.id {scope}
+        RETURNING transactions.id
+    """), params).scalars().all()
+
+    found = set(updated)
+    return sorted(found), [transaction_id for transaction_id in latest if transaction_id not in found]
+
+
+def _rates(counts: Dict[str, int]) -> Dict[str, Any]:
+    tp, fp = counts["true_positives"], counts["false_positives"]
+    tn, fn = counts["true_negatives"], counts["false_negatives"]
+    labelled = tp + fp + tn + fn
+    return {
+        **counts,
+        "labelled": labelled,
+        "precision": None if tp + fp == 0 else round(tp / (tp + fp), 4),
+        "recall": None if tp + fn == 0 else round(tp / (tp + fn), 4),
+        "accuracy": None if labelled == 0 else round((tp + tn) / labelled, 4),
+    }
+
+
+def counter_rows(db: Session) -> List[Tuple]:
+    """Raw (model_version, risk_level, *cells) counter rows of one database."""
+    return db.execute(text(
+        f"SELECT model_version, risk_level, {_COLUMNS} FROM feedback_counters"
+    )).all()
+
+
+def metrics(db: Session) -> Dict[str, Any]:
+    """Confusion counts with precision/recall per model version, overall and by risk level."""
+    return summarize(counter_rows(db))
+
+
+def summarize(rows: Sequence[Tuple]) -> Dict[str, Any]:
+    """metrics() from counter rows, which may come from several databases (shards)."""
+    cells: Dict[str, Dict[str, Dict[str, int]]] = {}
+    for row in sorted(rows, key=lambda row: (row[0], row[1])):
+        counts = cells.setdefault(row[0], {}).setdefault(row[1], dict.fromkeys(_CELLS, 0))
+        for cell, count in zip(_CELLS, row[2:]):
+            counts[cell] += count
+
+    models: Dict[str, Dict[str, Any]] = {}
+    for version, levels in cells.items():
+        model = models[version] = {"totals": dict.fromkeys(_CELLS, 0), "risk_levels": {}}
+        for level, counts in levels.items():
+            model["risk_levels"][level] = _rates(counts)
+            for cell, count in counts.items():
+                model["totals"][cell] += count
+
+    return {
+        "models": {
+            version: {"overall": _rates(model["totals"]), "risk_levels": model["risk_levels"]}
+            for version, model in models.items()
+        }
+    }
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from fastapi import Header, HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import write_behind
+from app.config import settings
+from app.models import IdempotencyKey
+
+_last_eviction = 0.0
+
+
+def get_idempotency_key(idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")) -> Optional[str]:
+    if idempotency_key is not None and not 1 <= len(idempotency_key) <= 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be 1-255 characters")
+    return idempotency_key
+
+
+def fingerprint(payload: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _replay_response(row: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(
+        content=json.loads(row.response),
+        status_code=row.status_code,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+def lookup(db: Session, user_id: int, scope: str, key: Optional[str], request_hash: str) -> Optional[JSONResponse]:
+    """Return the stored response for a retried request, or None if the key is new."""
+    if key is None:
+        return None
+    row = db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_id == user_id,
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.key == key
+    ).first()
+    if row is None:
+        # Journaled by this worker's write-behind writer but not committed yet
+        pending = write_behind.writer.pending_idempotency(user_id, scope, key) if write_behind.writer else None
+        if pending is None:
+            return None
+        row = IdempotencyKey(**pending)
+
+    if row.created_at < datetime.utcnow() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS):
+        # Expired but not swept yet: free the key for this request. A pending
+        # record isn't in the session (or the table) yet, so there is nothing to delete
+        if inspect(row).persistent:
+            db.delete(row)
+            db.flush()
+        return None
+    if row.request_hash != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+    return _replay_response(row)
+
+
+def record(
+    user_id: int,
+    scope: str,
+    key: Optional[str],
+    request_hash: str,
+    response: Dict[str, Any],
+    status_code: int = 200
+) -> Optional[Dict[str, Any]]:
+    """IdempotencyKey column values for a response, or None without a key."""
+    if key is None:
+        return None
+    return {
+        "user_id": user_id,
+        "scope": scope,
+        "key": key,
+        "request_hash": request_hash,
+        "status_code": status_code,
+        "response": json.dumps(response, default=str),
+        "created_at": datetime.utcnow(),
+    }
+
+
+def remember(
+    db: Session,
+    user_id: int,
+    scope: str,
+    key: Optional[str],
+    request_hash: str,
+    response: Dict[str, Any],
+    status_code: int = 200
+):
+    """Stage the response in the caller's transaction; it commits with the work it describes."""
+    values = record(user_id, scope, key, request_hash, response, status_code)
+    if values is None:
+        return
+    db.add(IdempotencyKey(**values))
+    _maybe_evict(db)
+
+
+def commit_or_replay(db: Session, user_id: int, scope: str, key: Optional[str], request_hash: str) -> Optional[JSONResponse]:
+    """Commit; if a concurrent request with the same key won the race, roll back and replay its response."""
+    try:
+        db.commit()
+        return None
+    except IntegrityError:
+        db.rollback()
+        replay = lookup(db, user_id, scope, key, request_hash) if key else None
+        if replay is None:
+            raise
+        return replay
+
+
+def _maybe_evict(db: Session):
+    global _last_eviction
+    if time.monotonic() - _last_eviction < settings.IDEMPOTENCY_EVICT_INTERVAL:
+        return
+    _last_eviction = time.monotonic()
+    cutoff = datetime.utcnow() - timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+    db.query(IdempotencyKey).filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
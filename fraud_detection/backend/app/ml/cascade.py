@@ -0,0 +1,104 @@
+import math
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier
+
+
+def train_screening_model(X: np.ndarray, y: np.ndarray) -> GradientBoostingClassifier:
+    """A handful of shallow boosted trees on the five encoded features."""
+    model = GradientBoostingClassifier(n_estimators=10, max_depth=3, learning_rate=0.3, random_state=42)
+    model.fit(X, y)
+    return model
+
+
+class ScreeningModel:
+    """Fitted shallow GradientBoosting trees flattened into plain Python lists.
+
+    Scoring one row is ~30 comparisons and a sigmoid with no numpy/pandas
+    overhead, which is what makes the first stage of the cascade cheap.
+    """
+
+    def __init__(self, estimator: GradientBoostingClassifier):
+        if estimator.n_classes_ != 2:
+            raise ValueError("Screening model must be a binary classifier")
+        self.estimator = estimator
+        self.learning_rate = estimator.learning_rate
+
+        prior = float(estimator.init_.class_prior_[1])
+        self.init_raw = math.log(prior / (1 - prior))
+
+        self.trees = []
+        for tree in estimator.estimators_[:, 0]:
+            t = tree.tree_
+            self.trees.append((
+                t.feature.tolist(),
+                t.threshold.tolist(),
+                t.children_left.tolist(),
+                t.children_right.tolist(),
+                t.value[:, 0, 0].tolist(),
+            ))
+
+    def predict_proba(self, row: Sequence[float]) -> float:
+        raw = self.init_raw
+        for feature, threshold, left, right, value in self.trees:
+            node = 0
+            while left[node] != -1:
+                node = left[node] if row[feature[node]] <= threshold[node] else right[node]
+            raw += self.learning_rate * value[node]
+        return 1.0 / (1.0 + math.exp(-raw))
+
+    def predict_proba_batch(self, X: np.ndarray) -> np.ndarray:
+        return self.estimator.predict_proba(X)[:, 1]
+
+
+class CascadeScorer:
+    """Screen with the cheap model; escalate only the uncertain band to the full model."""
+
+    def __init__(self, screening: ScreeningModel, low: float, high: float):
+        self.screening = screening
+        self.low = low
+        self.high = high
+        self._lock = threading.Lock()
+        self._counts = {"screened_low": 0, "screened_high": 0, "escalated": 0}
+
+    def predict_proba(self, row: List[float], full_model: Callable[[], float]) -> Tuple[float, str]:
+        p = self.screening.predict_proba(row)
+        if p < self.low:
+            stage = "screened_low"
+        elif p > self.high:
+            stage = "screened_high"
+        else:
+            stage = "escalated"
+            p = full_model()
+        with self._lock:
+            self._counts[stage] += 1
+        return p, stage
+
+    def predict_proba_batch(self, X: np.ndarray, full_model: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """Batch version: full_model gets the row indexes that need escalation."""
+        p = self.screening.predict_proba_batch(X)
+        low = p < self.low
+        high = p > self.high
+        escalate = np.flatnonzero(~(low | high))
+        if len(escalate):
+            p[escalate] = full_model(escalate)
+        with self._lock:
+            self._counts["screened_low"] += int(low.sum())
+            self._counts["screened_high"] += int(high.sum())
+            self._counts["escalated"] += len(escalate)
+        return p
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        screened = counts["screened_low"] + counts["screened_high"]
+        return {
+            "band": [self.low, self.high],
+            "total": total,
+            **counts,
+            "screening_share": 0 if total == 0 else round(screened / total, 4),
+            "full_model_share": 0 if total == 0 else round(counts["escalated"] / total, 4),
+        }
@@ -0,0 +1,250 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import settings
+from app.database import SessionLocal
+from app.ml import inference
+from app.ml.features import MERCHANTS
+from app.ml.sketches import CountMinSketch, HyperLogLog, QuantileSketch, psi
+from app.models import DriftSketch, DriftWindow
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_FEATURES = ["amount", "hour", "user_age", "fraud_probability"]
+QUANTILES = [0.5, 0.9, 0.99]
+
+
+class DriftMonitor:
+    """Constant-memory sketches of scoring traffic, updated on every prediction.
+
+    Each worker keeps its own sketches and periodically publishes them to the
+    ``drift_sketches`` table; the report merges every worker's state and
+    compares it to the training baseline. Sketches always live in the main
+    database, also when users are sharded. The window is identified by the
+    epoch in ``drift_window``: a reset bumps it, and each worker drops its
+    sketches the next time it sees a new epoch instead of republishing them.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.epoch: Optional[int] = None
+        self._lock = threading.Lock()
+        self._last_publish = time.monotonic()
+        self._reset()
+
+    def _reset(self):
+        self.numeric = {name: QuantileSketch() for name in NUMERIC_FEATURES}
+        self.categories: Dict[str, int] = {}
+        self.merchants = CountMinSketch()
+        self.merchant_cardinality = HyperLogLog()
+
+    def observe(self, features: Dict[str, Any], probability: float):
+        with self._lock:
+            for name in ("amount", "hour", "user_age"):
+                self.numeric[name].add(float(features[name]))
+            self.numeric["fraud_probability"].add(float(probability))
+            category = features["category"]
+            self.categories[category] = self.categories.get(category, 0) + 1
+            self.merchants.add(features["merchant"])
+            self.merchant_cardinality.add(features["merchant"])
+            # Claimed under the lock, so only one caller per interval publishes
+            due = time.monotonic() - self._last_publish >= settings.DRIFT_PUBLISH_INTERVAL
+            if due:
+                self._last_publish = time.monotonic()
+
+        if due:
+            # Off the request path: the prediction doesn't wait on the database write
+            threading.Thread(target=self.publish, name="drift-publish", daemon=True).start()
+
+    # ---------- cross-worker state ----------
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "numeric": {name: sketch.to_dict() for name, sketch in self.numeric.items()},
+                "categories": dict(self.categories),
+                "merchants": self.merchants.to_dict(),
+                "merchant_cardinality": self.merchant_cardinality.to_dict(),
+            }
+
+    def merge_dict(self, state: Dict[str, Any]):
+        with self._lock:
+            for name, data in state["numeric"].items():
+                self.numeric[name].merge(QuantileSketch.from_dict(data))
+            for category, count in state["categories"].items():
+                self.categories[category] = self.categories.get(category, 0) + count
+            self.merchants.merge(CountMinSketch.from_dict(state["merchants"]))
+            self.merchant_cardinality.merge(HyperLogLog.from_dict(state["merchant_cardinality"]))
+
+    def _sync_epoch(self, db) -> DriftWindow:
+        """Current window; drops this worker's sketches if it was reset elsewhere."""
+        window = db.get(DriftWindow, 1)
+        if window is None:
+            window = DriftWindow(id=1, epoch=0, started_at=datetime.utcnow())
+            db.add(window)
+            db.flush()
+        with self._lock:
+            if self.epoch is not None and self.epoch != window.epoch:
+                self._reset()
+            self.epoch = window.epoch
+        return window
+
+    def publish(self):
+        """Upsert this worker's sketches so other workers can merge them."""
+        with self._lock:
+            self._last_publish = time.monotonic()
+        db = SessionLocal()
+        try:
+            window = self._sync_epoch(db)
+            db.merge(DriftSketch(
+                worker_id=self.worker_id,
+                state=json.dumps(self.to_dict()),
+                epoch=window.epoch,
+                updated_at=datetime.utcnow()
+            ))
+            db.query(DriftSketch).filter(DriftSketch.updated_at < _stale_before()).delete()
+            db.commit()
+        except Exception as e:
+            logger.error(f"Error publishing drift sketches: {str(e)}")
+            db.rollback()
+        finally:
+            db.close()
+
+    def reset(self):
+        """Start a new monitoring window on every worker."""
+        db = SessionLocal()
+        try:
+            window = self._sync_epoch(db)
+            window.epoch += 1
+            window.started_at = datetime.utcnow()
+            db.query(DriftSketch).delete()
+            db.commit()
+            epoch = window.epoch
+        finally:
+            db.close()
+        with self._lock:
+            self._reset()
+            self.epoch = epoch
+
+    def merged(self) -> "DriftMonitor":
+        """This worker's live sketches merged with every other worker's last publish."""
+        db = SessionLocal()
+        try:
+            window = self._sync_epoch(db)
+            merged = DriftMonitor()
+            merged.epoch = window.epoch
+            merged.merge_dict(self.to_dict())
+            rows = db.query(DriftSketch).filter(
+                DriftSketch.worker_id != self.worker_id,
+                DriftSketch.epoch == window.epoch,
+                DriftSketch.updated_at >= _stale_before()
+            )
+            for row in rows:
+                merged.merge_dict(json.loads(row.state))
+        finally:
+            db.close()
+        return merged
+
+    # ---------- report ----------
+    def report(self) -> Dict[str, Any]:
+        merged = self.merged()
+        base = get_baseline()
+
+        numeric = {}
+        for name, sketch in merged.numeric.items():
+            edges = base["edges"][name]
+            score = psi(base["counts"][name], sketch.histogram(edges))
+            numeric[name] = {
+                "count": sketch.count,
+                "quantiles": {
+                    f"p{int(q * 100)}": None if sketch.count == 0 else round(sketch.quantile(q), 4)
+                    for q in QUANTILES
+                },
+                "baseline_quantiles": {
+                    f"p{int(q * 100)}": round(float(np.quantile(base["values"][name], q)), 4)
+                    for q in QUANTILES
+                },
+                "psi": round(score, 4),
+                "drift": _drift_level(score),
+            }
+
+        category_names = sorted(set(base["categories"]) | set(merged.categories))
+        category_psi = psi(
+            [base["categories"].get(c, 0) for c in category_names],
+            [merged.categories.get(c, 0) for c in category_names]
+        )
+
+        merchant_counts = {m: merged.merchants.estimate(m) for m in MERCHANTS}
+        other_merchants = max(merged.merchants.total - sum(merchant_counts.values()), 0)
+        merchant_psi = psi(
+            [base["merchants"].get(m, 0) for m in MERCHANTS] + [0],
+            list(merchant_counts.values()) + [other_merchants]
+        )
+
+        return {
+            "window_epoch": merged.epoch,
+            "window_predictions": merged.numeric["fraud_probability"].count,
+            "numeric": numeric,
+            "categories": {
+                "counts": merged.categories,
+                "psi": round(category_psi, 4),
+                "drift": _drift_level(category_psi),
+            },
+            "merchants": {
+                "distinct_estimate": round(merged.merchant_cardinality.estimate()),
+                "known_merchant_counts": merchant_counts,
+                "unknown_merchant_count": other_merchants,
+                "psi": round(merchant_psi, 4),
+                "drift": _drift_level(merchant_psi),
+            },
+        }
+
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.DRIFT_SKETCH_TTL)
+
+
+def _drift_level(score: float) -> str:
+    # Conventional PSI reading
+    if score < 0.1:
+        return "stable"
+    if score < 0.25:
+        return "moderate"
+    return "significant"
+
+
+_baseline: Optional[Dict[str, Any]] = None
+
+def get_baseline() -> Dict[str, Any]:
+    """Decile bins and counts of the training distribution, built once."""
+    global _baseline
+    if _baseline is None:
+        sample = inference.baseline_sample()
+        values = {name: np.asarray(v, dtype=np.float64) for name, v in sample["values"].items()}
+
+        edges: Dict[str, List[float]] = {}
+        counts: Dict[str, np.ndarray] = {}
+        for name, v in values.items():
+            edges[name] = sorted(set(np.quantile(v, np.linspace(0.1, 0.9, 9)).tolist()))
+            counts[name] = np.bincount(
+                np.searchsorted(edges[name], v, side="left"), minlength=len(edges[name]) + 1
+            )
+
+        _baseline = {
+            "values": values,
+            "edges": edges,
+            "counts": counts,
+            "categories": sample["categories"],
+            "merchants": sample["merchants"],
+        }
+    return _baseline
+
+
+# Per-process monitor fed by /fraud/predict
+monitor = DriftMonitor()
@@ -0,0 +1,33 @@
+from typing import Any, Dict, List
+
+# Plain-Python feature definitions shared by the in-process loader, the
+# inference sidecar and its clients; nothing here may import numpy/pandas/sklearn.
+
+# Column order of preprocess_features output
+FEATURE_NAMES = ["amount", "merchant", "category", "hour", "user_age"]
+
+# Vocabularies the encoders (and the synthetic training data) know about
+MERCHANTS = ['amazon', 'walmart', 'target', 'starbucks', 'mcdonalds', 'uber', 'netflix', 'paypal']
+CATEGORIES = ['shopping', 'food', 'entertainment', 'travel', 'transfer', 'payment']
+
+# Same codes as the fitted LabelEncoders, which number classes in sorted order
+MERCHANT_CODES = {label: i for i, label in enumerate(sorted(MERCHANTS))}
+CATEGORY_CODES = {label: i for i, label in enumerate(sorted(CATEGORIES))}
+
+THRESHOLD = 0.5
+
+# Probabilities above these are MEDIUM and HIGH risk; replay history with
+# backtest.py before moving them or THRESHOLD
+RISK_BANDS = (0.3, 0.7)
+
+def risk_band(probability: float) -> str:
+    return "HIGH" if probability > RISK_BANDS[1] else "MEDIUM" if probability > RISK_BANDS[0] else "LOW"
+
+def encode_row(features: Dict[str, Any]) -> List[float]:
+    """Encode one transaction as a plain list in FEATURE_NAMES order (no pandas)"""
+    try:
+        merchant = MERCHANT_CODES[features["merchant"]]
+        category = CATEGORY_CODES[features["category"]]
+    except KeyError as e:
+        raise ValueError(f"Failed to preprocess features: unseen label {e}")
+    return [float(features["amount"]), merchant, category, float(features["hour"]), float(features["user_age"])]
@@ -0,0 +1,85 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from app.config import settings
+from app.ml.features import FEATURE_NAMES, THRESHOLD, encode_row
+
+logger = logging.getLogger(__name__)
+
+# What the API scores with: the in-process model_loader, or the inference
+# sidecar (serve_inference.py) when INFERENCE_SOCKET_PATH is set, in which case
+# this process never imports sklearn or pandas.
+if settings.INFERENCE_SOCKET_PATH:
+    from app.ml.inference_client import InferenceClient
+
+    _client = InferenceClient(
+        settings.INFERENCE_SOCKET_PATH, settings.INFERENCE_CONNECTIONS, settings.INFERENCE_TIMEOUT
+    )
+else:
+    from app.ml import model_loader
+
+    _client = None
+
+
+def model_version() -> str:
+    """Version recorded on scored transactions"""
+    if _client is None:
+        return model_loader.MODEL_VERSION
+    return _client.info()["model_version"]
+
+
+def predict_label(features: Dict[str, Any]) -> Tuple[bool, float]:
+    if _client is None:
+        return model_loader.predict_label(features)
+    try:
+        p = _client.predict_proba([encode_row(features)])[0]
+    except Exception as e:
+        logger.error(f"Error making prediction: {str(e)}")
+        raise RuntimeError(f"Failed to make prediction: {str(e)}")
+    return p >= THRESHOLD, p
+
+
+def predict_label_batch(features_list: List[Dict[str, Any]]) -> List[Tuple[bool, float]]:
+    if _client is None:
+        return model_loader.predict_label_batch(features_list)
+    try:
+        probabilities = _client.predict_proba([encode_row(features) for features in features_list])
+    except Exception as e:
+        logger.error(f"Error making batch prediction: {str(e)}")
+        raise RuntimeError(f"Failed to make batch prediction: {str(e)}")
+    return [(p >= THRESHOLD, p) for p in probabilities]
+
+
+def explain_label(features: Dict[str, Any]) -> Tuple[bool, float, Dict[str, Any]]:
+    if _client is None:
+        return model_loader.explain_label(features)
+    try:
+        p, bias, contributions = _client.explain(encode_row(features))
+    except Exception as e:
+        logger.error(f"Error explaining prediction: {str(e)}")
+        raise RuntimeError(f"Failed to explain prediction: {str(e)}")
+    if contributions is None:
+        explanation = {"source": "screening", "base_value": None, "contributions": None, "output_space": None}
+    else:
+        explanation = {
+            "source": "full_model",
+            "base_value": bias,
+            "contributions": dict(zip(FEATURE_NAMES, contributions)),
+            "output_space": _client.info()["output_space"],
+        }
+    return p >= THRESHOLD, p, explanation
+
+
+def cascade_stats() -> Dict[str, Any]:
+    """Cascade traffic split: this worker's in-process, every sidecar process's otherwise"""
+    if _client is None:
+        return model_loader.cascade_stats()
+    return _client.info(refresh=True)["cascade"]
+
+
+def baseline_sample() -> Dict[str, Any]:
+    """Training features and scores for drift monitoring (see model_loader.baseline_sample)"""
+    if _client is None:
+        return model_loader.baseline_sample()
+    # Values arrive as JSON lists; drift converts them with numpy
+    return _client.baseline()
@@ -0,0 +1,116 @@
+import itertools
+import json
+import logging
+import queue
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.ml import inference_protocol as proto
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceError(RuntimeError):
+    """The sidecar could not be reached or failed to score the request."""
+
+
+class InferenceClient:
+    """Blocking client for the inference sidecar, safe to share between threads.
+
+    Keeps up to ``max_connections`` sockets open and sends one request at a
+    time on each; the server batches across every connection it holds, so
+    concurrent requests from all API workers share model calls. Standard
+    library only: no numpy, pandas or sklearn in the API process.
+    """
+
+    def __init__(self, path: str, max_connections: int = 8, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[socket.socket]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._ids = itertools.count(1)
+        self._info: Optional[Dict[str, Any]] = None
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        # A new connection may mean a restarted sidecar with another model
+        self._info = None
+        return sock
+
+    def _roundtrip(self, sock: socket.socket, op: int, payload: bytes) -> Tuple[int, bytes]:
+        request_id = next(self._ids) & 0xFFFFFFFF
+        sock.sendall(proto.pack(op, request_id, payload))
+        status, _, reply_id, length = proto.unpack_header(proto.recv_exactly(sock, proto.HEADER.size))
+        body = proto.recv_exactly(sock, length)
+        if reply_id != request_id:
+            raise proto.ProtocolError(f"Reply {reply_id} does not match request {request_id}")
+        return status, body
+
+    def _call(self, op: int, payload: bytes = b"") -> bytes:
+        with self._slots:
+            # An idle socket may have been closed by a sidecar restart: retry once on a fresh one
+            for attempt in range(2):
+                try:
+                    sock = self._idle.get_nowait()
+                    reused = True
+                except queue.Empty:
+                    reused = False
+                    try:
+                        sock = self._connect()
+                    except OSError as e:
+                        raise InferenceError(f"Inference server unavailable at {self.path}: {e}")
+                try:
+                    status, body = self._roundtrip(sock, op, payload)
+                except (OSError, ConnectionError, proto.ProtocolError) as e:
+                    sock.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise InferenceError(f"Inference request failed: {e}")
+                self._idle.put(sock)
+                break
+
+        if status == proto.STATUS_BAD_REQUEST:
+            raise ValueError(body.decode("utf-8", "replace"))
+        if status != proto.STATUS_OK:
+            raise InferenceError(body.decode("utf-8", "replace"))
+        return body
+
+    def predict_proba(self, rows: Sequence[Sequence[float]]) -> List[float]:
+        """Probabilities for encoded rows (features.encode_row)."""
+        if not rows:
+            return []
+        return proto.unpack_floats(self._call(proto.OP_PREDICT, proto.pack_rows(rows)))
+
+    def explain(self, row: Sequence[float]) -> Tuple[float, Optional[float], Optional[List[float]]]:
+        """(probability, bias, per-feature contributions) for one encoded row.
+
+        Bias and contributions are None when the cascade screened the row.
+        """
+        values = proto.unpack_floats(self._call(proto.OP_EXPLAIN, proto.pack_rows([row])))
+        if len(values) == 1:
+            return values[0], None, None
+        return values[0], values[1], values[2:]
+
+    def info(self, refresh: bool = False) -> Dict[str, Any]:
+        if self._info is None or refresh:
+            info = json.loads(self._call(proto.OP_INFO))
+            self._info = info
+            return info
+        return self._info
+
+    def baseline(self) -> Dict[str, Any]:
+        return json.loads(self._call(proto.OP_BASELINE))
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
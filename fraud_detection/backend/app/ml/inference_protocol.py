@@ -0,0 +1,76 @@
+import json
+import socket
+import struct
+from typing import Any, List, Sequence, Tuple
+
+# Framing between API workers and the inference sidecar (Unix socket).
+#
+# Every message is a fixed 10-byte little-endian header followed by a payload:
+#   request:  op (u8), flags (u8), request id (u32), payload bytes (u32)
+#   response: status (u8), flags (u8), request id (u32), payload bytes (u32)
+#
+# OP_PREDICT   payload n x 5 float64 encoded rows (FEATURE_NAMES order);
+#              reply n float64 probabilities
+# OP_EXPLAIN   payload 1 x 5 float64; reply probability, bias, 5 contributions,
+#              or only the probability when the cascade screened the row
+# OP_INFO      empty; reply JSON (model version, backend, explanation output space, cascade stats)
+# OP_BASELINE  empty; reply JSON drift baseline sample
+#
+# A non-OK status carries a UTF-8 error message instead of the reply payload.
+HEADER = struct.Struct("<BBII")
+
+OP_PREDICT = 1
+OP_EXPLAIN = 2
+OP_INFO = 3
+OP_BASELINE = 4
+
+STATUS_OK = 0
+STATUS_BAD_REQUEST = 1
+STATUS_ERROR = 2
+
+N_FEATURES = 5
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def pack(code: int, request_id: int, payload: bytes = b"", flags: int = 0) -> bytes:
+    return HEADER.pack(code, flags, request_id, len(payload)) + payload
+
+
+def unpack_header(header: bytes) -> Tuple[int, int, int, int]:
+    """(op or status, flags, request id, payload length)"""
+    code, flags, request_id, length = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload of {length} bytes exceeds {MAX_PAYLOAD}")
+    return code, flags, request_id, length
+
+
+def pack_floats(values: Sequence[float]) -> bytes:
+    return struct.pack(f"<{len(values)}d", *values)
+
+
+def unpack_floats(payload: bytes) -> List[float]:
+    if len(payload) % 8:
+        raise ProtocolError("Float payload is not a multiple of 8 bytes")
+    return list(struct.unpack(f"<{len(payload) // 8}d", payload))
+
+
+def pack_rows(rows: Sequence[Sequence[float]]) -> bytes:
+    return pack_floats([value for row in rows for value in row])
+
+
+def pack_json(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < n:
+        chunk = sock.recv(n - len(buffer))
+        if not chunk:
+            raise ConnectionError("Inference server closed the connection")
+        buffer.extend(chunk)
+    return bytes(buffer)
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.ml import inference_protocol as proto
+
+logger = logging.getLogger(__name__)
+
+# ---------- Pool processes: the only place the model is loaded ----------
+_loader = None
+
+
+def _init_worker():
+    global _loader
+    from app.ml import model_loader
+    _loader = model_loader
+
+
+def _score(X: np.ndarray) -> Tuple[int, np.ndarray, Dict[str, Any]]:
+    return os.getpid(), _loader.predict_proba_encoded(X), _loader.cascade_stats()
+
+
+def _explain(row: List[float]) -> List[float]:
+    p, explanation = _loader.explain_encoded(row)
+    if explanation["contributions"] is None:
+        # Screened by the cascade: nothing from the full model to explain
+        return [p]
+    return [p, explanation["base_value"], *explanation["contributions"].values()]
+
+
+def _info() -> Dict[str, Any]:
+    from app.config import settings
+    return {
+        "model_version": _loader.MODEL_VERSION,
+        "backend": settings.MODEL_BACKEND,
+        "output_space": _loader.EXPLANATION_OUTPUT_SPACE,
+    }
+
+
+def _baseline() -> Dict[str, Any]:
+    sample = _loader.baseline_sample()
+    sample["values"] = {name: values.tolist() for name, values in sample["values"].items()}
+    return sample
+
+
+# ---------- Server process: sockets and batching, no model ----------
+def _merge_cascade_stats(per_worker: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    stats = list(per_worker.values())
+    if not stats or not stats[0].get("enabled"):
+        return {"enabled": False}
+    counts = {key: sum(s[key] for s in stats) for key in ("screened_low", "screened_high", "escalated")}
+    total = sum(counts.values())
+    screened = counts["screened_low"] + counts["screened_high"]
+    return {
+        "enabled": True,
+        "band": stats[0]["band"],
+        "total": total,
+        **counts,
+        "screening_share": 0 if total == 0 else round(screened / total, 4),
+        "full_model_share": 0 if total == 0 else round(counts["escalated"] / total, 4),
+        "workers": len(stats),
+    }
+
+
+class InferenceServer:
+    """Unix-socket scoring service shared by every API worker on the host.
+
+    Predict requests from all connections are queued and coalesced into
+    batches of up to ``batch_max_rows`` rows, waiting at most ``batch_wait``
+    seconds for a batch to fill; each batch is scored in one vectorized call
+    by a fixed pool of ``workers`` processes, each holding one model copy.
+    """
+
+    def __init__(self, path: str, workers: int, batch_max_rows: int, batch_wait: float):
+        self.path = path
+        self.workers = workers
+        self.batch_max_rows = batch_max_rows
+        self.batch_wait = batch_wait
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: "asyncio.Queue[Tuple[np.ndarray, asyncio.Future]]" = None
+        self._cascade_stats: Dict[int, Dict[str, Any]] = {}
+        self._info: Dict[str, Any] = {}
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._batches = 0
+        self._rows = 0
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    # ---------- batching ----------
+    async def _batcher(self):
+        # One batch per pool process in flight; the next one fills meanwhile
+        slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            rows = len(pending[0][0])
+            deadline = loop.time() + self.batch_wait
+            while rows < self.batch_max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+            await slots.acquire()
+            asyncio.create_task(self._score_batch(pending, slots))
+
+    async def _score_batch(self, pending, slots: asyncio.Semaphore):
+        try:
+            X = np.concatenate([rows for rows, _ in pending])
+            pid, probabilities, cascade = await self._run(_score, X)
+            self._cascade_stats[pid] = cascade
+            self._batches += 1
+            self._rows += len(X)
+            offset = 0
+            for rows, future in pending:
+                if not future.done():
+                    future.set_result(probabilities[offset:offset + len(rows)])
+                offset += len(rows)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            slots.release()
+
+    async def _predict(self, payload: bytes) -> bytes:
+        if not payload or len(payload) % (8 * proto.N_FEATURES):
+            raise ValueError("Predict payload must be whole rows of 5 float64 values")
+        rows = np.frombuffer(payload, dtype="<f8").reshape(-1, proto.N_FEATURES)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        return np.asarray(await future, dtype="<f8").tobytes()
+
+    # ---------- connections ----------
+    async def _dispatch(self, op: int, payload: bytes) -> bytes:
+        if op == proto.OP_PREDICT:
+            return await self._predict(payload)
+        if op == proto.OP_EXPLAIN:
+            if len(payload) != 8 * proto.N_FEATURES:
+                raise ValueError("Explain payload must be one row of 5 float64 values")
+            return proto.pack_floats(await self._run(_explain, proto.unpack_floats(payload)))
+        if op == proto.OP_INFO:
+            return proto.pack_json({
+                **self._info,
+                "workers": self.workers,
+                "batches": self._batches,
+                "rows": self._rows,
+                "cascade": _merge_cascade_stats(self._cascade_stats),
+            })
+        if op == proto.OP_BASELINE:
+            return proto.pack_json(await self._run(_baseline))
+        raise ValueError(f"Unknown op {op}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(proto.HEADER.size)
+                except asyncio.IncompleteReadError:
+                    return
+                op, _, request_id, length = proto.unpack_header(header)
+                payload = await reader.readexactly(length)
+                try:
+                    status, body = proto.STATUS_OK, await self._dispatch(op, payload)
+                except ValueError as e:
+                    status, body = proto.STATUS_BAD_REQUEST, str(e).encode("utf-8")
+                except Exception as e:
+                    logger.error(f"Inference request failed: {str(e)}")
+                    status, body = proto.STATUS_ERROR, f"Inference failed: {e}".encode("utf-8")
+                writer.write(proto.pack(status, request_id, body))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, proto.ProtocolError) as e:
+            logger.warning(f"Dropping inference connection: {str(e)}")
+        finally:
+            del self._connections[asyncio.current_task()]
+            writer.close()
+
+    async def serve(self):
+        # spawn: pool processes start clean instead of forking the event loop
+        self._pool = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+        )
+        self._queue = asyncio.Queue()
+        try:
+            start = time.perf_counter()
+            # Load the model in every pool process before accepting traffic
+            infos = await asyncio.gather(*(self._run(_info) for _ in range(self.workers)))
+            self._info = infos[0]
+            logger.info(
+                f"Loaded model {self._info['model_version']} in {self.workers} processes "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            server = await asyncio.start_unix_server(self._handle, path=self.path)
+            os.chmod(self.path, 0o660)
+            batcher = asyncio.create_task(self._batcher())
+            stop = asyncio.Event()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+            logger.info(f"Inference server listening on {self.path}")
+            try:
+                async with server:
+                    await stop.wait()
+                # Let open connections finish instead of cancelling them mid-read
+                tasks = list(self._connections)
+                for writer in self._connections.values():
+                    writer.close()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                logger.info("Inference server stopped")
+            finally:
+                batcher.cancel()
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+            if os.path.exists(self.path):
+                os.remove(self.path)
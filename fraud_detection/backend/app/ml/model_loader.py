@@ -1,6 +1,7 @@
+import hashlib
 import json
 import logging
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 import os
 
 import pandas as pd
@@ -10,6 +11,11 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.pipeline import Pipeline
 
+from app.config import settings
+from app.ml.cascade import CascadeScorer, ScreeningModel, train_screening_model
+from app.ml.features import CATEGORIES, FEATURE_NAMES, MERCHANTS, RISK_BANDS, THRESHOLD, encode_row, risk_band
+from app.ml.tree_explainer import TreeExplainer
+
 # Set up logging
 logger = logging.getLogger(__name__)
 
@@ -21,38 +27,24 @@ _merchant_encoder = LabelEncoder()
 _category_encoder = LabelEncoder()
 _model = None
 _scaler = None
+_explainer = None
+_cascade = None
 
-def _create_simple_model():
-    """Create a simple fraud detection model using available features"""
-    global _merchant_encoder, _category_encoder, _model, _scaler
-
-    # Train with synthetic data that matches our input features
-    np.random.seed(42)
-    n_samples = 10000
+def generate_training_data(n_samples: int = 10000, seed: int = 42) -> Tuple[pd.DataFrame, np.ndarray]:
+    """Synthetic transactions (raw, unencoded) and fraud labels"""
+    np.random.seed(seed)
 
     # Generate realistic transaction data
-    merchants = ['amazon', 'walmart', 'target', 'starbucks', 'mcdonalds', 'uber', 'netflix', 'paypal']
-    categories = ['shopping', 'food', 'entertainment', 'travel', 'transfer', 'payment']
-
     data = {
         "amount": np.random.exponential(100, n_samples),
-        "merchant": np.random.choice(merchants, n_samples),
-        "category": np.random.choice(categories, n_samples),
+        "merchant": np.random.choice(MERCHANTS, n_samples),
+        "category": np.random.choice(CATEGORIES, n_samples),
         "hour": np.random.randint(0, 24, n_samples),
         "user_age": np.random.randint(18, 80, n_samples)
     }
 
     X = pd.DataFrame(data)
 
-    # Fit encoders
-    _merchant_encoder.fit(merchants)
-    _category_encoder.fit(categories)
-
-    # Encode categorical features
-    X_encoded = X.copy()
-    X_encoded["merchant"] = _merchant_encoder.transform(X_encoded["merchant"])
-    X_encoded["category"] = _category_encoder.transform(X_encoded["category"])
-
     # Create target: fraud if amount > 200 and hour is unusual (late night/early morning)
     # or if merchant is suspicious, or high amount for age
     fraud_conditions = (
@@ -65,6 +57,24 @@ def _create_simple_model():
     # Add some noise to make it more realistic
     noise = np.random.random(n_samples) < 0.05
     y = (y | noise).astype(int)
+    return X, y.to_numpy()
+
+def _create_simple_model():
+    """Create a simple fraud detection model using available features"""
+    global _merchant_encoder, _category_encoder, _model, _scaler
+
+    # Train with synthetic data that matches our input features
+    n_samples = 10000
+    X, y = generate_training_data(n_samples)
+
+    # Fit encoders
+    _merchant_encoder.fit(MERCHANTS)
+    _category_encoder.fit(CATEGORIES)
+
+    # Encode categorical features
+    X_encoded = X.copy()
+    X_encoded["merchant"] = _merchant_encoder.transform(X_encoded["merchant"])
+    X_encoded["category"] = _category_encoder.transform(X_encoded["category"])
 
     logger.info(f"Training model with {n_samples} samples. Fraud rate: {y.mean():.3f}")
 
@@ -77,9 +87,37 @@ def _create_simple_model():
     _model.fit(X_encoded, y)
     return _model
 
+def _load_xgboost_model():
+    """Load the XGBoost booster, training and saving one if not found"""
+    from app.ml.xgb_backend import XGBoostModel, train_xgboost_model
+
+    path = settings.XGBOOST_MODEL_PATH
+    if os.path.exists(path):
+        logger.info(f"Loading XGBoost model from {path}")
+        return XGBoostModel.load(path, nthread=settings.XGBOOST_NTHREAD)
+
+    logger.info("XGBoost model not found, training a new one")
+    X, y = generate_training_data()
+    X["merchant"] = _merchant_encoder.transform(X["merchant"])
+    X["category"] = _category_encoder.transform(X["category"])
+    model = XGBoostModel(train_xgboost_model(X[FEATURE_NAMES].to_numpy(), y, FEATURE_NAMES), settings.XGBOOST_NTHREAD)
+    model.save(path)
+    logger.info(f"Created and saved XGBoost model to {path}")
+    return model
+
+if settings.MODEL_BACKEND not in ("sklearn", "xgboost"):
+    raise ValueError(f"Unknown MODEL_BACKEND: {settings.MODEL_BACKEND}")
+
 # Try to load existing model, create new one if not found
 try:
-    if os.path.exists(MODEL_PATH):
+    # Always ensure encoders are fitted with known categories
+    _merchant_encoder.fit(MERCHANTS)
+    _category_encoder.fit(CATEGORIES)
+    logger.info("Encoders fitted with known categories")
+
+    if settings.MODEL_BACKEND == "xgboost":
+        _model = _load_xgboost_model()
+    elif os.path.exists(MODEL_PATH):
         logger.info(f"Loading existing model from {MODEL_PATH}")
         _model = joblib.load(MODEL_PATH)
         logger.info("Successfully loaded existing model")
@@ -90,19 +128,33 @@ try:
         joblib.dump(_model, MODEL_PATH)
         logger.info(f"Created and saved new model to {MODEL_PATH}")
 
-    # Always ensure encoders are fitted with known categories
-    merchants = ['amazon', 'walmart', 'target', 'starbucks', 'mcdonalds', 'uber', 'netflix', 'paypal']
-    categories = ['shopping', 'food', 'entertainment', 'travel', 'transfer', 'payment']
-    _merchant_encoder.fit(merchants)
-    _category_encoder.fit(categories)
-    logger.info("Encoders fitted with known categories")
-
 except Exception as e:
     logger.error(f"Error loading/creating model: {str(e)}")
+    if settings.MODEL_BACKEND == "xgboost":
+        # The forest can't stand in for the booster: the xgboost code paths and
+        # MODEL_VERSION would be wrong, so a misconfiguration fails at startup
+        raise
     logger.info("Creating fallback model")
     _model = _create_simple_model()
 
-THRESHOLD = 0.5
+def _artifact_version(path: str) -> str:
+    """Short content hash identifying the model artifact"""
+    if not os.path.exists(path):
+        return "unsaved"
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+# Recorded on every scored transaction so feedback can be attributed per model
+MODEL_VERSION = _artifact_version(
+    settings.XGBOOST_MODEL_PATH if settings.MODEL_BACKEND == "xgboost" else MODEL_PATH
+) + ("+cascade" if settings.CASCADE_ENABLED else "")
+
+# Units of explanation base values and contributions: the forest's path
+# decomposition works on the probability, XGBoost's native TreeSHAP on the margin
+EXPLANATION_OUTPUT_SPACE = "log_odds" if settings.MODEL_BACKEND == "xgboost" else "probability"
+
+# Explanation of a row the cascade's screening model decided on its own
+SCREENED_EXPLANATION = {"source": "screening", "base_value": None, "contributions": None, "output_space": None}
 
 def preprocess_features(features: Dict[str, Any]) -> pd.DataFrame:
     """Convert raw features into model-ready format"""
@@ -127,17 +179,65 @@ def preprocess_features(features: Dict[str, Any]) -> pd.DataFrame:
         logger.error(f"Error preprocessing features: {str(e)}")
         raise ValueError(f"Failed to preprocess features: {str(e)}")
 
+def _full_model_proba(features: Dict[str, Any]) -> float:
+    if settings.MODEL_BACKEND == "xgboost":
+        # Straight to a NumPy row for inplace_predict, no DataFrame
+        return float(_model.predict_proba([encode_row(features)])[0, 1])
+    df = preprocess_features(features)
+    return float(_model.predict_proba(df)[:, 1][0])
+
 def predict_proba(features: Dict[str, Any]) -> float:
     """Get raw fraud probability"""
     try:
-        df = preprocess_features(features)
-        proba = _model.predict_proba(df)[:, 1][0]
+        if settings.CASCADE_ENABLED:
+            proba, stage = _get_cascade().predict_proba(
+                encode_row(features), lambda: _full_model_proba(features)
+            )
+            logger.info(f"Prediction probability: {proba} (cascade: {stage})")
+            return proba
+
+        proba = _full_model_proba(features)
         logger.info(f"Prediction probability: {proba}")
-        return float(proba)
+        return proba
     except Exception as e:
         logger.error(f"Error predicting probability: {str(e)}")
         raise RuntimeError(f"Failed to predict probability: {str(e)}")
 
+def preprocess_batch(df: pd.DataFrame) -> pd.DataFrame:
+    """Encode a frame of raw transactions into model-ready columns"""
+    df_processed = df[FEATURE_NAMES].copy()
+    df_processed["merchant"] = _merchant_encoder.transform(df_processed["merchant"])
+    df_processed["category"] = _category_encoder.transform(df_processed["category"])
+    return df_processed
+
+def predict_proba_batch(df: pd.DataFrame) -> np.ndarray:
+    """Fraud probabilities for a frame of raw transactions"""
+    return _model.predict_proba(preprocess_batch(df))[:, 1]
+
+def predict_label_batch(features_list: List[Dict[str, Any]]) -> List[Tuple[bool, float]]:
+    """Vectorized predict_label for a batch of transactions (cascade-aware)"""
+    if not features_list:
+        return []
+    try:
+        encoded = preprocess_batch(pd.DataFrame(features_list))
+        probabilities = predict_proba_encoded(encoded.to_numpy(dtype=float))
+        return [(bool(p >= THRESHOLD), float(p)) for p in probabilities]
+    except Exception as e:
+        logger.error(f"Error making batch prediction: {str(e)}")
+        raise RuntimeError(f"Failed to make batch prediction: {str(e)}")
+
+def _full_model_proba_batch(X: np.ndarray) -> np.ndarray:
+    if settings.MODEL_BACKEND == "xgboost":
+        return _model.predict_proba(X)[:, 1]
+    # The pipeline was fitted on a frame and checks the column names
+    return _model.predict_proba(pd.DataFrame(X, columns=FEATURE_NAMES))[:, 1]
+
+def predict_proba_encoded(X: np.ndarray) -> np.ndarray:
+    """Fraud probabilities for rows already encoded in FEATURE_NAMES order (cascade-aware)"""
+    if settings.CASCADE_ENABLED:
+        return _get_cascade().predict_proba_batch(X, lambda idx: _full_model_proba_batch(X[idx]))
+    return _full_model_proba_batch(X)
+
 def predict_label(features: Dict[str, Any]) -> Tuple[bool, float]:
     """Get binary prediction and probability"""
     try:
@@ -147,4 +247,97 @@ def predict_label(features: Dict[str, Any]) -> Tuple[bool, float]:
         return is_fraud, p
     except Exception as e:
         logger.error(f"Error making prediction: {str(e)}")
-        raise RuntimeError(f"Failed to make prediction: {str(e)}")
\ No newline at end of file
+        raise RuntimeError(f"Failed to make prediction: {str(e)}")
+
+def _get_explainer() -> TreeExplainer:
+    """Build the path decomposition once, on first use"""
+    global _explainer
+    if _explainer is None:
+        if settings.MODEL_BACKEND == "xgboost":
+            # Native TreeSHAP; contributions are in log-odds rather than probability
+            _explainer = _model.explainer()
+        else:
+            _explainer = TreeExplainer(_model, FEATURE_NAMES)
+        logger.info("Built tree path decomposition for explanations")
+    return _explainer
+
+def explain_label(features: Dict[str, Any]) -> Tuple[bool, float, Dict[str, Any]]:
+    """Get binary prediction, probability and per-feature contributions"""
+    try:
+        p, explanation = explain_encoded(encode_row(features))
+        is_fraud = p >= THRESHOLD
+        logger.info(f"Explained prediction: is_fraud={is_fraud}, probability={p}")
+        return is_fraud, p, explanation
+    except Exception as e:
+        logger.error(f"Error explaining prediction: {str(e)}")
+        raise RuntimeError(f"Failed to explain prediction: {str(e)}")
+
+def explain_encoded(row: List[float]) -> Tuple[float, Dict[str, Any]]:
+    """Probability and explanation for one encoded row.
+
+    With the cascade on, the row is screened first like any prediction, so the
+    probability matches the unexplained path; only escalated rows get full
+    model contributions (``source`` says which model scored the row).
+    """
+    if not settings.CASCADE_ENABLED:
+        return _explain_full(row)
+
+    explained = {}
+    def full_model() -> float:
+        p, explained["explanation"] = _explain_full(row)
+        return p
+
+    p, stage = _get_cascade().predict_proba(row, full_model)
+    logger.info(f"Explained prediction probability: {p} (cascade: {stage})")
+    return p, explained.get("explanation") or dict(SCREENED_EXPLANATION)
+
+def _explain_full(row: List[float]) -> Tuple[float, Dict[str, Any]]:
+    explainer = _get_explainer()
+    probabilities, contributions = explainer.explain(pd.DataFrame([row], columns=FEATURE_NAMES))
+    explanation = {
+        "source": "full_model",
+        "base_value": explainer.bias,
+        "contributions": {
+            name: float(value) for name, value in zip(FEATURE_NAMES, contributions[0])
+        },
+        "output_space": EXPLANATION_OUTPUT_SPACE
+    }
+    return float(probabilities[0]), explanation
+
+def baseline_sample() -> Dict[str, Any]:
+    """Training features and their scores, the reference for drift monitoring"""
+    X, _ = generate_training_data()
+    values = {name: X[name].to_numpy(dtype=np.float64) for name in ("amount", "hour", "user_age")}
+    values["fraud_probability"] = predict_proba_batch(X)
+    return {
+        "values": values,
+        "categories": X["category"].value_counts().to_dict(),
+        "merchants": X["merchant"].value_counts().to_dict(),
+    }
+
+def _load_screening_model() -> ScreeningModel:
+    """Load the screening model, training and saving one if not found"""
+    # Relative paths are next to the forest artifact, not in the working directory
+    path = os.path.join(os.path.dirname(MODEL_PATH), settings.SCREENING_MODEL_PATH)
+    if os.path.exists(path):
+        logger.info(f"Loading screening model from {path}")
+        estimator = joblib.load(path)
+    else:
+        logger.info("Screening model not found, training a new one")
+        X, y = generate_training_data()
+        estimator = train_screening_model(preprocess_batch(X).to_numpy(dtype=float), y)
+        joblib.dump(estimator, path)
+        logger.info(f"Created and saved screening model to {path}")
+    return ScreeningModel(estimator)
+
+def _get_cascade() -> CascadeScorer:
+    global _cascade
+    if _cascade is None:
+        _cascade = CascadeScorer(_load_screening_model(), settings.CASCADE_LOW, settings.CASCADE_HIGH)
+    return _cascade
+
+def cascade_stats() -> Dict[str, Any]:
+    """How much traffic each cascade stage handled in this worker"""
+    if not settings.CASCADE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **_get_cascade().stats()}
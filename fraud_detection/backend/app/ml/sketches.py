@@ -0,0 +1,193 @@
+import base64
+import hashlib
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+
+
+def _hash64(value: str, salt: bytes = b"") -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8, salt=salt).digest(), "little")
+
+
+class QuantileSketch:
+    """DDSketch: log-bucketed counts with bounded relative error on quantiles.
+
+    Values map to bucket ``ceil(log_gamma(x))``, so an update is O(1) and two
+    sketches with the same accuracy merge by adding bucket counts. Values at
+    or below ``min_value`` (e.g. hour 0, probability 0) go to a zero bucket.
+    When more than ``max_buckets`` buckets exist the lowest ones are
+    collapsed, which keeps memory constant.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-6, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float):
+        self.count += 1
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        key = self._key(value)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        lowest = keys[len(keys) - self.max_buckets]
+        for key in keys[:len(keys) - self.max_buckets]:
+            self.buckets[lowest] += self.buckets.pop(key)
+
+    def merge(self, other: "QuantileSketch"):
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen > rank:
+                return 2 * self._gamma ** key / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+    def histogram(self, edges: List[float]) -> np.ndarray:
+        """Counts falling into (-inf, e0], (e0, e1], ..., (e_last, inf)."""
+        counts = np.zeros(len(edges) + 1)
+        edge_keys = [self._key(e) if e > self.min_value else None for e in edges]
+        counts[np.searchsorted(edges, 0.0, side="left")] += self.zero_count
+        for key, count in self.buckets.items():
+            # First edge whose bucket is at or above this bucket
+            index = len(edges)
+            for i, edge_key in enumerate(edge_keys):
+                if edge_key is not None and key <= edge_key:
+                    index = i
+                    break
+            counts[index] += count
+        return counts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "buckets": {str(k): v for k, v in self.buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(relative_accuracy=data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.buckets = {int(k): v for k, v in data["buckets"].items()}
+        return sketch
+
+
+class CountMinSketch:
+    """Approximate per-key counts in fixed memory; merges by adding tables."""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    def _indexes(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=4 * self.depth).digest()
+        return [int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.width for i in range(self.depth)]
+
+    def add(self, key: str, count: int = 1):
+        for row, index in enumerate(self._indexes(key)):
+            self.table[row, index] += count
+        self.total += count
+
+    def estimate(self, key: str) -> int:
+        return int(min(self.table[row, index] for row, index in enumerate(self._indexes(key))))
+
+    def merge(self, other: "CountMinSketch"):
+        self.table += other.table
+        self.total += other.total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "total": self.total,
+            "table": base64.b64encode(self.table.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CountMinSketch":
+        sketch = cls(width=data["width"], depth=data["depth"])
+        sketch.total = data["total"]
+        table = np.frombuffer(base64.b64decode(data["table"]), dtype=np.int64)
+        sketch.table = table.reshape(sketch.depth, sketch.width).copy()
+        return sketch
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**p registers; merges by register max."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, key: str):
+        h = _hash64(key, salt=b"hll")
+        index = h & (self.m - 1)
+        rest = h >> self.p
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> float:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # Small-range correction: linear counting
+            return self.m * math.log(self.m / zeros)
+        return float(raw)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"p": self.p, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(p=data["p"])
+        sketch.registers = np.frombuffer(base64.b64decode(data["registers"]), dtype=np.uint8).copy()
+        return sketch
+
+
+def psi(expected: np.ndarray, actual: np.ndarray, epsilon: float = 1e-4) -> float:
+    """Population stability index between two binned count vectors."""
+    expected = np.asarray(expected, dtype=np.float64)
+    actual = np.asarray(actual, dtype=np.float64)
+    if expected.sum() == 0 or actual.sum() == 0:
+        return 0.0
+    e = np.clip(expected / expected.sum(), epsilon, None)
+    a = np.clip(actual / actual.sum(), epsilon, None)
+    return float(np.sum((a - e) * np.log(a / e)))
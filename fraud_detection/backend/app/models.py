@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, ForeignKey, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -50,9 +50,10 @@ class Transaction(Base):
     fraud_probability = Column(Float, nullable=False)
     confidence_score = Column(Float, nullable=False, default=0.0)
     risk_level = Column(String(20), nullable=False, default='LOW')  # 'LOW', 'MEDIUM', 'HIGH'
+    model_version = Column(String(50), nullable=True)  # artifact that produced the score
 
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     processed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
 
     # Feedback
@@ -62,3 +63,122 @@ class Transaction(Base):
 
     # Relationships
     user = relationship("User", back_populates="transactions")
+
+class ArchivedCount(Base):
+    __tablename__ = "archived_counts"
+
+    # Rows moved to cold storage per user, partition day and filterable columns,
+    # written by app/archive.py in the same transaction that deletes them, so
+    # history totals never have to open a partition
+    user_id = Column(Integer, primary_key=True)
+    day = Column(String(10), primary_key=True)  # 'YYYY-MM-DD', the partition
+    merchant = Column(String(255), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    is_fraud = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "scope", "key", name="uq_idempotency_keys_user_scope_key"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    scope = Column(String(50), nullable=False)  # e.g. 'predict', 'credits_purchase'
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False, default=200)
+    response = Column(Text, nullable=False)  # JSON body returned to the first request
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, nullable=False)
+
+class FeedbackCounter(Base):
+    __tablename__ = "feedback_counters"
+
+    # Running confusion matrix of labelled predictions, maintained by an SQLite trigger on
+    # transactions.feedback_correct (see app/feedback.py)
+    model_version = Column(String(50), primary_key=True)
+    risk_level = Column(String(20), primary_key=True)
+    true_positives = Column(Integer, nullable=False, default=0)
+    false_positives = Column(Integer, nullable=False, default=0)
+    true_negatives = Column(Integer, nullable=False, default=0)
+    false_negatives = Column(Integer, nullable=False, default=0)
+
+# ---------- Sharded mode only (live in the directory database, see app/sharding.py) ----------
+class UserDirectory(Base):
+    __tablename__ = "user_directory"
+
+    # Allocates globally unique user ids and keeps logins unique across shards
+    id = Column(Integer, primary_key=True)
+    email = Column(String(120), unique=True, index=True, nullable=False)
+    username = Column(String(60), unique=True, index=True, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class IdBlock(Base):
+    __tablename__ = "id_blocks"
+
+    # Next unreserved id per sequence; workers reserve blocks of ids from here
+    name = Column(String(50), primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    # Change counters bumped by triggers (see app/data_versions.py): one row per
+    # user, 0 for the global counter, -1 for the random epoch of this database
+    scope_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class DriftSketch(Base):
+    __tablename__ = "drift_sketches"
+
+    # One row per API worker process; the admin drift report merges them all
+    worker_id = Column(String(64), primary_key=True)
+    state = Column(Text, nullable=False)  # JSON-serialized sketches
+    epoch = Column(Integer, nullable=True)  # DriftWindow.epoch the sketches were collected in
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class DriftWindow(Base):
+    __tablename__ = "drift_window"
+
+    # Single row; reset bumps epoch and every worker drops its sketches when it sees the change
+    id = Column(Integer, primary_key=True)
+    epoch = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+# ---------- Analytics rollups (maintained by triggers, see app/rollups.py) ----------
+class RollupHourly(Base):
+    __tablename__ = "rollup_hourly"
+
+    bucket = Column(String(16), primary_key=True)  # 'YYYY-MM-DD HH:00' (UTC)
+    count = Column(Integer, nullable=False, default=0)
+    fraud_count = Column(Integer, nullable=False, default=0)
+    amount_sum = Column(Float, nullable=False, default=0.0)
+    low_count = Column(Integer, nullable=False, default=0)
+    medium_count = Column(Integer, nullable=False, default=0)
+    high_count = Column(Integer, nullable=False, default=0)
+
+class RollupHourlyCategory(Base):
+    __tablename__ = "rollup_hourly_category"
+
+    bucket = Column(String(16), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    fraud_count = Column(Integer, nullable=False, default=0)
+
+class RollupDaily(Base):
+    __tablename__ = "rollup_daily"
+
+    day = Column(String(10), primary_key=True)  # 'YYYY-MM-DD' (UTC)
+    count = Column(Integer, nullable=False, default=0)
+    fraud_count = Column(Integer, nullable=False, default=0)
+    amount_sum = Column(Float, nullable=False, default=0.0)
+    low_count = Column(Integer, nullable=False, default=0)
+    medium_count = Column(Integer, nullable=False, default=0)
+    high_count = Column(Integer, nullable=False, default=0)
+
+class RollupDailyCategory(Base):
+    __tablename__ = "rollup_daily_category"
+
+    day = Column(String(10), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    fraud_count = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,190 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException, Request, status
+from starlette.requests import HTTPConnection
+
+from app.config import settings
+from app.utils.jwt_handler import decode_token
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by user id or client IP.
+
+    Buckets refill lazily on access, so a check is O(1). Idle keys are
+    evicted least-recently-used once ``max_keys`` is exceeded.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str) -> float:
+        """Take one token; return 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [float(self.burst), now]
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            return (1 - bucket[0]) / self.rate
+
+
+class AdmissionController:
+    """Bound concurrent requests and the queue waiting behind them.
+
+    Requests beyond ``max_concurrency`` wait up to ``queue_timeout`` for a
+    slot; once ``max_queue`` requests are already waiting, new ones are shed
+    immediately. Admitted requests therefore never queue for long, which keeps
+    their latency bounded under overload.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+
+    def _overloaded(self):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is at capacity, please retry shortly",
+            headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)}
+        )
+
+    async def acquire(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            return
+
+        if self._waiting >= self.max_queue:
+            self._overloaded()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._overloaded()
+        finally:
+            self._waiting -= 1
+
+    def release(self):
+        self._semaphore.release()
+
+
+def client_ip(request: HTTPConnection) -> str:
+    if settings.RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def _enforce(limiter: TokenBucketLimiter, key: str):
+    retry_after = limiter.try_acquire(key)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+
+_predict_ip_limiter = TokenBucketLimiter(settings.PREDICT_IP_RATE, settings.PREDICT_IP_BURST)
+_predict_user_limiter = TokenBucketLimiter(settings.PREDICT_USER_RATE, settings.PREDICT_USER_BURST)
+_login_ip_limiter = TokenBucketLimiter(settings.LOGIN_IP_RATE, settings.LOGIN_IP_BURST)
+
+_predict_admission = AdmissionController(
+    settings.PREDICT_MAX_CONCURRENCY, settings.PREDICT_MAX_QUEUE, settings.ADMISSION_QUEUE_TIMEOUT
+)
+_login_admission = AdmissionController(
+    settings.LOGIN_MAX_CONCURRENCY, settings.LOGIN_MAX_QUEUE, settings.ADMISSION_QUEUE_TIMEOUT
+)
+
+
+# ---------- Route dependencies ----------
+async def limit_predict(request: Request):
+    """Per-IP and per-user token buckets, then admission, ahead of auth and scoring."""
+    if not settings.RATE_LIMIT_ENABLED:
+        yield
+        return
+
+    _enforce(_predict_ip_limiter, client_ip(request))
+
+    # The token subject is enough to key the bucket; auth proper happens later
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        payload = decode_token(authorization[7:])
+        if payload and "sub" in payload:
+            _enforce(_predict_user_limiter, f"user:{payload['sub']}")
+
+    await _predict_admission.acquire()
+    try:
+        yield
+    finally:
+        _predict_admission.release()
+
+
+async def limit_login(request: Request):
+    """Per-IP token bucket and admission for password checks."""
+    if not settings.RATE_LIMIT_ENABLED:
+        yield
+        return
+
+    _enforce(_login_ip_limiter, client_ip(request))
+
+    await _login_admission.acquire()
+    try:
+        yield
+    finally:
+        _login_admission.release()
+
+
+# ---------- Streaming endpoints: per connection, per transaction and per scored batch ----------
+def limit_stream(connection: HTTPConnection, user_id: int):
+    """Charge opening a scoring stream like one predict request (429 when over the limit)."""
+    if settings.RATE_LIMIT_ENABLED:
+        _enforce(_predict_ip_limiter, client_ip(connection))
+        _enforce(_predict_user_limiter, f"user:{user_id}")
+
+
+def stream_item_retry_after(connection: HTTPConnection, user_id: int) -> float:
+    """Take one predict token for a streamed transaction; 0 if allowed, else seconds to wait."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return 0.0
+    return (_predict_ip_limiter.try_acquire(client_ip(connection))
+            or _predict_user_limiter.try_acquire(f"user:{user_id}"))
+
+
+@asynccontextmanager
+async def stream_admission():
+    """Predict admission slot held while one streamed batch is scored (503 when shed)."""
+    if not settings.RATE_LIMIT_ENABLED:
+        yield
+        return
+    await _predict_admission.acquire()
+    try:
+        yield
+    finally:
+        _predict_admission.release()
@@ -0,0 +1,223 @@
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Keeps the hourly rollups current on every insert, whether it comes from the
+# ORM or from the write-behind executemany path.
+_TRIGGER_DDL = """
+CREATE TRIGGER IF NOT EXISTS trg_transactions_rollup
+AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO rollup_hourly (bucket, count, fraud_count, amount_sum, low_count, medium_count, high_count)
+    VALUES (
+        strftime('%Y-%m-%d %H:00', COALESCE(NEW.created_at, CURRENT_TIMESTAMP)),
+        1,
+        CASE WHEN NEW.is_fraud THEN 1 ELSE 0 END,
+        NEW.amount,
+        CASE WHEN NEW.risk_level = 'LOW' THEN 1 ELSE 0 END,
+        CASE WHEN NEW.risk_level = 'MEDIUM' THEN 1 ELSE 0 END,
+        CASE WHEN NEW.risk_level = 'HIGH' THEN 1 ELSE 0 END
+    )
+    ON CONFLICT(bucket) DO UPDATE SET
+        count = count + 1,
+        fraud_count = fraud_count + excluded.fraud_count,
+        amount_sum = amount_sum + excluded.amount_sum,
+        low_count = low_count + excluded.low_count,
+        medium_count = medium_count + excluded.medium_count,
+        high_count = high_count + excluded.high_count;
+
+    INSERT INTO rollup_hourly_category (bucket, category, count, fraud_count)
+    VALUES (
+        strftime('%Y-%m-%d %H:00', COALESCE(NEW.created_at, CURRENT_TIMESTAMP)),
+        NEW.category,
+        1,
+        CASE WHEN NEW.is_fraud THEN 1 ELSE 0 END
+    )
+    ON CONFLICT(bucket, category) DO UPDATE SET
+        count = count + 1,
+        fraud_count = fraud_count + excluded.fraud_count;
+END
+"""
+
+_METRICS = "count, fraud_count, amount_sum, low_count, medium_count, high_count"
+
+_last_compaction = 0.0
+
+
+def install(engine: Engine):
+    """Create the rollup trigger and backfill rollups for pre-existing rows."""
+    with engine.begin() as conn:
+        conn.execute(text(_TRIGGER_DDL))
+        has_rollups = conn.execute(text("SELECT 1 FROM rollup_hourly LIMIT 1")).first() or \
+            conn.execute(text("SELECT 1 FROM rollup_daily LIMIT 1")).first()
+        has_rows = conn.execute(text("SELECT 1 FROM transactions LIMIT 1")).first()
+        if has_rows and not has_rollups:
+            logger.info("Backfilling analytics rollups from transactions")
+            rebuild(conn)
+    maybe_compact([engine], force=True)
+
+
+def rebuild(conn):
+    """Recompute all rollups from the transactions table (one full scan)."""
+    for table in ("rollup_hourly", "rollup_hourly_category", "rollup_daily", "rollup_daily_category"):
+        conn.execute(text(f"DELETE FROM {table}"))
+    conn.execute(text(f"""
+        INSERT INTO rollup_hourly (bucket, {_METRICS})
+        SELECT strftime('%Y-%m-%d %H:00', created_at), COUNT(*),
+               SUM(CASE WHEN is_fraud THEN 1 ELSE 0 END), SUM(amount),
+               SUM(CASE WHEN risk_level = 'LOW' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN risk_level = 'MEDIUM' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN risk_level = 'HIGH' THEN 1 ELSE 0 END)
+        FROM transactions WHERE created_at IS NOT NULL
+        GROUP BY 1
+    """))
+    conn.execute(text("""
+        INSERT INTO rollup_hourly_category (bucket, category, count, fraud_count)
+        SELECT strftime('%Y-%m-%d %H:00', created_at), category, COUNT(*),
+               SUM(CASE WHEN is_fraud THEN 1 ELSE 0 END)
+        FROM transactions WHERE created_at IS NOT NULL
+        GROUP BY 1, 2
+    """))
+
+
+def compact(engine: Engine, retention_days: int):
+    """Fold hourly buckets of days older than the retention into daily buckets."""
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            INSERT INTO rollup_daily (day, {_METRICS})
+            SELECT substr(bucket, 1, 10), SUM(count), SUM(fraud_count), SUM(amount_sum),
+                   SUM(low_count), SUM(medium_count), SUM(high_count)
+            FROM rollup_hourly WHERE bucket < :cutoff
+            GROUP BY substr(bucket, 1, 10)
+            ON CONFLICT(day) DO UPDATE SET
+                count = count + excluded.count,
+                fraud_count = fraud_count + excluded.fraud_count,
+                amount_sum = amount_sum + excluded.amount_sum,
+                low_count = low_count + excluded.low_count,
+                medium_count = medium_count + excluded.medium_count,
+                high_count = high_count + excluded.high_count
+        """), {"cutoff": cutoff})
+        conn.execute(text("""
+            INSERT INTO rollup_daily_category (day, category, count, fraud_count)
+            SELECT substr(bucket, 1, 10), category, SUM(count), SUM(fraud_count)
+            FROM rollup_hourly_category WHERE bucket < :cutoff
+            GROUP BY substr(bucket, 1, 10), category
+            ON CONFLICT(day, category) DO UPDATE SET
+                count = count + excluded.count,
+                fraud_count = fraud_count + excluded.fraud_count
+        """), {"cutoff": cutoff})
+        conn.execute(text("DELETE FROM rollup_hourly WHERE bucket < :cutoff"), {"cutoff": cutoff})
+        conn.execute(text("DELETE FROM rollup_hourly_category WHERE bucket < :cutoff"), {"cutoff": cutoff})
+
+
+def maybe_compact(engines: List[Engine], force: bool = False):
+    """Compact every database holding transactions, at most once per interval."""
+    global _last_compaction
+    if force or time.monotonic() - _last_compaction >= settings.ROLLUP_COMPACT_INTERVAL:
+        _last_compaction = time.monotonic()
+        for engine in engines:
+            compact(engine, settings.ROLLUP_HOURLY_RETENTION_DAYS)
+
+
+def query(db: Session, start: date, end: date, granularity: str = "day") -> Dict[str, Any]:
+    """Totals, per-category counts and a time series for [start, end] (UTC days)."""
+    params = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "end_next": (end + timedelta(days=1)).isoformat(),
+    }
+    # Days already compacted only exist at daily resolution
+    bucket = "bucket" if granularity == "hour" else "substr(bucket, 1, 10)"
+
+    series_rows = db.execute(text(f"""
+        SELECT b, SUM(count), SUM(fraud_count), SUM(amount_sum),
+               SUM(low_count), SUM(medium_count), SUM(high_count)
+        FROM (
+            SELECT day AS b, {_METRICS} FROM rollup_daily
+            WHERE day >= :start AND day <= :end
+            UNION ALL
+            SELECT {bucket} AS b, {_METRICS} FROM rollup_hourly
+            WHERE bucket >= :start AND bucket < :end_next
+        )
+        GROUP BY b ORDER BY b
+    """), params).all()
+
+    category_rows = db.execute(text("""
+        SELECT category, SUM(count), SUM(fraud_count)
+        FROM (
+            SELECT category, count, fraud_count FROM rollup_daily_category
+            WHERE day >= :start AND day <= :end
+            UNION ALL
+            SELECT category, count, fraud_count FROM rollup_hourly_category
+            WHERE bucket >= :start AND bucket < :end_next
+        )
+        GROUP BY category
+    """), params).all()
+
+    series = [{
+        "bucket": row[0],
+        "count": row[1],
+        "fraud_count": row[2],
+        "amount_sum": round(row[3], 2),
+        "risk_levels": {"LOW": row[4], "MEDIUM": row[5], "HIGH": row[6]},
+    } for row in series_rows]
+    categories = {row[0]: {"count": row[1], "fraud_count": row[2]} for row in category_rows}
+    return _result(start, end, granularity, series, categories)
+
+
+def merge(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine query() results over the same range from several databases (shards)."""
+    series: Dict[str, Dict[str, Any]] = {}
+    categories: Dict[str, Dict[str, int]] = {}
+    for result in results:
+        for point in result["series"]:
+            merged = series.setdefault(point["bucket"], {
+                "bucket": point["bucket"], "count": 0, "fraud_count": 0, "amount_sum": 0.0,
+                "risk_levels": dict.fromkeys(("LOW", "MEDIUM", "HIGH"), 0),
+            })
+            merged["count"] += point["count"]
+            merged["fraud_count"] += point["fraud_count"]
+            merged["amount_sum"] = round(merged["amount_sum"] + point["amount_sum"], 2)
+            for level, count in point["risk_levels"].items():
+                merged["risk_levels"][level] += count
+        for category, counts in result["categories"].items():
+            merged = categories.setdefault(category, {"count": 0, "fraud_count": 0})
+            merged["count"] += counts["count"]
+            merged["fraud_count"] += counts["fraud_count"]
+    first = results[0]
+    return _result(
+        date.fromisoformat(first["start"]), date.fromisoformat(first["end"]), first["granularity"],
+        [series[bucket] for bucket in sorted(series)], categories
+    )
+
+
+def _result(start: date, end: date, granularity: str, series: List[Dict[str, Any]], categories) -> Dict[str, Any]:
+    total = sum(point["count"] for point in series)
+    fraud = sum(point["fraud_count"] for point in series)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "totals": {
+            "count": total,
+            "fraud_count": fraud,
+            "fraud_rate": 0 if total == 0 else round(fraud / total, 4),
+            "amount_sum": round(sum(point["amount_sum"] for point in series), 2),
+            "risk_levels": {
+                level: sum(point["risk_levels"][level] for point in series)
+                for level in ("LOW", "MEDIUM", "HIGH")
+            },
+        },
+        "categories": categories,
+        "series": series,
+    }
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from app import data_versions, feedback, rollups, sharding
 from app.auth import get_current_user
-from app.database import get_db
+from app.database import SessionLocal, all_engines, get_db
 from app.models import User, Transaction
 from app.schemas import UserOut
+from app.ml.drift import monitor as drift_monitor
+from app.ml.inference import cascade_stats
 from app.utils.hashing import hash_password
 
 router = APIRouter()
@@ -19,6 +23,9 @@ async def get_all_users(
     admin: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
+    if sharding.enabled():
+        shards = sharding.fan_out(lambda shard_db: shard_db.query(User).all())
+        return sorted((user for users in shards for user in users), key=lambda user: user.id)
     return db.query(User).all()
 
 @router.put("/users/{user_id}/credits")
@@ -28,11 +35,12 @@ async def update_user_credits(
     admin: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    user.credits = credits
-    db.commit()
+    with sharding.user_session(user_id, db) as user_db:
+        user = user_db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user.credits = credits
+        user_db.commit()
     return {"message": "Credits updated successfully"}
 
 @router.delete("/users/{user_id}")
@@ -41,20 +49,44 @@ async def delete_user(
     admin: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    if user.is_admin:
-        raise HTTPException(status_code=400, detail="Cannot delete admin user")
-    db.delete(user)
-    db.commit()
+    with sharding.user_session(user_id, db) as user_db:
+        user = user_db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if user.is_admin:
+            raise HTTPException(status_code=400, detail="Cannot delete admin user")
+        user_db.delete(user)
+        user_db.commit()
+    if sharding.enabled():
+        # Free the email/username for reuse
+        directory = SessionLocal()
+        try:
+            sharding.unregister_user(directory, user_id)
+        finally:
+            directory.close()
     return {"message": "User deleted successfully"}
 
 @router.get("/stats")
 async def get_admin_stats(
+    request: Request,
     admin: User = Depends(require_admin),
     db: Session = Depends(get_db)
 ):
+    if sharding.enabled():
+        # Fan out to every shard; the ETag changes when any shard's global version does
+        versions = sharding.fan_out(lambda shard_db: data_versions.current(shard_db, data_versions.GLOBAL_SCOPE))
+        return data_versions.versioned_response(
+            request, "admin-stats", ".".join(map(str, versions)),
+            lambda: _merge_stats(sharding.fan_out(_admin_stats))
+        )
+    return data_versions.versioned_response(
+        request, "admin-stats", data_versions.current(db, data_versions.GLOBAL_SCOPE), lambda: _admin_stats(db)
+    )
+
+def _merge_stats(shard_stats: List[dict]) -> dict:
+    return {key: sum(stats[key] for stats in shard_stats) for key in shard_stats[0]}
+
+def _admin_stats(db: Session):
     total_users = db.query(User).count()
     total_transactions = db.query(Transaction).count()
     fraud_transactions = db.query(Transaction).filter(Transaction.is_fraud == True).count()
@@ -62,4 +94,50 @@ async def get_admin_stats(
         "total_users": total_users,
         "total_transactions": total_transactions,
         "fraud_transactions": fraud_transactions
-    }
\ No newline at end of file
+    }
+
+@router.get("/analytics")
+async def get_analytics(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    granularity: str = "day",
+    admin: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    if granularity not in ("day", "hour"):
+        raise HTTPException(status_code=400, detail="granularity must be 'day' or 'hour'")
+    end_date = end_date or datetime.utcnow().date()
+    start_date = start_date or end_date - timedelta(days=29)
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+
+    rollups.maybe_compact(all_engines())
+    if sharding.enabled():
+        return rollups.merge(sharding.fan_out(
+            lambda shard_db: rollups.query(shard_db, start_date, end_date, granularity)
+        ))
+    return rollups.query(db, start_date, end_date, granularity)
+
+# Drift sketches live in the main database whatever the request's shard
+@router.get("/drift")
+async def get_drift_report(admin: User = Depends(require_admin)):
+    return drift_monitor.report()
+
+@router.post("/drift/reset")
+async def reset_drift_window(admin: User = Depends(require_admin)):
+    drift_monitor.reset()
+    return {"message": "Drift monitoring window reset"}
+
+
+@router.get("/cascade")
+async def get_cascade_stats(admin: User = Depends(require_admin)):
+    return cascade_stats()
+
+@router.get("/feedback/metrics")
+async def get_feedback_metrics(
+    admin: User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    if sharding.enabled():
+        return feedback.summarize([row for rows in sharding.fan_out(feedback.counter_rows) for row in rows])
+    return feedback.metrics(db)
@@ -1,8 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
+from app import sharding
 from app.database import get_db
-from app.models import User
+from app.models import User, UserDirectory
+from app.rate_limit import limit_login
 from app.schemas import UserCreate, UserLogin, Token
 from app.utils.hashing import hash_password, verify_password
 from app.utils.jwt_handler import create_access_token
@@ -11,12 +13,15 @@ router = APIRouter()
 
 @router.post("/register", response_model=Token)
 def register(payload: UserCreate, db: Session = Depends(get_db)):
+    # Sharded: db is the directory, which owns uniqueness and the user id
+    model = UserDirectory if sharding.enabled() else User
+
     # check duplicates
-    if db.query(User).filter(User.email == payload.email).first():
+    if db.query(model).filter(model.email == payload.email).first():
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Check for duplicate username
-    if db.query(User).filter(User.username == payload.username).first():
+    if db.query(model).filter(model.username == payload.username).first():
         raise HTTPException(status_code=400, detail="Username already taken")
 
     user = User(
@@ -26,35 +31,49 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
         password_hash=hash_password(payload.password),
         credits=100  # Give new users 100 initial credits
     )
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    if sharding.enabled():
+        # Directory first: it decides uniqueness, and a failed shard write is undone below
+        user.id = sharding.register_user(db, payload.email, payload.username)
+        db.commit()
+        try:
+            with sharding.user_session(user.id, db) as user_db:
+                user_db.add(user)
+                user_db.commit()
+                user_db.refresh(user)
+        except Exception:
+            sharding.unregister_user(db, user.id)
+            raise
+    else:
+        db.add(user)
+        db.commit()
+        db.refresh(user)
 
-    token = create_access_token(sub=str(user.id))
-    return Token(
-        access_token=token,
-        user={
-            "id": user.id,
-            "name": user.name,
-            "email": user.email,
-            "credits": user.credits,
-            "created_at": user.created_at.isoformat()
-        }
-    )
+    return _token_response(user)
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(limit_login)])
 def login(payload: UserLogin, db: Session = Depends(get_db)):
-    # Try to find user by email
-    user = db.query(User).filter(User.email == payload.email).first()
-    
-    # If not found by email, try username
-    if not user:
-        user = db.query(User).filter(User.username == payload.email).first()
+    if sharding.enabled():
+        # Resolve the email/username in the directory, then read the user's shard
+        user = None
+        user_id = sharding.find_user_id(db, payload.email)
+        if user_id is not None:
+            with sharding.user_session(user_id, db) as user_db:
+                user = user_db.query(User).filter(User.id == user_id).first()
+    else:
+        # Try to find user by email
+        user = db.query(User).filter(User.email == payload.email).first()
+
+        # If not found by email, try username
+        if not user:
+            user = db.query(User).filter(User.username == payload.email).first()
     
     # Check user exists and password is correct
     if not user or not verify_password(payload.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
+    return _token_response(user)
+
+def _token_response(user: User) -> Token:
     token = create_access_token(sub=str(user.id))
     return Token(
         access_token=token,
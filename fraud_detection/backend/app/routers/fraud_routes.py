@@ -1,12 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+import asyncio
+import json
+import math
+from fastapi import APIRouter, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, validator
+from typing import Any, Dict, Optional, List
 from datetime import datetime, timedelta
+from sqlalchemy import insert, text
 from sqlalchemy.orm import Session
-from app.ml.model_loader import predict_label
+from app.config import settings
+from app.ml.features import risk_band
+from app.ml.inference import model_version, predict_label, predict_label_batch, explain_label
+from app.ml.drift import monitor as drift_monitor
 from app.database import get_db
 from app.models import User, CreditPurchase, Transaction
 from app.auth import get_current_user
+from app.rate_limit import limit_predict, limit_stream, stream_admission, stream_item_retry_after
+from app import idempotency, sharding
+from app.utils.jwt_handler import decode_token
+from app import write_behind
 import logging
 
 router = APIRouter()
@@ -37,6 +50,9 @@ class CreditPurchaseRequest(BaseModel):
 def check_and_reset_credits(user: User, db: Session):
     days_since_reset = (datetime.utcnow() - user.last_credit_reset).days
     if days_since_reset >= 5:
+        if write_behind.writer:
+            # Land journaled debits before the reset so they don't apply after it
+            write_behind.writer.flush()
         user.credits = 100
         user.last_credit_reset = datetime.utcnow()
         db.commit()
@@ -45,8 +61,14 @@ def check_and_reset_credits(user: User, db: Session):
 async def purchase_credits(
     purchase: CreditPurchaseRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Depends(idempotency.get_idempotency_key)
 ):
+    request_hash = idempotency.fingerprint(purchase.dict())
+    replay = idempotency.lookup(db, current_user.id, "credits_purchase", idempotency_key, request_hash)
+    if replay:
+        return replay
+
     credits_per_dollar = 20  # $5 = 100 credits
     credits_to_add = int(purchase.amount * credits_per_dollar)
     
@@ -57,10 +79,16 @@ async def purchase_credits(
     )
     db.add(credit_purchase)
     
-    current_user.credits += credits_to_add
-    db.commit()
-    
-    return {"message": f"Successfully purchased {credits_to_add} credits"}
+    # Increment in SQL: the write-behind writer may debit this row concurrently
+    current_user.credits = User.credits + credits_to_add
+
+    response = {"message": f"Successfully purchased {credits_to_add} credits"}
+    idempotency.remember(db, current_user.id, "credits_purchase", idempotency_key, request_hash, response)
+    replay = idempotency.commit_or_replay(db, current_user.id, "credits_purchase", idempotency_key, request_hash)
+    if replay:
+        return replay
+
+    return response
 
 @router.get("/credits/balance")
 async def get_credit_balance(
@@ -70,15 +98,28 @@ async def get_credit_balance(
     check_and_reset_credits(current_user, db)
     return {"credits": current_user.credits}
 
-@router.post("/predict")
+@router.post("/predict", dependencies=[Depends(limit_predict)])
 async def predict_fraud(
     tx: TransactionRequest,
+    explain: bool = False,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Depends(idempotency.get_idempotency_key)
 ):
     check_and_reset_credits(current_user, db)
-    
-    if current_user.credits < 10:
+
+    # A retry with a known Idempotency-Key gets the stored result: no inference, no writes
+    request_hash = idempotency.fingerprint({**tx.dict(), "explain": explain})
+    replay = idempotency.lookup(db, current_user.id, "predict", idempotency_key, request_hash)
+    if replay:
+        return replay
+
+    # Debits still sitting in this worker's write-behind journal count against the
+    # balance; other workers' don't, so the writer's debit is guarded as well
+    pending_debits = write_behind.writer.pending_debits(current_user.id) if write_behind.writer else 0
+    available_credits = current_user.credits - pending_debits
+
+    if available_credits < 10:
         raise HTTPException(
             status_code=402,
             detail="Insufficient credits. Fraud check requires 10 credits."
@@ -93,15 +134,23 @@ async def predict_fraud(
             "user_age": tx.user_age
         }
 
-        # Get fraud prediction
-        is_fraud, probability = predict_label(features)
+        # Get fraud prediction, with per-feature contributions when asked
+        explanation = None
+        if explain:
+            is_fraud, probability, explanation = explain_label(features)
+        else:
+            is_fraud, probability = predict_label(features)
+
+        # Feed the streaming drift sketches
+        drift_monitor.observe(features, probability)
 
         # Calculate risk level and confidence score
-        risk_level = "HIGH" if probability > 0.7 else "MEDIUM" if probability > 0.3 else "LOW"
+        risk_level = risk_band(probability)
         confidence_score = probability
 
         # Save transaction to database
-        transaction = Transaction(
+        now = datetime.utcnow()
+        row = dict(
             user_id=current_user.id,
             amount=tx.amount,
             merchant=tx.merchant,
@@ -112,15 +161,27 @@ async def predict_fraud(
             is_fraud=is_fraud,
             fraud_probability=probability,
             confidence_score=confidence_score,
-            risk_level=risk_level
+            risk_level=risk_level,
+            model_version=model_version(),
+            created_at=now,
+            processed_at=now
         )
-        db.add(transaction)
 
-        # Deduct credits after successful prediction
-        current_user.credits -= 10
+        if write_behind.writer:
+            transaction_id = None
+            credits_remaining = available_credits - 10
+        else:
+            sharding.assign_transaction_ids([row])
+            transaction = Transaction(**row)
+            db.add(transaction)
 
-        # Commit both transaction and credit update
-        db.commit()
+            # Deduct credits after successful prediction
+            current_user.credits -= 10
+
+            # Assign the id now; the commit happens once the response is built
+            db.flush()
+            transaction_id = transaction.id
+            credits_remaining = current_user.credits
 
         # Log prediction for monitoring
         logger.info(
@@ -130,21 +191,23 @@ async def predict_fraud(
         )
 
         # Return detailed response
-        return {
+        response = {
             "prediction": {
                 "is_fraud": is_fraud,
                 "fraud_probability": round(float(probability), 3),
-                "risk_level": "HIGH" if probability > 0.7 else "MEDIUM" if probability > 0.3 else "LOW"
+                "risk_level": risk_level
             },
             "transaction": {
-                "id": transaction.id,
-                "amount": transaction.amount,
-                "merchant": transaction.merchant,
-                "category": transaction.category,
-                "created_at": transaction.created_at.isoformat()
+                "id": transaction_id,
+                "amount": tx.amount,
+                "merchant": tx.merchant,
+                "category": tx.category,
+                "created_at": now.isoformat()
             },
-            "credits_remaining": current_user.credits
+            "credits_remaining": credits_remaining
         }
+        if explanation is not None:
+            response["explanation"] = explanation
         
     except Exception as e:
         logger.error(f"Error making fraud prediction: {str(e)}")
@@ -152,3 +215,272 @@ async def predict_fraud(
             status_code=500,
             detail="Error processing fraud detection request"
         )
+
+    # The stored response commits atomically with the transaction and debit
+    if write_behind.writer:
+        # Journal the row, the debit and the idempotency record; the background
+        # writer group-commits them together and drops a lost key race uncharged
+        write_behind.writer.submit(row, debit=10, idempotency=idempotency.record(
+            current_user.id, "predict", idempotency_key, request_hash, response
+        ))
+    else:
+        idempotency.remember(db, current_user.id, "predict", idempotency_key, request_hash, response)
+        replay = idempotency.commit_or_replay(db, current_user.id, "predict", idempotency_key, request_hash)
+        if replay:
+            return replay
+    return response
+
+
+# ---------- Streaming scoring ----------
+def _parse_stream_item(line) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return line  # Not a JSON object; reported back as an error
+
+def _score_stream_batch(db: Session, user_id: int, items: List[Any]) -> List[Dict[str, Any]]:
+    """Validate, bill, score and persist one batch of streamed transactions.
+
+    Results are returned in input order. Credits are checked and debited once
+    for the whole batch; transactions beyond the balance get an error result.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    valid = []
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {"ref": None, "error": "Expected a JSON object"}
+            continue
+        ref = item.get("ref")
+        try:
+            tx = TransactionRequest(**{k: v for k, v in item.items() if k != "ref"})
+        except ValidationError as e:
+            results[i] = {"ref": ref, "error": "; ".join(err["msg"] for err in e.errors())}
+            continue
+        valid.append((i, ref, tx))
+
+    pending_debits = write_behind.writer.pending_debits(user_id) if write_behind.writer else 0
+    credits = db.query(User.credits).filter(User.id == user_id).scalar()
+    affordable = max((credits - pending_debits) // 10, 0)
+    billed = valid[:affordable]
+    for i, ref, _ in valid[affordable:]:
+        results[i] = {"ref": ref, "error": "Insufficient credits. Fraud check requires 10 credits."}
+    if not billed:
+        return results
+
+    features = [{
+        "amount": tx.amount,
+        "merchant": tx.merchant.lower(),
+        "category": tx.category,
+        "hour": tx.hour,
+        "user_age": tx.user_age
+    } for _, _, tx in billed]
+    try:
+        predictions = predict_label_batch(features)
+    except RuntimeError:
+        for i, ref, _ in billed:
+            results[i] = {"ref": ref, "error": "Error processing fraud detection request"}
+        return results
+
+    now = datetime.utcnow()
+    rows = []
+    for (_, _, tx), (is_fraud, probability) in zip(billed, predictions):
+        rows.append(dict(
+            user_id=user_id,
+            amount=tx.amount,
+            merchant=tx.merchant,
+            category=tx.category,
+            hour=tx.hour,
+            user_age=tx.user_age,
+            description=tx.description,
+            is_fraud=is_fraud,
+            fraud_probability=probability,
+            confidence_score=probability,
+            risk_level=risk_band(probability),
+            model_version=model_version(),
+            created_at=now,
+            processed_at=now
+        ))
+
+    cost = 10 * len(billed)
+    if write_behind.writer:
+        write_behind.writer.submit_many(rows, debit_per_row=10)
+        ids = [None] * len(rows)
+    else:
+        # Guarded debit: a concurrent request may have spent the balance meanwhile
+        debited = db.execute(
+            text("UPDATE users SET credits = credits - :cost WHERE id = :user_id AND credits >= :cost"),
+            {"cost": cost, "user_id": user_id}
+        ).rowcount
+        if not debited:
+            db.rollback()
+            for i, ref, _ in billed:
+                results[i] = {"ref": ref, "error": "Insufficient credits. Fraud check requires 10 credits."}
+            return results
+        sharding.assign_transaction_ids(rows)
+        ids = db.execute(
+            insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        db.commit()
+
+    credits_remaining = credits - pending_debits - cost
+    for (i, ref, _), feature, row, transaction_id in zip(billed, features, rows, ids):
+        drift_monitor.observe(feature, row["fraud_probability"])
+        results[i] = {
+            "ref": ref,
+            "prediction": {
+                "is_fraud": row["is_fraud"],
+                "fraud_probability": round(row["fraud_probability"], 3),
+                "risk_level": row["risk_level"]
+            },
+            "transaction_id": transaction_id,
+            "credits_remaining": credits_remaining
+        }
+    return results
+
+def _stream_ref(item: Any) -> Any:
+    return item.get("ref") if isinstance(item, dict) else None
+
+async def _score_stream_items(connection, db: Session, user_id: int, items: List[Any]) -> List[Dict[str, Any]]:
+    """Rate-limit each streamed transaction, then score the admitted ones as one batch."""
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    allowed = []
+    for i, item in enumerate(items):
+        retry_after = stream_item_retry_after(connection, user_id)
+        if retry_after:
+            results[i] = {"ref": _stream_ref(item), "error": "Rate limit exceeded",
+                          "retry_after": math.ceil(retry_after)}
+        else:
+            allowed.append(i)
+    if not allowed:
+        return results
+
+    try:
+        async with stream_admission():
+            scored = await run_in_threadpool(_score_stream_batch, db, user_id, [items[i] for i in allowed])
+    except HTTPException as e:
+        # Shed by admission control; nothing was billed
+        scored = [{"ref": _stream_ref(items[i]), "error": e.detail, "retry_after": settings.ADMISSION_RETRY_AFTER}
+                  for i in allowed]
+    for i, result in zip(allowed, scored):
+        results[i] = result
+    return results
+
+@router.websocket("/stream")
+async def stream_predictions(
+    websocket: WebSocket,
+    token: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Score a continuous stream of transactions over one authenticated socket.
+
+    Authenticate once with ``?token=`` or an Authorization header, then send one
+    TransactionRequest JSON object per message (an optional ``ref`` is echoed
+    back). Results are sent in order, one message per transaction.
+    """
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        token = authorization[7:] if authorization.lower().startswith("bearer ") else None
+    payload = decode_token(token) if token else None
+    user = db.query(User).filter(User.id == int(payload["sub"])).first() if payload and "sub" in payload else None
+    if not user:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    try:
+        limit_stream(websocket, user.id)
+    except HTTPException:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    await websocket.accept()
+    check_and_reset_credits(user, db)
+    user_id = user.id
+
+    # Bounded hand-off: once it is full we stop reading and TCP pushes back on the client
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.STREAM_MAX_INFLIGHT)
+    # Set when we end the stream ourselves; None means the client went away
+    close_code: Optional[int] = None
+
+    async def reader():
+        nonlocal close_code
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("text") is None:
+                    close_code = status.WS_1003_UNSUPPORTED_DATA  # binary frame
+                    return
+                await queue.put(_parse_stream_item(message["text"]))
+        except Exception as e:
+            logger.error(f"Error reading prediction stream: {str(e)}")
+            close_code = status.WS_1011_INTERNAL_ERROR
+        finally:
+            # However reading ended, wake the scoring loop
+            await queue.put(None)
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        closing = False
+        while not closing:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < settings.STREAM_BATCH_SIZE and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            results = await _score_stream_items(websocket, db, user_id, batch)
+            if closing and close_code is None:
+                break  # the client is gone, there is nobody to send to
+            for result in results:
+                await websocket.send_text(json.dumps(result))
+        if close_code is not None:
+            await websocket.close(code=close_code)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader_task.cancel()
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that may keep reading the request body while it streams.
+
+    The stock response listens for client disconnects on ``receive`` on older
+    ASGI servers, which would swallow the body chunks the generator is reading.
+    A disconnect still surfaces here as the body stream ending.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+@router.post("/predict/stream")
+async def stream_predictions_ndjson(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Chunked NDJSON variant: one transaction per request line, one result per response line."""
+    limit_stream(request, current_user.id)
+    check_and_reset_credits(current_user, db)
+    user_id = current_user.id
+
+    async def generate():
+        buffer = b""
+        # Only pulls more of the request body after the previous results were sent
+        async for chunk in request.stream():
+            buffer += chunk
+            lines = buffer.split(b"\n")
+            buffer = lines.pop()
+            items = [_parse_stream_item(line) for line in lines if line.strip()]
+            for start in range(0, len(items), settings.STREAM_BATCH_SIZE):
+                batch = items[start:start + settings.STREAM_BATCH_SIZE]
+                results = await _score_stream_items(request, db, user_id, batch)
+                yield "".join(json.dumps(result) + "\n" for result in results)
+        if buffer.strip():
+            results = await _score_stream_items(request, db, user_id, [_parse_stream_item(buffer)])
+            yield "".join(json.dumps(result) + "\n" for result in results)
+
+    return _DuplexStreamingResponse(generate(), media_type="application/x-ndjson")
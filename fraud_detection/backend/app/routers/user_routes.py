@@ -1,13 +1,21 @@
-from fastapi import APIRouter, Depends
+import csv
+import heapq
+import io
+import itertools
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import date, datetime, timedelta
 from sqlalchemy import func, desc, case
 
+from app import archive, data_versions, feedback, search, sharding
 from app.auth import get_current_user
+from app.config import settings
 from app.database import get_db
 from app.models import User, CreditPurchase, Transaction
-from app.schemas import UserOut, CreditPurchaseOut
+from app.schemas import UserOut, CreditPurchaseOut, TransactionFeedback, BulkFeedbackRequest
 
 router = APIRouter()
 
@@ -32,9 +40,15 @@ def get_credit_history(
 
 @router.get("/stats")
 async def get_user_stats(
+    request: Request,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    return data_versions.versioned_response(
+        request, f"user-stats-{user.id}", data_versions.current(db, user.id), lambda: _user_stats(user, db)
+    )
+
+def _user_stats(user: User, db: Session) -> Dict[str, Any]:
     # Get total transactions
     total_transactions = db.query(func.count(Transaction.id)).filter(
         Transaction.user_id == user.id
@@ -59,9 +73,16 @@ async def get_user_stats(
 
 @router.get("/recent-transactions")
 async def get_recent_transactions(
+    request: Request,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    return data_versions.versioned_response(
+        request, f"user-recent-{user.id}", data_versions.current(db, user.id),
+        lambda: _recent_transactions(user, db)
+    )
+
+def _recent_transactions(user: User, db: Session) -> List[Dict[str, Any]]:
     transactions = db.query(Transaction).filter(
         Transaction.user_id == user.id
     ).order_by(desc(Transaction.created_at)).limit(10).all()
@@ -78,11 +99,20 @@ async def get_recent_transactions(
 
 @router.get("/chart-data")
 async def get_chart_data(
+    request: Request,
     user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
+    # The 7-day window moves, so the day is part of the version key too
+    now = datetime.utcnow()
+    return data_versions.versioned_response(
+        request, f"user-chart-{user.id}-{now:%Y%m%d}", data_versions.current(db, user.id),
+        lambda: _chart_data(user, db, now)
+    )
+
+def _chart_data(user: User, db: Session, now: datetime) -> Dict[str, Any]:
     # Get transactions from the last 7 days
-    seven_days_ago = datetime.utcnow() - timedelta(days=7)
+    seven_days_ago = now - timedelta(days=7)
     transactions = db.query(
         func.strftime('%Y-%m-%d', Transaction.created_at).label('date'),
         func.count(Transaction.id).label('total'),
@@ -124,4 +154,236 @@ async def get_chart_data(
         "fraudTotal": fraud_total,
         "safeTotal": safe_total,
         "categoryFraud": {stat.category: stat.count for stat in category_fraud}
-    }
\ No newline at end of file
+    }
+
+# ---------- History (hot table + archived partitions) ----------
+EXPORT_COLUMNS = [
+    "id", "created_at", "amount", "merchant", "category", "hour", "user_age",
+    "description", "is_fraud", "fraud_probability", "risk_level", "feedback_correct", "feedback_notes"
+]
+
+def _transaction_row(tx: Transaction) -> Dict[str, Any]:
+    return {name: getattr(tx, name) for name in archive.COLUMNS}
+
+def _history_item(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "amount": row["amount"],
+        "merchant": row["merchant"],
+        "category": row["category"],
+        "description": row["description"],
+        "is_fraud": row["is_fraud"],
+        "fraud_probability": row["fraud_probability"],
+        "risk_level": row["risk_level"],
+        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
+        "feedback_correct": row["feedback_correct"],
+        "feedback_notes": row["feedback_notes"],
+    }
+
+def _parse_fraud_status(fraud_status: Optional[str]) -> Optional[bool]:
+    if fraud_status in (None, ""):
+        return None
+    if fraud_status not in ("true", "false"):
+        raise HTTPException(status_code=400, detail="fraud_status must be 'true' or 'false'")
+    return fraud_status == "true"
+
+def _hot_history_query(db: Session, user: User, merchant, category, is_fraud, start_date, end_date):
+    query = db.query(Transaction).filter(Transaction.user_id == user.id)
+    if merchant:
+        query = query.filter(Transaction.merchant.ilike(f"%{merchant}%"))
+    if category:
+        query = query.filter(Transaction.category == category)
+    if is_fraud is not None:
+        query = query.filter(Transaction.is_fraud == is_fraud)
+    if start_date:
+        query = query.filter(Transaction.created_at >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        query = query.filter(Transaction.created_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    return query.order_by(desc(Transaction.created_at), desc(Transaction.id))
+
+def _newest_first(row: Dict[str, Any]):
+    return row["created_at"], row["id"]
+
+def _hot_day_counts(query) -> List[Tuple[date, int]]:
+    day = func.date(Transaction.created_at)
+    return [
+        (date.fromisoformat(value), count)
+        for value, count in query.with_entities(day, func.count(Transaction.id)).order_by(None).group_by(day)
+    ]
+
+@router.get("/transactions")
+async def get_transaction_history(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    merchant: Optional[str] = None,
+    category: Optional[str] = None,
+    fraud_status: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    is_fraud = _parse_fraud_status(fraud_status)
+    query = _hot_history_query(db, user, merchant, category, is_fraud, start_date, end_date)
+    offset = (page - 1) * per_page
+
+    # Hot and archived rows can share days (backdated rows), so pages are cut
+    # from per-day counts of both and the days a page lands in are merged on created_at
+    hot_days = dict(_hot_day_counts(query))
+    cold_days = dict(archive.archived_counts(
+        db, user.id, start_date, end_date, merchant=merchant, category=category, is_fraud=is_fraud
+    ))
+    day_counts = {day: hot_days.get(day, 0) + cold_days.get(day, 0) for day in {*hot_days, *cold_days}}
+
+    skipped, taken, days = 0, 0, []
+    for day in sorted(day_counts, reverse=True):
+        if not days and skipped + day_counts[day] <= offset:
+            skipped += day_counts[day]
+        elif skipped + taken < offset + per_page:
+            days.append(day)
+            taken += day_counts[day]
+        else:
+            break
+
+    items = []
+    if days:
+        # Rows of the page's days up to the end of the page, from each side
+        need = offset - skipped + per_page
+        first, last = days[-1], days[0]
+        hot = [_transaction_row(tx) for tx in query.filter(
+            Transaction.created_at >= datetime.combine(first, datetime.min.time()),
+            Transaction.created_at < datetime.combine(last + timedelta(days=1), datetime.min.time())
+        ).limit(need)]
+        cold = []
+        if any(day in cold_days for day in days):
+            columns = await run_in_threadpool(
+                archive.load_archived, settings.ARCHIVE_DIR, first, last,
+                user_id=user.id, merchant=merchant, category=category, is_fraud=is_fraud
+            )
+            cold = archive.to_rows(columns, 0, need)
+        merged = heapq.merge(hot, cold, key=_newest_first, reverse=True)
+        items = [_history_item(row) for row in itertools.islice(merged, offset - skipped, need)]
+
+    return {
+        "transactions": items,
+        "total": sum(day_counts.values()),
+        "page": page,
+        "per_page": per_page
+    }
+
+@router.get("/transactions/search")
+def search_transactions(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Admins search every user's transactions (every shard, ranking approximate
+    # across shards, see search.merge_pages); archived rows are not indexed
+    try:
+        if user.is_admin and sharding.enabled():
+            hits, next_cursor = search.merge_pages(
+                sharding.fan_out(lambda shard_db: search.search(shard_db, q, limit=limit, cursor=cursor)), limit
+            )
+        else:
+            hits, next_cursor = search.search(
+                db, q, user_id=None if user.is_admin else user.id, limit=limit, cursor=cursor
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = []
+    for tx, score in hits:
+        item = _history_item(_transaction_row(tx))
+        item["user_id"] = tx.user_id
+        item["score"] = -score  # bm25 is lower-is-better; report higher-is-better
+        results.append(item)
+    return {"results": results, "next_cursor": next_cursor}
+
+@router.get("/transactions/export")
+def export_transactions(
+    merchant: Optional[str] = None,
+    category: Optional[str] = None,
+    fraud_status: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    is_fraud = _parse_fraud_status(fraud_status)
+    query = _hot_history_query(db, user, merchant, category, is_fraud, start_date, end_date)
+
+    def rows():
+        hot = (_transaction_row(tx) for tx in query.yield_per(1000))
+        if not archive.needs_archive(settings.ARCHIVE_DIR, start_date):
+            yield from hot
+            return
+        cold = archive.load_archived(
+            settings.ARCHIVE_DIR, start_date, end_date,
+            user_id=user.id, merchant=merchant, category=category, is_fraud=is_fraud
+        )
+        # Backdated hot rows can be older than archived ones
+        yield from heapq.merge(hot, archive.to_rows(cold), key=_newest_first, reverse=True)
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for i, row in enumerate(rows(), 1):
+            writer.writerow([row[name] for name in EXPORT_COLUMNS])
+            if i % 1000 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=transactions.csv"}
+    )
+
+# ---------- Feedback (confirmed labels) ----------
+def _apply_feedback(db: Session, user: User, items) -> Tuple[List[int], List[int]]:
+    """Admins label any transaction, users only their own; commits.
+
+    Sharded, an admin's labels go to whichever shard holds each transaction
+    (ids are unique across shards); each shard commits on its own.
+    """
+    if user.is_admin and sharding.enabled():
+        def apply(shard_db: Session) -> List[int]:
+            updated, _ = feedback.apply_feedback(shard_db, items)
+            shard_db.commit()
+            return updated
+
+        found = {transaction_id for updated in sharding.fan_out(apply) for transaction_id in updated}
+        requested = dict.fromkeys(transaction_id for transaction_id, _, _ in items)
+        return sorted(found), [transaction_id for transaction_id in requested if transaction_id not in found]
+
+    updated, not_found = feedback.apply_feedback(db, items, user_id=None if user.is_admin else user.id)
+    db.commit()
+    return updated, not_found
+
+@router.post("/transactions/{transaction_id}/feedback")
+def submit_feedback(
+    transaction_id: int,
+    body: TransactionFeedback,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    updated, _ = _apply_feedback(db, user, [(transaction_id, body.feedback_correct, body.feedback_notes)])
+    if not updated:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    return {"message": "Feedback recorded", "transaction_id": transaction_id}
+
+@router.post("/transactions/feedback/bulk")
+def submit_bulk_feedback(
+    body: BulkFeedbackRequest,
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    updated, not_found = _apply_feedback(
+        db, user, [(item.transaction_id, item.feedback_correct, item.feedback_notes) for item in body.items]
+    )
+    return {"updated": len(updated), "not_found": not_found}
@@ -83,6 +83,12 @@ class TransactionFeedback(BaseModel):
     feedback_correct: bool
     feedback_notes: Optional[str] = None
 
+class TransactionFeedbackItem(TransactionFeedback):
+    transaction_id: int
+
+class BulkFeedbackRequest(BaseModel):
+    items: List[TransactionFeedbackItem] = Field(..., min_length=1, max_length=5000)
+
 class TransactionOut(BaseModel):
     id: int
     amount: float
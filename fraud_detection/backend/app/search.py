@@ -0,0 +1,188 @@
+import base64
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# External-content FTS5 index: the text lives only in transactions, the index
+# stores postings keyed by transactions.id (its rowid).
+_FTS_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    description, merchant,
+    content='transactions', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+# Keep the index in step with every write path (ORM, write-behind executemany,
+# streaming inserts, archive deletes). External-content tables are updated by
+# replaying the old values with the special 'delete' command.
+TRIGGERS = {
+    "trg_transactions_fts_insert": """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_insert AFTER INSERT ON transactions
+        BEGIN
+            INSERT INTO transactions_fts (rowid, description, merchant)
+            VALUES (NEW.id, NEW.description, NEW.merchant);
+        END
+    """,
+    "trg_transactions_fts_delete": """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_delete AFTER DELETE ON transactions
+        BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, merchant)
+            VALUES ('delete', OLD.id, OLD.description, OLD.merchant);
+        END
+    """,
+    "trg_transactions_fts_update": """
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_update
+        AFTER UPDATE OF description, merchant ON transactions
+        BEGIN
+            INSERT INTO transactions_fts (transactions_fts, rowid, description, merchant)
+            VALUES ('delete', OLD.id, OLD.description, OLD.merchant);
+            INSERT INTO transactions_fts (rowid, description, merchant)
+            VALUES (NEW.id, NEW.description, NEW.merchant);
+        END
+    """,
+}
+
+# bm25 column weights: a merchant hit counts more than a word in free text
+DESCRIPTION_WEIGHT = 1.0
+MERCHANT_WEIGHT = 2.0
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def install(engine: Engine):
+    """Create the FTS index and its triggers; index existing rows the first time."""
+    with engine.begin() as conn:
+        conn.execute(text(_FTS_DDL))
+        for ddl in TRIGGERS.values():
+            conn.execute(text(ddl))
+        # The docsize shadow table has one row per indexed document
+        indexed = conn.execute(text("SELECT 1 FROM transactions_fts_docsize LIMIT 1")).first()
+        has_rows = conn.execute(text("SELECT 1 FROM transactions LIMIT 1")).first()
+        if has_rows and not indexed:
+            logger.info("Backfilling full-text index from transactions")
+            rebuild(conn)
+
+
+def rebuild(conn):
+    """Reindex every transaction from scratch (one full scan)."""
+    conn.execute(text("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')"))
+
+
+def optimize(conn):
+    """Merge index segments; worth running after large backfills."""
+    conn.execute(text("INSERT INTO transactions_fts (transactions_fts) VALUES ('optimize')"))
+
+
+def integrity_check(conn):
+    """Raise if the index disagrees with the transactions table."""
+    conn.execute(text("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('integrity-check', 1)"))
+
+
+def to_match_query(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Words are quoted, so operators and punctuation in user input can never
+    produce a syntax error.
+    """
+    terms = _TERM_RE.findall(q)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(score: float, transaction_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, transaction_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(transaction_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def search(
+    db: Session,
+    q: str,
+    user_id: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[Transaction, float]], Optional[str]]:
+    """Best matches first (bm25), keyset-paginated on (score, id).
+
+    Returns ([(transaction, score)], next_cursor). ``user_id`` restricts the
+    results to that user's transactions. Raises ValueError for a query without
+    searchable words or a malformed cursor.
+    """
+    match = to_match_query(q)
+    if match is None:
+        raise ValueError("Search query must contain at least one word")
+
+    params: Dict[str, Any] = {
+        "match": match,
+        "limit": limit + 1,
+        "w_description": DESCRIPTION_WEIGHT,
+        "w_merchant": MERCHANT_WEIGHT,
+    }
+    # The user restriction goes inside the FTS query so only that user's matches get ranked
+    restrict = ""
+    if user_id is not None:
+        restrict = "AND rowid IN (SELECT id FROM transactions WHERE user_id = :user_id)"
+        params["user_id"] = user_id
+    where = ""
+    if cursor:
+        # bm25 is lower-is-better, so the next page continues upwards
+        params["after_score"], params["after_id"] = decode_cursor(cursor)
+        where = "WHERE m.score > :after_score OR (m.score = :after_score AND m.id > :after_id)"
+
+    hits = db.execute(text(f"""
+        SELECT m.id, m.score
+        FROM (
+            SELECT rowid AS id, bm25(transactions_fts, :w_description, :w_merchant) AS score
+            FROM transactions_fts WHERE transactions_fts MATCH :match {restrict}
+        ) AS m
+        {where}
+        ORDER BY m.score, m.id
+        LIMIT :limit
+    """), params).all()
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1].score, hits[-1].id)
+
+    transactions = {
+        tx.id: tx for tx in db.query(Transaction).filter(Transaction.id.in_([hit.id for hit in hits]))
+    }
+    return [(transactions[hit.id], hit.score) for hit in hits], next_cursor
+
+
+def merge_pages(
+    pages: List[Tuple[List[Tuple[Transaction, float]], Optional[str]]], limit: int
+) -> Tuple[List[Tuple[Transaction, float]], Optional[str]]:
+    """One page from search() pages of several databases (shards) for the same query and cursor.
+
+    The ranking is approximate: each shard's bm25 uses term statistics (IDF,
+    average length) of its own documents only, so scores from different shards
+    are merged as if comparable. With users hashed evenly the statistics are
+    close; a rare term concentrated in one shard ranks lower there than it
+    would globally. Paging stays exact, as every hit keeps one fixed
+    (score, id) and every shard filters on the same cursor.
+    """
+    hits = sorted((hit for page, _ in pages for hit in page), key=lambda hit: (hit[1], hit[0].id))
+    next_cursor = None
+    if len(hits) > limit or any(cursor for _, cursor in pages):
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1][1], hits[-1][0].id)
+    return hits, next_cursor
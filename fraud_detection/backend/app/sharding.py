@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from sqlalchemy import or_, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal, ShardSessions, session_for_user, shard_engines
+from app.models import UserDirectory
+
+T = TypeVar("T")
+
+if shard_engines and settings.WRITE_BEHIND_ENABLED:
+    # The writer group-commits into a single database
+    raise ValueError("WRITE_BEHIND_ENABLED is not supported together with SHARD_COUNT")
+
+
+def enabled() -> bool:
+    return bool(shard_engines)
+
+
+@contextmanager
+def user_session(user_id: int, default: Session) -> Iterator[Session]:
+    """The user's shard session when sharded, otherwise ``default`` as is."""
+    if not enabled():
+        yield default
+        return
+    db = session_for_user(user_id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def fan_out(fn: Callable[[Session], T]) -> List[T]:
+    """Run fn against every shard in parallel, one session each, in shard order."""
+    def run(Session_) -> T:
+        db = Session_()
+        try:
+            return fn(db)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(ShardSessions)) as pool:
+        return list(pool.map(run, ShardSessions))
+
+
+# ---------- Directory (main database) ----------
+def find_user_id(db: Session, login: str) -> Optional[int]:
+    """User id for an email or username, from the directory."""
+    return db.query(UserDirectory.id).filter(
+        or_(UserDirectory.email == login, UserDirectory.username == login)
+    ).order_by(UserDirectory.email != login).limit(1).scalar()
+
+
+def register_user(db: Session, email: str, username: str) -> int:
+    """Reserve a globally unique user id for a new login; the caller commits."""
+    entry = UserDirectory(email=email, username=username)
+    db.add(entry)
+    db.flush()
+    return entry.id
+
+
+def unregister_user(db: Session, user_id: int):
+    """Free a directory entry again (the user was deleted or never made it to its shard)."""
+    db.query(UserDirectory).filter(UserDirectory.id == user_id).delete()
+    db.commit()
+
+
+class IdAllocator:
+    """Hands out globally unique ids for a sequence, a block at a time.
+
+    Shard databases each have their own rowid sequence, so ids must come from
+    the directory to stay unique across shards (and across rebalances). Each
+    process reserves ``block_size`` ids per directory write.
+    """
+
+    def __init__(self, name: str, block_size: int):
+        self.name = name
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _reserve(self):
+        db = SessionLocal()
+        try:
+            end = db.execute(text(
+                "INSERT INTO id_blocks (name, next_id) VALUES (:name, 1 + :size) "
+                "ON CONFLICT(name) DO UPDATE SET next_id = next_id + :size RETURNING next_id"
+            ), {"name": self.name, "size": self.block_size}).scalar()
+            db.commit()
+        finally:
+            db.close()
+        self._next, self._end = end - self.block_size, end
+
+    def take(self, n: int) -> List[int]:
+        ids = []
+        with self._lock:
+            while len(ids) < n:
+                if self._next == self._end:
+                    self._reserve()
+                count = min(n - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + count))
+                self._next += count
+        return ids
+
+
+_transaction_ids = IdAllocator("transactions", settings.SHARD_ID_BLOCK_SIZE)
+
+
+def assign_transaction_ids(rows: List[Dict[str, Any]]):
+    """Give new Transaction rows globally unique ids (no-op when unsharded)."""
+    if enabled():
+        for row, transaction_id in zip(rows, _transaction_ids.take(len(rows))):
+            row["id"] = transaction_id
@@ -0,0 +1,413 @@
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from app.config import settings
+from app.database import engine
+from app.models import IdempotencyKey, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Row fields stored as ISO strings in the journal and parsed back on replay
+_DATETIME_FIELDS = ("created_at", "processed_at")
+
+_CHECKPOINT_DDL = """
+    CREATE TABLE IF NOT EXISTS write_behind_checkpoints (
+        journal VARCHAR(255) PRIMARY KEY,
+        seq INTEGER NOT NULL
+    )
+"""
+
+# Rows that could never be inserted (constraint violations, bad data), kept
+# for inspection instead of blocking every row journaled after them
+_DEAD_LETTER_DDL = """
+    CREATE TABLE IF NOT EXISTS write_behind_dead_letters (
+        id INTEGER PRIMARY KEY,
+        journal VARCHAR(255) NOT NULL,
+        seq INTEGER NOT NULL,
+        row TEXT NOT NULL,
+        error TEXT NOT NULL,
+        created_at DATETIME NOT NULL
+    )
+"""
+
+_UPSERT_CHECKPOINT = text(
+    "INSERT INTO write_behind_checkpoints (journal, seq) VALUES (:journal, :seq) "
+    "ON CONFLICT(journal) DO UPDATE SET seq = excluded.seq"
+)
+
+
+def worker_journal_path(base_path: str, worker_id: Optional[int] = None) -> str:
+    """Per-process journal next to base_path: write_behind.journal -> write_behind.<pid>.journal"""
+    root, ext = os.path.splitext(os.path.abspath(base_path))
+    return f"{root}.{worker_id or os.getpid()}{ext}"
+
+
+class WriteBehindWriter:
+    """Journal prediction rows locally and group-commit them in the background.
+
+    Every record is appended to an fsync'd journal before the request returns.
+    A writer thread inserts queued rows with one executemany per batch and
+    applies the matching credit debits (guarded, see _debit) in the same
+    database transaction, together with the highest journal sequence it
+    committed. On startup the
+    journal is replayed from that checkpoint, so a crash never loses or
+    duplicates a row.
+
+    Every worker process journals to its own file derived from ``base_path``.
+    At startup, journals left by processes that are gone (no longer locked)
+    are replayed and removed. A failing batch is split until the rows that
+    cannot be inserted are isolated; those go to write_behind_dead_letters
+    after ``max_attempts`` tries. Transient errors (locked or unavailable
+    database) are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        base_path: str,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_attempts: int = 5,
+        max_backoff: float = 5.0,
+    ):
+        self.base_path = os.path.abspath(base_path)
+        self.journal_path = worker_journal_path(base_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+
+        self._cond = threading.Condition()
+        self._queue: List[Dict[str, Any]] = []
+        self._pending_debits: Dict[int, int] = {}
+        self._pending_keys: Dict[tuple, Dict[str, Any]] = {}
+        self._seq = 0
+        self._committed_seq = 0
+        self._journal = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    # ---------- lifecycle ----------
+    def start(self):
+        with engine.begin() as conn:
+            conn.execute(text(_CHECKPOINT_DDL))
+            conn.execute(text(_DEAD_LETTER_DDL))
+
+        # Startup is serialized so nobody adopts a journal between its creation and its lock
+        with open(self.base_path + ".lock", "a") as startup_lock:
+            fcntl.flock(startup_lock, fcntl.LOCK_EX)
+            try:
+                self._journal = open(self.journal_path, "a+", encoding="utf-8")
+                fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._committed_seq = self._seq = self._replay(self._journal, self.journal_path)
+                self._adopt_orphans()
+            finally:
+                fcntl.flock(startup_lock, fcntl.LOCK_UN)
+
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        logger.info(f"Write-behind writer started, journal={self.journal_path}")
+
+    def close(self):
+        """Flush everything that is queued and stop the writer thread."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+        drained = self._committed_seq == self._seq
+        if drained:
+            # Nothing left to replay; don't leave a journal for another worker to adopt
+            os.remove(self.journal_path)
+            with engine.begin() as conn:
+                conn.execute(text("DELETE FROM write_behind_checkpoints WHERE journal = :journal"),
+                             {"journal": self.journal_path})
+        self._journal.close()
+        self._journal = None
+        if drained:
+            logger.info("Write-behind writer stopped, journal flushed")
+        else:
+            logger.warning(f"Write-behind writer stopped with uncommitted rows left in {self.journal_path}")
+
+    # ---------- request path ----------
+    def submit(self, row: Dict[str, Any], debit: int = 0, idempotency: Optional[Dict[str, Any]] = None):
+        """Durably journal a Transaction row (and credit debit) for group commit.
+
+        An IdempotencyKey record passed along commits atomically with the row;
+        if another request committed the same key first, this row is
+        dead-lettered instead of charged twice.
+        """
+        self.submit_many([row], debit, [idempotency] if idempotency else None)
+
+    def submit_many(
+        self,
+        rows: List[Dict[str, Any]],
+        debit_per_row: int = 0,
+        idempotency: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ):
+        """Journal several rows with a single fsync."""
+        with self._cond:
+            if self._thread is None:
+                raise RuntimeError("Write-behind writer is not running")
+            records = []
+            for i, row in enumerate(rows):
+                self._seq += 1
+                record = {"seq": self._seq, "row": _encode_row(row), "debit": debit_per_row}
+                if idempotency and idempotency[i]:
+                    record["idempotency"] = _encode_row(idempotency[i])
+                    self._pending_keys[_key_of(idempotency[i])] = idempotency[i]
+                records.append(record)
+            self._journal.write("".join(json.dumps(record) + "\n" for record in records))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+            self._queue.extend(records)
+            if debit_per_row:
+                for row in rows:
+                    user_id = row["user_id"]
+                    self._pending_debits[user_id] = self._pending_debits.get(user_id, 0) + debit_per_row
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+
+    def pending_debits(self, user_id: int) -> int:
+        """Credits journaled for a user but not yet committed to the users table."""
+        with self._cond:
+            return self._pending_debits.get(user_id, 0)
+
+    def pending_idempotency(self, user_id: int, scope: str, key: str) -> Optional[Dict[str, Any]]:
+        """IdempotencyKey record journaled by this worker but not yet committed."""
+        with self._cond:
+            return self._pending_keys.get((user_id, scope, key))
+
+    def flush(self):
+        """Block until everything submitted so far has been committed."""
+        with self._cond:
+            target = self._seq
+            self._cond.notify_all()
+            while self._committed_seq < target and self._thread is not None:
+                self._cond.wait(self.flush_interval)
+
+    # ---------- writer thread ----------
+    def _run(self):
+        failures = 0
+        while True:
+            with self._cond:
+                if not self._queue and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                batch = self._queue[:self.batch_size]
+                del self._queue[:len(batch)]
+                done = self._stopping and not self._queue
+
+            if batch:
+                try:
+                    self._commit_isolating(batch, self.journal_path, self._mark_committed)
+                    failures = 0
+                except OperationalError as e:
+                    # Keep the uncommitted rows queued (and journaled) and back off
+                    failures += 1
+                    delay = min(self.flush_interval * 2 ** failures, self.max_backoff)
+                    logger.error(f"Write-behind group commit failed, retrying in {delay:.2f}s: {str(e)}")
+                    with self._cond:
+                        self._queue[:0] = [r for r in batch if r["seq"] > self._committed_seq]
+                        if self._stopping:
+                            return
+                        self._cond.wait(delay)
+                    continue
+
+                with self._cond:
+                    if not self._queue:
+                        # Everything journaled is committed, reclaim the journal
+                        self._journal.truncate(0)
+                        self._journal.seek(0)
+
+            if done:
+                return
+
+    def _mark_committed(self, records: List[Dict[str, Any]]):
+        with self._cond:
+            for record in records:
+                if record["debit"]:
+                    user_id = record["row"]["user_id"]
+                    left = self._pending_debits.get(user_id, 0) - record["debit"]
+                    if left > 0:
+                        self._pending_debits[user_id] = left
+                    else:
+                        self._pending_debits.pop(user_id, None)
+                if "idempotency" in record:
+                    self._pending_keys.pop(_key_of(record["idempotency"]), None)
+            self._committed_seq = records[-1]["seq"]
+            self._cond.notify_all()
+
+    def _commit_isolating(
+        self,
+        batch: List[Dict[str, Any]],
+        journal: str,
+        on_done: Callable[[List[Dict[str, Any]]], None],
+    ):
+        """Commit batch in journal order, splitting it around rows that fail.
+
+        OperationalError propagates (transient, retry later); any other error
+        bisects the batch, and a single row that keeps failing is dead-lettered.
+        on_done is called after every committed (or dead-lettered) piece.
+        """
+        attempts = 0
+        while True:
+            try:
+                self._commit(batch, journal)
+                on_done(batch)
+                return
+            except OperationalError:
+                raise
+            except Exception as e:
+                if len(batch) > 1:
+                    mid = len(batch) // 2
+                    self._commit_isolating(batch[:mid], journal, on_done)
+                    self._commit_isolating(batch[mid:], journal, on_done)
+                    return
+                attempts += 1
+                # A constraint violation (e.g. a duplicate idempotency key) won't go away on retry
+                if isinstance(e, IntegrityError) or attempts >= self.max_attempts:
+                    self._dead_letter(batch[0], journal, e)
+                    on_done(batch)
+                    return
+                time.sleep(min(self.flush_interval * 2 ** attempts, self.max_backoff))
+
+    def _dead_letter(self, record: Dict[str, Any], journal: str, error: Exception):
+        logger.error(f"Write-behind row {journal}#{record['seq']} dead-lettered: {str(error)}")
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO write_behind_dead_letters (journal, seq, row, error, created_at) "
+                    "VALUES (:journal, :seq, :row, :error, :created_at)"
+                ),
+                {"journal": journal, "seq": record["seq"], "row": json.dumps(record),
+                 "error": str(error)[:2000], "created_at": datetime.utcnow()}
+            )
+            conn.execute(_UPSERT_CHECKPOINT, {"journal": journal, "seq": record["seq"]})
+
+    def _commit(self, batch: List[Dict[str, Any]], journal: str):
+        debits: Dict[int, int] = {}
+        for record in batch:
+            if record["debit"]:
+                user_id = record["row"]["user_id"]
+                debits[user_id] = debits.get(user_id, 0) + record["debit"]
+
+        with engine.begin() as conn:
+            conn.execute(Transaction.__table__.insert(), [_decode_row(r["row"]) for r in batch])
+            keys = [_decode_row(r["idempotency"]) for r in batch if "idempotency" in r]
+            if keys:
+                conn.execute(IdempotencyKey.__table__.insert(), keys)
+            for user_id, debit in debits.items():
+                self._debit(conn, user_id, debit)
+            conn.execute(_UPSERT_CHECKPOINT, {"journal": journal, "seq": batch[-1]["seq"]})
+
+    def _debit(self, conn, user_id: int, debit: int):
+        """Guarded debit, as on the streaming path; never takes a balance below zero.
+
+        Each worker approves predictions against the committed balance minus
+        only its own pending debits, so with several workers a user can be
+        approved for more than they have. The rows are still inserted (the
+        predictions were served); whatever the balance cannot cover is logged
+        and not charged.
+        """
+        debited = conn.execute(
+            text("UPDATE users SET credits = credits - :debit WHERE id = :user_id AND credits >= :debit"),
+            {"user_id": user_id, "debit": debit}
+        ).rowcount
+        if debited:
+            return
+        credits = conn.execute(text("SELECT credits FROM users WHERE id = :user_id"), {"user_id": user_id}).scalar()
+        if credits is not None:
+            conn.execute(text("UPDATE users SET credits = 0 WHERE id = :user_id"), {"user_id": user_id})
+            logger.warning(f"Write-behind debit of {debit} credits for user {user_id} exceeded the balance "
+                           f"of {credits}; {debit - credits} credits not charged")
+
+    def _replay(self, f, journal: str) -> int:
+        """Commit a locked journal's unacknowledged tail, empty it and return its last seq."""
+        with engine.connect() as conn:
+            committed = conn.execute(
+                text("SELECT seq FROM write_behind_checkpoints WHERE journal = :journal"),
+                {"journal": journal}
+            ).scalar() or 0
+
+        records = []
+        f.seek(0)
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn final write from a crash; it was never acknowledged
+                break
+            if record["seq"] > committed:
+                records.append(record)
+
+        for i in range(0, len(records), self.batch_size):
+            self._commit_isolating(records[i:i + self.batch_size], journal, lambda done: None)
+        if records:
+            logger.info(f"Replayed {len(records)} journaled transactions from {journal}")
+
+        f.truncate(0)
+        f.seek(0)
+        return records[-1]["seq"] if records else committed
+
+    def _adopt_orphans(self):
+        """Replay and remove journals whose worker process is gone."""
+        root, ext = os.path.splitext(self.base_path)
+        candidates = glob.glob(f"{glob.escape(root)}.*{ext}")
+        if os.path.exists(self.base_path):
+            # Journal from before per-worker paths
+            candidates.append(self.base_path)
+        for path in candidates:
+            if path == self.journal_path:
+                continue
+            with open(path, "a+", encoding="utf-8") as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # a live worker's journal
+                self._replay(f, path)
+                os.remove(path)
+            with engine.begin() as conn:
+                conn.execute(text("DELETE FROM write_behind_checkpoints WHERE journal = :journal"),
+                             {"journal": path})
+
+
+def _encode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+
+
+def _key_of(record: Dict[str, Any]) -> tuple:
+    return record["user_id"], record["scope"], record["key"]
+
+
+def _decode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    decoded = dict(row)
+    for field in _DATETIME_FIELDS:
+        if decoded.get(field) is not None:
+            decoded[field] = datetime.fromisoformat(decoded[field])
+    return decoded
+
+
+# Shared writer, only started when WRITE_BEHIND_ENABLED is set
+writer: Optional[WriteBehindWriter] = (
+    WriteBehindWriter(
+        settings.WRITE_BEHIND_JOURNAL_PATH,
+        batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+        flush_interval=settings.WRITE_BEHIND_FLUSH_INTERVAL,
+        max_attempts=settings.WRITE_BEHIND_MAX_ATTEMPTS,
+        max_backoff=settings.WRITE_BEHIND_MAX_BACKOFF
+    )
+    if settings.WRITE_BEHIND_ENABLED else None
+)
@@ -0,0 +1,24 @@
+import argparse
+
+from app.archive import archive_transactions
+from app.config import settings
+from app.database import user_engines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old transactions into compressed cold-storage partitions")
+    parser.add_argument("--older-than-days", type=int, default=settings.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--archive-dir", default=settings.ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    print(f"Archiving transactions older than {args.older_than_days} days into {args.archive_dir}...")
+    # Shards share the archive directory; transaction ids are unique across them
+    moved = 0
+    for engine in user_engines():
+        moved += archive_transactions(engine, args.archive_dir, args.older_than_days, args.batch_size)
+    print(f"Archived {moved} transactions.")
+
+
+if __name__ == "__main__":
+    main()
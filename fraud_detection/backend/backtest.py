@@ -0,0 +1,277 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from app import archive
+from app.config import settings
+from app.database import make_engine, shard_url
+from app.ml import model_loader
+from app.ml.features import CATEGORIES, MERCHANTS, RISK_BANDS, THRESHOLD
+from app.ml.model_loader import MODEL_PATH
+from app.models import Transaction
+
+# Recorded fraud_probability, scored by whatever model was live at the time
+STORED = "stored"
+# Task kinds: an id range of a database, or one day of cold-storage partitions
+HOT, ARCHIVED = "hot", "archived"
+BAND_NAMES = ["LOW", "MEDIUM", "HIGH"]
+
+_columns = Transaction.__table__.c
+_COLUMNS = [_columns.id, _columns.amount, _columns.merchant, _columns.category, _columns.hour,
+            _columns.user_age, _columns.is_fraud, _columns.fraud_probability, _columns.feedback_correct]
+
+# Per-worker state, set up once by _init_worker
+_models: Dict[str, object] = {}
+_engines: Dict[str, object] = {}
+_options: Dict[str, object] = {}
+
+
+def _thresholds() -> np.ndarray:
+    # Every percentage point plus the live threshold, exactly representable
+    return np.unique(np.append(np.round(np.arange(101) / 100, 2), THRESHOLD))
+
+
+def _load_artifact(path: str):
+    """A sklearn pipeline (.joblib) or an XGBoost booster (.ubj/.json)."""
+    if path.endswith(".joblib"):
+        model = joblib.load(path)
+        if hasattr(model, "set_params") and "classifier__n_jobs" in model.get_params():
+            # Parallelism comes from the worker processes
+            model.set_params(classifier__n_jobs=1)
+        return model
+    from app.ml.xgb_backend import XGBoostModel
+    return XGBoostModel.load(path, nthread=1)
+
+
+def _model_name(path: str) -> str:
+    return f"{os.path.basename(path)}@{model_loader._artifact_version(path)}"
+
+
+def _init_worker(model_paths: List[str], since, until):
+    _models.clear()
+    for path in model_paths:
+        _models[_model_name(path)] = _load_artifact(path)
+    _options.update(since=since, until=until)
+
+
+def _empty_counts(n_thresholds: int) -> Dict[str, np.ndarray]:
+    return {
+        # Histograms over "number of thresholds <= p", cumulated at the end
+        "fraud": np.zeros(n_thresholds + 1, dtype=np.int64),
+        "legit": np.zeros(n_thresholds + 1, dtype=np.int64),
+        "bands": np.zeros(len(BAND_NAMES), dtype=np.int64),
+        "band_fraud": np.zeros(len(BAND_NAMES), dtype=np.int64),
+        "band_labeled": np.zeros(len(BAND_NAMES), dtype=np.int64),
+    }
+
+
+def _read_chunk(url: str, low: int, high: int) -> pd.DataFrame:
+    engine = _engines.get(url)
+    if engine is None:
+        engine = _engines[url] = make_engine(url)
+    query = select(*_COLUMNS).where(_columns.id >= low, _columns.id < high)
+    if _options["since"]:
+        query = query.where(_columns.created_at >= _options["since"])
+    if _options["until"]:
+        query = query.where(_columns.created_at < _options["until"])
+    with engine.connect() as conn:
+        rows = conn.execute(query).all()
+    return pd.DataFrame(rows, columns=[column.name for column in _COLUMNS])
+
+
+def _read_archived_day(archive_dir: str, day: str) -> pd.DataFrame:
+    day = pd.Timestamp(day).date()
+    columns = archive.load_archived(archive_dir, day, day)
+    names = [column.name for column in _COLUMNS]
+    if not columns:
+        return pd.DataFrame(columns=names)
+    mask = np.ones(len(columns["id"]), dtype=bool)
+    if _options["since"]:
+        mask &= columns["created_at"] >= np.datetime64(_options["since"], "us")
+    if _options["until"]:
+        mask &= columns["created_at"] < np.datetime64(_options["until"], "us")
+    df = pd.DataFrame({name: columns[name][mask] for name in names})
+    # Stored as -1/0/1; NaN marks "no feedback" like NULL does in the database
+    df["feedback_correct"] = df["feedback_correct"].where(df["feedback_correct"] >= 0).astype(float)
+    return df
+
+
+def _score_chunk(task: Tuple):
+    """Score one id range (or archived day) with every model; returns only fixed-size counts."""
+    kind, *source = task
+    df = _read_archived_day(*source) if kind == ARCHIVED else _read_chunk(*source)
+    thresholds = _thresholds()
+    results = {name: _empty_counts(len(thresholds)) for name in [STORED, *_models]}
+    known = df["merchant"].isin(MERCHANTS) & df["category"].isin(CATEGORIES)
+    skipped = int((~known).sum())
+    df = df[known]
+    if df.empty:
+        return kind, len(df), 0, skipped, results
+
+    labeled = df["feedback_correct"].notna().to_numpy()
+    # feedback_correct says whether the stored label was right
+    actual_fraud = (df["is_fraud"].astype(bool) == df["feedback_correct"].fillna(False).astype(bool)).to_numpy()
+
+    probabilities = {STORED: df["fraud_probability"].to_numpy(dtype=float)}
+    if _models:
+        encoded = model_loader.preprocess_batch(df)
+        encoded_np = encoded.to_numpy(dtype=np.float32)
+        for name, model in _models.items():
+            X = encoded if hasattr(model, "steps") else encoded_np
+            probabilities[name] = model.predict_proba(X)[:, 1]
+
+    for name, p in probabilities.items():
+        counts = results[name]
+        above = np.searchsorted(thresholds, p, side="right")
+        counts["fraud"] += np.bincount(above[labeled & actual_fraud], minlength=len(thresholds) + 1)
+        counts["legit"] += np.bincount(above[labeled & ~actual_fraud], minlength=len(thresholds) + 1)
+        band = (p > RISK_BANDS[0]).astype(int) + (p > RISK_BANDS[1])
+        counts["bands"] += np.bincount(band, minlength=len(BAND_NAMES))
+        counts["band_labeled"] += np.bincount(band[labeled], minlength=len(BAND_NAMES))
+        counts["band_fraud"] += np.bincount(band[labeled & actual_fraud], minlength=len(BAND_NAMES))
+    return kind, len(df), int(labeled.sum()), skipped, results
+
+
+def _tasks(urls: List[str], chunk_size: int, archive_dir: Optional[str], since, until):
+    """(HOT, url, low, high) id ranges covering every source database, then
+    (ARCHIVED, archive_dir, day) for every cold-storage day in range."""
+    for url in urls:
+        engine = make_engine(url)
+        with engine.connect() as conn:
+            low, high = conn.execute(select(func.min(_columns.id), func.max(_columns.id))).one()
+        engine.dispose()
+        if low is None:
+            continue
+        for start in range(low, high + 1, chunk_size):
+            yield HOT, url, start, start + chunk_size
+    if archive_dir:
+        for day in archive.archived_days(archive_dir):
+            if (since and day < since.date()) or (until and day > until.date()):
+                continue
+            yield ARCHIVED, archive_dir, day.isoformat()
+
+
+def _curve(counts: Dict[str, np.ndarray], fraud_cost: float, review_cost: float) -> Dict[str, np.ndarray]:
+    # Count of rows with p >= thresholds[k] is the histogram summed from bin k+1
+    tp = np.cumsum(counts["fraud"][::-1])[::-1][1:]
+    fp = np.cumsum(counts["legit"][::-1])[::-1][1:]
+    fn = counts["fraud"].sum() - tp
+    precision = np.divide(tp, tp + fp, out=np.zeros(len(tp)), where=(tp + fp) > 0)
+    recall = np.divide(tp, tp + fn, out=np.zeros(len(tp)), where=(tp + fn) > 0)
+    return {"tp": tp, "fp": fp, "fn": fn, "precision": precision, "recall": recall,
+            "cost": fraud_cost * fn + review_cost * fp}
+
+
+def _report(name: str, counts, thresholds: np.ndarray, args) -> dict:
+    curve = _curve(counts, args.fraud_cost, args.review_cost)
+    live = int(np.searchsorted(thresholds, THRESHOLD))
+    best = int(np.argmin(curve["cost"]))
+    labeled = int(counts["fraud"].sum() + counts["legit"].sum())
+
+    print(f"\n=== {name}  ({labeled} labeled, {int(counts['fraud'].sum())} actual fraud)")
+    for label, k in (("live threshold", live), ("min cost", best)):
+        print(f"  {label:>14} {thresholds[k]:.2f}: precision {curve['precision'][k]:.4f}  "
+              f"recall {curve['recall'][k]:.4f}  FP {curve['fp'][k]}  FN {curve['fn'][k]}  cost {curve['cost'][k]:,.0f}")
+
+    total = max(int(counts["bands"].sum()), 1)
+    for i, band in enumerate(BAND_NAMES):
+        rate = counts["band_fraud"][i] / counts["band_labeled"][i] if counts["band_labeled"][i] else float("nan")
+        print(f"  {band:>6}: {counts['bands'][i]:>9} ({counts['bands'][i] / total:6.1%})  "
+              f"labeled fraud rate {rate:.4f}")
+
+    print(f"  {'threshold':>9}{'precision':>11}{'recall':>9}{'FP':>9}{'FN':>9}{'cost':>12}")
+    step = max(int(round(args.step * 100)), 1)
+    for k, t in enumerate(thresholds):
+        if round(t * 100) % step == 0 or k in (live, best):
+            print(f"  {t:>9.2f}{curve['precision'][k]:>11.4f}{curve['recall'][k]:>9.4f}"
+                  f"{curve['fp'][k]:>9}{curve['fn'][k]:>9}{curve['cost'][k]:>12,.0f}")
+
+    return {
+        "labeled": labeled,
+        "curve": {"threshold": thresholds.tolist(), **{key: value.tolist() for key, value in curve.items()}},
+        "bands": {band: {"count": int(counts["bands"][i]), "labeled": int(counts["band_labeled"][i]),
+                         "fraud": int(counts["band_fraud"][i])} for i, band in enumerate(BAND_NAMES)},
+    }
+
+
+def backtest(model_paths: List[str], args) -> dict:
+    urls = ([shard_url(i, settings.SHARD_COUNT) for i in range(settings.SHARD_COUNT)]
+            if settings.SHARD_COUNT else [settings.SQLALCHEMY_DATABASE_URL])
+    thresholds = _thresholds()
+    totals = {name: _empty_counts(len(thresholds)) for name in [STORED, *map(_model_name, model_paths)]}
+    scored = labeled = skipped = archived = 0
+
+    start = time.perf_counter()
+    tasks = _tasks(urls, args.chunk_size, args.archive_dir, args.since, args.until)
+    with multiprocessing.Pool(
+        args.workers, initializer=_init_worker, initargs=(model_paths, args.since, args.until)
+    ) as pool:
+        # Tasks are id ranges or single days, so no worker ever holds more than one chunk
+        for kind, n, n_labeled, n_skipped, results in pool.imap_unordered(_score_chunk, tasks):
+            scored += n
+            archived += n if kind == ARCHIVED else 0
+            labeled += n_labeled
+            skipped += n_skipped
+            for name, counts in results.items():
+                for key, value in counts.items():
+                    totals[name][key] += value
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {scored} transactions ({labeled} with feedback, {skipped} skipped for unknown "
+          f"merchant/category) with {len(model_paths)} model(s) in {elapsed:.1f}s on {args.workers} worker(s)")
+    if args.archive_dir:
+        print(f"{archived} of them from archived partitions in {args.archive_dir}")
+    else:
+        print("Archived transactions were not included (--archive-dir is empty)")
+    print(f"Cost = {args.fraud_cost:g} x missed fraud + {args.review_cost:g} x false alarm; "
+          f"risk bands > {RISK_BANDS[0]} / > {RISK_BANDS[1]}")
+    return {
+        "scored": scored, "labeled": labeled, "skipped": skipped,
+        "archived": archived if args.archive_dir else None,
+        "models": {name: _report(name, counts, thresholds, args) for name, counts in totals.items()},
+    }
+
+
+def _date(value: Optional[str]):
+    return pd.Timestamp(value).to_pydatetime() if value else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay stored transactions through model artifacts and score them against feedback"
+    )
+    parser.add_argument("models", nargs="*",
+                        help="Model artifacts (.joblib sklearn pipeline or .ubj/.json XGBoost); "
+                             "defaults to the active one")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Scoring processes")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="Transaction ids per chunk")
+    parser.add_argument("--archive-dir", default=settings.ARCHIVE_DIR,
+                        help="Cold-storage partitions to score too; empty for hot rows only")
+    parser.add_argument("--since", type=_date, help="Only transactions created on or after this date")
+    parser.add_argument("--until", type=_date, help="Only transactions created before this date")
+    parser.add_argument("--fraud-cost", type=float, default=10.0, help="Cost of one missed fraud")
+    parser.add_argument("--review-cost", type=float, default=1.0, help="Cost of one false alarm")
+    parser.add_argument("--step", type=float, default=0.05, help="Threshold step of the printed curves")
+    parser.add_argument("--json", help="Also write the full curves and band counts to this file")
+    args = parser.parse_args()
+
+    model_paths = args.models or [
+        settings.XGBOOST_MODEL_PATH if settings.MODEL_BACKEND == "xgboost" else MODEL_PATH
+    ]
+    for path in model_paths:
+        if not os.path.exists(path):
+            parser.error(f"Model artifact not found: {path}")
+
+    report = backtest(model_paths, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
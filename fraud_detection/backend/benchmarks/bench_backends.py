@@ -0,0 +1,116 @@
+"""Side-by-side comparison of the sklearn pipeline and the XGBoost backend.
+
+Compares artifact size, load time, single-row latency (the /fraud/predict
+path: encode one transaction, score it), batch throughput and held-out
+quality. The sklearn numbers use the pipeline at MODEL_PATH; the XGBoost
+booster is trained fresh with the production parameters into a temp dir.
+
+Run from backend/:  python -m benchmarks.bench_backends [--threads N]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+from app.ml import model_loader
+from app.ml.model_loader import FEATURE_NAMES, MODEL_PATH, THRESHOLD
+from app.ml.xgb_backend import XGBoostModel, train_xgboost_model
+
+
+def _timed(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def _latencies(score_one, rows) -> np.ndarray:
+    times = np.empty(len(rows))
+    for i, features in enumerate(rows):
+        start = time.perf_counter()
+        score_one(features)
+        times[i] = (time.perf_counter() - start) * 1000
+    return times
+
+
+def _fmt(value: float) -> str:
+    return f"{value:,.0f}" if value >= 1000 else f"{value:.4f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=1, help="XGBoost nthread for scoring")
+    parser.add_argument("--rows", type=int, default=2000, help="single-row requests to time")
+    parser.add_argument("--batch", type=int, default=100_000, help="rows per throughput batch")
+    args = parser.parse_args()
+
+    X_train, y_train = model_loader.generate_training_data()
+    start = time.perf_counter()
+    booster = train_xgboost_model(model_loader.preprocess_batch(X_train).to_numpy(), y_train, FEATURE_NAMES)
+    train_s = time.perf_counter() - start
+
+    tmp_dir = tempfile.mkdtemp()
+    xgb_path = os.path.join(tmp_dir, "fraud_model.ubj")
+    XGBoostModel(booster).save(xgb_path)
+
+    sklearn_model = joblib.load(MODEL_PATH)
+    xgb_model = XGBoostModel.load(xgb_path, nthread=args.threads)
+
+    results = {"sklearn": {}, "xgboost": {}}
+    results["sklearn"]["artifact size (KiB)"] = os.path.getsize(MODEL_PATH) / 1024
+    results["xgboost"]["artifact size (KiB)"] = os.path.getsize(xgb_path) / 1024
+    results["sklearn"]["load time (ms)"] = _timed(lambda: joblib.load(MODEL_PATH), 5)
+    results["xgboost"]["load time (ms)"] = _timed(lambda: XGBoostModel.load(xgb_path, args.threads), 5)
+
+    # Single-row latency, each backend through its request-path encoding
+    X_test, y_test = model_loader.generate_training_data(max(args.rows, 20000), seed=7)
+    rows = X_test.head(args.rows).to_dict("records")
+
+    def sklearn_one(features):
+        return sklearn_model.predict_proba(model_loader.preprocess_features(features))[0, 1]
+
+    def xgb_one(features):
+        return xgb_model.predict_proba([model_loader.encode_row(features)])[0, 1]
+
+    for name, score_one in (("sklearn", sklearn_one), ("xgboost", xgb_one)):
+        score_one(rows[0])
+        latencies = _latencies(score_one, rows)
+        results[name]["latency p50 (ms)"] = float(np.percentile(latencies, 50))
+        results[name]["latency p99 (ms)"] = float(np.percentile(latencies, 99))
+
+    # Batch throughput on already-encoded rows
+    batch = model_loader.preprocess_batch(
+        pd.concat([X_test] * (args.batch // len(X_test) + 1)).head(args.batch)
+    )
+    batch_np = batch.to_numpy(dtype=np.float32)
+    sklearn_ms = _timed(lambda: sklearn_model.predict_proba(batch), 3)
+    xgb_ms = _timed(lambda: xgb_model.predict_proba(batch_np), 3)
+    results["sklearn"]["throughput (rows/s)"] = args.batch / sklearn_ms * 1000
+    results["xgboost"]["throughput (rows/s)"] = args.batch / xgb_ms * 1000
+
+    # Held-out quality, so a faster model is not silently a worse one
+    encoded_test = model_loader.preprocess_batch(X_test)
+    sklearn_p = sklearn_model.predict_proba(encoded_test)[:, 1]
+    xgb_p = xgb_model.predict_proba(encoded_test.to_numpy())[:, 1]
+    results["sklearn"]["held-out AUC"] = roc_auc_score(y_test, sklearn_p)
+    results["xgboost"]["held-out AUC"] = roc_auc_score(y_test, xgb_p)
+    agreement = np.mean((sklearn_p >= THRESHOLD) == (xgb_p >= THRESHOLD))
+
+    print(f"XGBoost: hist training on {len(X_train)} rows took {train_s:.2f}s, scoring nthread={args.threads}\n")
+    print(f"{'':24}{'sklearn':>14}{'xgboost':>14}")
+    for metric in results["sklearn"]:
+        print(f"{metric:24}{_fmt(results['sklearn'][metric]):>14}{_fmt(results['xgboost'][metric]):>14}")
+    print(f"\nlabel agreement at threshold {THRESHOLD}: {agreement:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Overhead of per-prediction explanations versus plain scoring.
+
+Run from backend/:  python -m benchmarks.bench_explain
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.ml import model_loader
+from app.ml.model_loader import FEATURE_NAMES, preprocess_features
+
+
+def _time(fn, repeat: int) -> float:
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def main():
+    features = {"amount": 250.0, "merchant": "amazon", "category": "shopping", "hour": 3, "user_age": 22}
+    row = preprocess_features(features)[FEATURE_NAMES]
+
+    rng = np.random.default_rng(0)
+    batch = pd.DataFrame({
+        "amount": rng.exponential(100, 1000),
+        "merchant": rng.integers(0, 8, 1000),
+        "category": rng.integers(0, 6, 1000),
+        "hour": rng.integers(0, 24, 1000),
+        "user_age": rng.integers(18, 80, 1000),
+    })[FEATURE_NAMES]
+
+    build_start = time.perf_counter()
+    explainer = model_loader._get_explainer()
+    build_ms = (time.perf_counter() - build_start) * 1000
+
+    model = model_loader._model
+    probabilities, contributions = explainer.explain(batch)
+    error = np.abs(probabilities - model.predict_proba(batch)[:, 1]).max()
+
+    print(f"decomposition build (one-off): {build_ms:.1f} ms")
+    print(f"max |bias + sum(contrib) - predict_proba|: {error:.2e}")
+    for label, X, repeat in (("single row", row, 200), ("batch of 1000", batch, 20)):
+        score_ms = _time(lambda: model.predict_proba(X), repeat)
+        explain_ms = _time(lambda: explainer.explain(X), repeat)
+        print(
+            f"{label:>13}: score {score_ms:.2f} ms, explain {explain_ms:.2f} ms "
+            f"({explain_ms / score_ms:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Write throughput of the /fraud/predict write path versus shard count.
+
+Each writer process repeatedly picks a random user and does what a scored
+prediction does to the database: debit a credit, insert the transaction
+(firing the rollup, feedback, search and data-version triggers) and commit.
+SQLite serialises writers per file, so throughput should grow with the number
+of shards until disk or CPU is the limit; on a single core, expect gains only
+from less time spent waiting on locks.
+
+Run from backend/:  python -m benchmarks.bench_shards [--shards 1 2 4 8] [--writers 8]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app import data_versions, feedback, rollups, search
+from app.database import Base, make_engine, shard_index, upgrade_schema
+from app.ml.features import risk_band
+from app.models import User
+
+USERS = 1000
+
+_INSERT_TRANSACTION = text("""
+    INSERT INTO transactions (user_id, amount, merchant, category, hour, user_age, description,
+        is_fraud, fraud_probability, confidence_score, risk_level, created_at, processed_at)
+    VALUES (:user_id, :amount, 'amazon', 'shopping', :hour, 35, 'benchmark order',
+        :is_fraud, :probability, 0.5, :risk_level, :now, :now)
+""")
+
+
+def _url(directory: str, index: int, count: int) -> str:
+    return f"sqlite:///{os.path.join(directory, f'shard{index}-of-{count}.db')}"
+
+
+def _create_shards(directory: str, count: int):
+    engines = [make_engine(_url(directory, i, count)) for i in range(count)]
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        rollups.install(engine)
+        feedback.install(engine)
+        search.install(engine)
+        data_versions.install(engine)
+    now = datetime.utcnow()
+    for user_id in range(1, USERS + 1):
+        with engines[shard_index(user_id, count)].begin() as conn:
+            conn.execute(User.__table__.insert(), {
+                "id": user_id, "name": "bench", "email": f"bench{user_id}@example.com",
+                "username": f"bench{user_id}", "password_hash": "x", "credits": 10**9,
+                "last_credit_reset": now, "is_admin": False, "created_at": now,
+            })
+    for engine in engines:
+        engine.dispose()
+
+
+def _writer(directory: str, count: int, seconds: float, seed: int, results):
+    engines = [make_engine(_url(directory, i, count)) for i in range(count)]
+    rng = random.Random(seed)
+    commits = lock_errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        user_id = rng.randint(1, USERS)
+        probability = rng.random()
+        try:
+            with engines[shard_index(user_id, count)].begin() as conn:
+                conn.execute(text("UPDATE users SET credits = credits - 1 WHERE id = :id"), {"id": user_id})
+                conn.execute(_INSERT_TRANSACTION, {
+                    "user_id": user_id, "amount": rng.uniform(1, 500), "hour": rng.randrange(24),
+                    "is_fraud": probability >= 0.5, "probability": probability,
+                    "risk_level": risk_band(probability),
+                    "now": datetime.utcnow(),
+                })
+            commits += 1
+        except OperationalError:
+            # "database is locked" after the busy timeout
+            lock_errors += 1
+    results.put((commits, lock_errors))
+
+
+def _run(count: int, writers: int, seconds: float):
+    with tempfile.TemporaryDirectory() as directory:
+        _create_shards(directory, count)
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_writer, args=(directory, count, seconds, seed, results))
+            for seed in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        totals = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    return sum(c for c, _ in totals), sum(e for _, e in totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8], help="shard counts to compare")
+    parser.add_argument("--writers", type=int, default=8, help="concurrent writer processes")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each run")
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.seconds:.0f}s per run, {os.cpu_count()} CPUs\n")
+    print(f"{'shards':>6}{'commits/s':>12}{'speedup':>10}{'lock errors':>13}")
+    baseline = None
+    for count in args.shards:
+        commits, lock_errors = _run(count, args.writers, args.seconds)
+        rate = commits / args.seconds
+        baseline = baseline or rate
+        print(f"{count:>6}{rate:>12,.0f}{rate / baseline:>9.2f}x{lock_errors:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Offline recall/latency trade-off of cascade scoring versus the full forest.
+
+Scores a held-out synthetic sample with the full model and with the cascade
+at several uncertainty bands, then times the single-row path both ways.
+
+Run from backend/:  python -m benchmarks.eval_cascade
+"""
+import time
+
+import numpy as np
+
+from app.ml import model_loader
+from app.ml.model_loader import THRESHOLD
+
+BANDS = [(0.05, 0.95), (0.1, 0.9), (0.2, 0.8), (0.3, 0.7)]
+
+
+def _metrics(pred: np.ndarray, y: np.ndarray):
+    tp = np.sum(pred & (y == 1))
+    precision = tp / max(pred.sum(), 1)
+    recall = tp / max((y == 1).sum(), 1)
+    return precision, recall
+
+
+def main():
+    X, y = model_loader.generate_training_data(20000, seed=7)
+    encoded = model_loader.preprocess_batch(X)
+    screening = model_loader._load_screening_model()
+
+    full = model_loader._model.predict_proba(encoded)[:, 1]
+    screen = screening.predict_proba_batch(encoded.to_numpy(dtype=float))
+    full_pred = full >= THRESHOLD
+
+    precision, recall = _metrics(full_pred, y)
+    print(f"{'full forest':>12}: escalated 100.0%  precision {precision:.4f}  recall {recall:.4f}")
+    for low, high in BANDS:
+        band = (screen >= low) & (screen <= high)
+        pred = np.where(band, full, screen) >= THRESHOLD
+        precision, recall = _metrics(pred, y)
+        agreement = np.mean(pred == full_pred)
+        print(
+            f"{low:.2f}-{high:.2f}:  escalated {band.mean():6.1%}  precision {precision:.4f}  "
+            f"recall {recall:.4f}  agrees with forest {agreement:.4%}"
+        )
+
+    # Single-row latency: the API scores one transaction per request
+    rows = X.head(500).to_dict("records")
+    cascade_low, cascade_high = 0.1, 0.9
+
+    start = time.perf_counter()
+    for features in rows:
+        model_loader._full_model_proba(features)
+    full_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+    start = time.perf_counter()
+    escalated = 0
+    for features in rows:
+        p = screening.predict_proba(model_loader.encode_row(features))
+        if cascade_low <= p <= cascade_high:
+            escalated += 1
+            model_loader._full_model_proba(features)
+    cascade_ms = (time.perf_counter() - start) * 1000 / len(rows)
+
+    print(
+        f"\nmean latency per row: full {full_ms:.3f} ms, cascade {cascade_ms:.3f} ms "
+        f"({escalated / len(rows):.1%} escalated at {cascade_low}-{cascade_high})"
+    )
+
+
+if __name__ == "__main__":
+    main()
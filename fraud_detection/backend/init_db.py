@@ -1,26 +1,51 @@
 
+import argparse
 import os
+import time
 from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app.database import Base, engine, SessionLocal
+from app import sharding
+from app.database import Base, all_engines, engine, SessionLocal, session_for_user, shard_engines, shard_index, user_engines
+from app.ml.features import RISK_BANDS
 from app.models import User, Transaction
 from app.utils.hashing import hash_password
 
+# Password shared by all seeded users (bcrypt once, not once per user)
+SEED_PASSWORD = "Seed@1234"
+
+# Secondary indexes dropped during bulk load and rebuilt afterwards
+TRANSACTION_INDEXES = {
+    "ix_transactions_id": "CREATE INDEX IF NOT EXISTS ix_transactions_id ON transactions (id)",
+    "ix_transactions_user_id": "CREATE INDEX IF NOT EXISTS ix_transactions_user_id ON transactions (user_id)",
+    "ix_transactions_created_at": "CREATE INDEX IF NOT EXISTS ix_transactions_created_at ON transactions (created_at)",
+}
+
+TRANSACTION_COLUMNS = [
+    "user_id", "amount", "merchant", "category", "hour", "user_age", "description",
+    "is_fraud", "fraud_probability", "confidence_score", "risk_level", "model_version", "created_at", "processed_at"
+]
+
 def init_db():
     print("Creating database tables...")
     db = None
     try:
-        # Drop existing database file if it exists
-        db_path = os.path.join(os.path.dirname(__file__), "fraud_app.db")
-        try:
-            if os.path.exists(db_path):
-                os.remove(db_path)
-                print("Removed existing database.")
-        except PermissionError:
-            print("Warning: Could not remove existing database file. It may be in use.")
-        
+        # Drop existing database files if they exist (the ones the app is configured to use, shards included)
+        for target in all_engines():
+            db_path = target.url.database
+            try:
+                if os.path.exists(db_path):
+                    os.remove(db_path)
+                    print(f"Removed existing database {db_path}.")
+            except PermissionError:
+                print(f"Warning: Could not remove existing database file {db_path}. It may be in use.")
+
         # Create all tables
-        Base.metadata.create_all(bind=engine)
+        for target in all_engines():
+            Base.metadata.create_all(bind=target)
         print("Database tables created successfully!")
 
         # Create a new DB session
@@ -57,7 +82,18 @@ def init_db():
                     is_admin=user_data["is_admin"],
                     last_credit_reset=datetime.utcnow()
                 )
-                db.add(user)
+                if shard_engines:
+                    # Sharded: the directory assigns the id, the user lives in its shard
+                    user.id = sharding.register_user(db, user.email, user.username)
+                    db.commit()
+                    user_db = session_for_user(user.id)
+                    try:
+                        user_db.add(user)
+                        user_db.commit()
+                    finally:
+                        user_db.close()
+                else:
+                    db.add(user)
             
             db.commit()
             print("\nTest users created successfully:")
@@ -74,7 +110,209 @@ def init_db():
     except Exception as e:
         print(f"Error initializing database: {e}")
     finally:
-        db.close()
+        if db:
+            db.close()
+
+def _seed_users(directory, cursors: list, n_users: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Bulk insert synthetic users into their databases; return their ids, ages and activity weights
+
+    ``cursors`` has one cursor per user database (see user_engines()). When
+    sharded, ids come from the directory cursor and every user also gets a
+    directory entry.
+    """
+    password_hash = hash_password(SEED_PASSWORD)
+    id_table = "user_directory" if shard_engines else "users"
+    start_id = directory.execute(f"SELECT COALESCE(MAX(id), 0) FROM {id_table}").fetchone()[0] + 1
+    ids = np.arange(start_id, start_id + n_users)
+    now = datetime.utcnow().isoformat(sep=" ")
+
+    if shard_engines:
+        directory.executemany(
+            "INSERT INTO user_directory (id, email, username, created_at) VALUES (?, ?, ?, ?)",
+            ((int(i), f"seed{i}@example.com", f"seed{i}", now) for i in ids)
+        )
+    for index, cursor in enumerate(cursors):
+        cursor.executemany(
+            "INSERT INTO users (id, name, email, username, password_hash, credits, "
+            "last_credit_reset, is_admin, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+            (
+                (int(i), f"Seed User {i}", f"seed{i}@example.com", f"seed{i}", password_hash, 100, now, now)
+                for i in ids if not shard_engines or shard_index(int(i)) == index
+            )
+        )
+
+    return pd.DataFrame({
+        "id": ids,
+        # Skewed ages: most customers are 25-45
+        "age": np.clip(rng.normal(38, 12, n_users), 18, 90).astype(np.int64),
+        # A few heavy users produce most of the traffic
+        "weight": rng.lognormal(0, 1.2, n_users),
+    })
+
+def _transaction_chunk(users: pd.DataFrame, size: int, days: int, rng: np.random.Generator) -> list:
+    """Generate, score and format one chunk of transactions as executemany rows"""
+    from app.ml import model_loader
+
+    weights = users["weight"].to_numpy() / users["weight"].sum()
+    who = rng.choice(len(users), size=size, p=weights)
+
+    # Daytime-heavy hour-of-day profile
+    hour_profile = np.array([1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 9, 10, 9, 8, 8, 8, 9, 9, 8, 6, 4, 3, 2], dtype=float)
+
+    frame = pd.DataFrame({
+        "amount": np.round(rng.exponential(100, size), 2),
+        "merchant": rng.choice(model_loader.MERCHANTS, size),
+        "category": rng.choice(model_loader.CATEGORIES, size),
+        "hour": rng.choice(24, size=size, p=hour_profile / hour_profile.sum()),
+        "user_age": users["age"].to_numpy()[who],
+    })
+    probabilities = model_loader.predict_proba_batch(frame)
+
+    # Spread over the last `days` days at the generated hour
+    now = np.datetime64(datetime.utcnow(), "s")
+    day_offsets = rng.integers(0, days, size).astype("timedelta64[D]")
+    created = (now.astype("datetime64[D]") - day_offsets) + frame["hour"].to_numpy().astype("timedelta64[h]") \
+        + rng.integers(0, 3600, size).astype("timedelta64[s]")
+    created = np.minimum(created, now)
+    created_at = np.char.replace(np.datetime_as_string(created.astype("datetime64[us]")), "T", " ")
+
+    risk_level = np.select(
+        [probabilities > RISK_BANDS[1], probabilities > RISK_BANDS[0]], ["HIGH", "MEDIUM"], default="LOW"
+    )
+    columns = [
+        users["id"].to_numpy()[who].tolist(),
+        frame["amount"].tolist(),
+        frame["merchant"].tolist(),
+        frame["category"].tolist(),
+        frame["hour"].tolist(),
+        frame["user_age"].tolist(),
+        [None] * size,
+        (probabilities >= model_loader.THRESHOLD).tolist(),
+        probabilities.tolist(),
+        probabilities.tolist(),
+        risk_level.tolist(),
+        [model_loader.MODEL_VERSION] * size,
+        created_at.tolist(),
+        created_at.tolist(),
+    ]
+    return list(zip(*columns))
+
+def _prepare_bulk_load(cursor):
+    """Fast, non-durable settings with secondary indexes and per-row triggers dropped"""
+    from app import data_versions, search
+
+    # Seeding is restartable from scratch, so trade durability for speed
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA journal_mode = MEMORY")
+    cursor.execute("PRAGMA cache_size = -262144")
+
+    for name in TRANSACTION_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_transactions_rollup")
+    for name in [*search.TRIGGERS, *data_versions.TRIGGERS]:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+def _finish_bulk_load(target):
+    """Rebuild what the dropped triggers would have maintained, then restore them"""
+    from app import data_versions, rollups, search
+
+    with target.begin() as conn:
+        rollups.rebuild(conn)
+        conn.execute(text("ANALYZE"))
+    # Restores the insert trigger and compacts the rebuilt hourly buckets
+    rollups.install(target)
+
+    search.install(target)
+    with target.begin() as conn:
+        search.rebuild(conn)
+        search.optimize(conn)
+
+    # Restore the version triggers; rows loaded without them invalidate every ETag
+    data_versions.install(target)
+    with target.begin() as conn:
+        data_versions.bump_all(conn)
+
+def seed(n_users: int, n_transactions: int, days: int = 90, chunk_size: int = 200_000, seed: int = 42):
+    """Bulk-load synthetic users and model-scored transactions.
+
+    Rows go in through executemany in large transactions with the secondary
+    indexes and per-row triggers dropped; indexes, rollups and the full-text
+    index are rebuilt in one pass at the end. When sharded, every user and
+    their transactions go to the user's shard and transaction ids come from
+    the directory's id blocks, as they do for API writes.
+    """
+    rng = np.random.default_rng(seed)
+    targets = user_engines()
+    for target in all_engines():
+        Base.metadata.create_all(bind=target)
+    transaction_ids = sharding.IdAllocator("transactions", chunk_size)
+
+    raws = [target.raw_connection() for target in targets]
+    # Sharded users get their ids (and a login entry) from the directory
+    directory = engine.raw_connection() if shard_engines else raws[0]
+    try:
+        cursors = [raw.cursor() for raw in raws]
+        for raw, cursor in zip(raws, cursors):
+            _prepare_bulk_load(cursor)
+            raw.commit()
+
+        start = time.perf_counter()
+        users = _seed_users(directory.cursor(), cursors, n_users, rng)
+        for raw in {directory, *raws}:
+            raw.commit()
+        print(f"Inserted {n_users} users in {time.perf_counter() - start:.1f}s")
+
+        columns = ["id", *TRANSACTION_COLUMNS] if shard_engines else TRANSACTION_COLUMNS
+        insert_sql = (
+            f"INSERT INTO transactions ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        done = 0
+        while done < n_transactions:
+            size = min(chunk_size, n_transactions - done)
+            rows = _transaction_chunk(users, size, days, rng)
+            if shard_engines:
+                by_shard = [[] for _ in targets]
+                for transaction_id, row in zip(transaction_ids.take(size), rows):
+                    by_shard[shard_index(row[0])].append((transaction_id, *row))
+            else:
+                by_shard = [rows]
+            for raw, cursor, shard_rows in zip(raws, cursors, by_shard):
+                cursor.executemany(insert_sql, shard_rows)
+                raw.commit()
+            done += size
+            rate = done / (time.perf_counter() - start)
+            print(f"Inserted {done}/{n_transactions} transactions ({rate:,.0f} rows/s)")
+
+        print("Building indexes...")
+        for raw, cursor in zip(raws, cursors):
+            for ddl in TRANSACTION_INDEXES.values():
+                cursor.execute(ddl)
+            raw.commit()
+    finally:
+        for raw in raws:
+            raw.close()
+        if shard_engines:
+            directory.close()
+
+    print("Rebuilding analytics rollups, full-text search index and data versions...")
+    for target in targets:
+        _finish_bulk_load(target)
+    print(f"Seeding finished in {time.perf_counter() - start:.1f}s. Seeded users log in with password {SEED_PASSWORD}")
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Reset the database and optionally bulk-seed synthetic data")
+    parser.add_argument("--users", type=int, default=0, help="Number of synthetic users to seed")
+    parser.add_argument("--transactions", type=int, default=0, help="Number of synthetic transactions to seed")
+    parser.add_argument("--days", type=int, default=90, help="Spread transactions over this many past days")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="Rows per executemany transaction")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument("--keep", action="store_true", help="Seed into the existing database instead of resetting it")
+    args = parser.parse_args()
+
+    if not args.keep:
+        init_db()
+    if args.transactions and not args.users:
+        parser.error("--transactions needs --users")
+    if args.users:
+        seed(args.users, args.transactions, args.days, args.chunk_size, args.seed)
\ No newline at end of file
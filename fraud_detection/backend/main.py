@@ -1,17 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Response, Request
 import os
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import Base, engine
+from app import data_versions, feedback, rollups, search, write_behind
+from app.ml.drift import monitor as drift_monitor
+from app.database import Base, all_engines, upgrade_schema
 from app.routers.auth_routes import router as auth_router
 from app.routers.user_routes import router as user_router
 from app.routers.fraud_routes import router as fraud_router
 from app.routers.admin_routes import router as admin_router
 
-# create DB tables on startup
-Base.metadata.create_all(bind=engine)
+# create DB tables on startup (in every user shard too, when sharding is on)
+for engine in all_engines():
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    rollups.install(engine)
+    feedback.install(engine)
+    search.install(engine)
+    data_versions.install(engine)
 
-app = FastAPI(title="Fraud Detection Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Replay any journaled rows left by a crash before serving traffic
+    if write_behind.writer:
+        write_behind.writer.start()
+    yield
+    # Flush queued rows on shutdown
+    if write_behind.writer:
+        write_behind.writer.close()
+    drift_monitor.publish()
+
+app = FastAPI(title="Fraud Detection Backend", lifespan=lifespan)
 
 @app.middleware("http")
 async def allow_head_as_get(request: Request, call_next):
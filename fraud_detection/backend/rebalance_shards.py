@@ -0,0 +1,133 @@
+import argparse
+import os
+import time
+from collections import defaultdict
+
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import Engine
+
+from app import data_versions, feedback, rollups, search
+from app.config import settings
+from app.database import Base, engine, make_engine, shard_index, shard_url, upgrade_schema
+from app.models import CreditPurchase, IdempotencyKey, Transaction, User, UserDirectory
+
+# Tables owned by a user, with the column that decides their shard. Only
+# transaction ids are globally unique (directory id blocks); the others are
+# shard-local and get fresh ids in their new shard.
+SHARDED_TABLES = [
+    (User.__table__, "id", True),
+    (Transaction.__table__, "user_id", True),
+    (CreditPurchase.__table__, "user_id", False),
+    (IdempotencyKey.__table__, "user_id", False),
+]
+
+
+def _shard_path(index: int, count: int) -> str:
+    return settings.SHARD_PATH_TEMPLATE.format(index=index, count=count)
+
+
+def _copy_table(sources, targets, table, key: str, keep_ids: bool, chunk_size: int) -> int:
+    """Stream every row of table from the sources into its target shard."""
+    columns = [column for column in table.c if keep_ids or column.name != "id"]
+    copied = 0
+    for source in sources:
+        with source.connect() as conn:
+            result = conn.execution_options(yield_per=chunk_size).execute(select(*columns))
+            for rows in result.mappings().partitions():
+                by_shard = defaultdict(list)
+                for row in rows:
+                    by_shard[shard_index(row[key], len(targets))].append(dict(row))
+                for index, shard_rows in by_shard.items():
+                    with targets[index].begin() as target:
+                        target.execute(table.insert(), shard_rows)
+                copied += len(rows)
+    return copied
+
+
+def _sync_directory(sources, directory: Engine):
+    """Make sure every user is in the directory and id blocks start past existing ids."""
+    max_transaction_id = 0
+    with directory.begin() as conn:
+        for source in sources:
+            with source.connect() as src:
+                for rows in src.execution_options(yield_per=5000).execute(
+                    select(User.id, User.email, User.username, User.created_at)
+                ).mappings().partitions():
+                    conn.execute(
+                        UserDirectory.__table__.insert().prefix_with("OR IGNORE"), [dict(row) for row in rows]
+                    )
+                max_transaction_id = max(
+                    max_transaction_id, src.execute(select(func.max(Transaction.id))).scalar() or 0
+                )
+        conn.execute(text(
+            "INSERT INTO id_blocks (name, next_id) VALUES ('transactions', :next_id) "
+            "ON CONFLICT(name) DO UPDATE SET next_id = MAX(next_id, excluded.next_id)"
+        ), {"next_id": max_transaction_id + 1})
+
+
+def rebalance(from_count: int, to_count: int, chunk_size: int = 5000, force: bool = False):
+    """Copy users and their rows from the current layout into to_count new shards.
+
+    from_count=0 reads the unsharded database. Sources are brought up to the
+    current schema (as at API startup) but otherwise only read, so the old
+    layout stays usable until SHARD_COUNT is switched; run with the API stopped.
+    """
+    if from_count == to_count:
+        raise SystemExit("Source and target shard counts are the same")
+
+    sources = [engine] if from_count == 0 else [
+        make_engine(shard_url(i, from_count)) for i in range(from_count)
+    ]
+    for i in range(to_count):
+        path = _shard_path(i, to_count)
+        if os.path.exists(path):
+            if not force:
+                raise SystemExit(f"{path} already exists, pass --force to overwrite it")
+            os.remove(path)
+    targets = [make_engine(shard_url(i, to_count)) for i in range(to_count)]
+
+    start = time.perf_counter()
+    for source in {engine, *sources}:
+        Base.metadata.create_all(bind=source)
+        upgrade_schema(source)
+    for target in targets:
+        # Triggers are installed after the copy, so derived tables are built in one pass
+        Base.metadata.create_all(bind=target)
+        upgrade_schema(target)
+
+    print("Updating user directory and id blocks...")
+    _sync_directory(sources, engine)
+
+    for table, key, keep_ids in SHARDED_TABLES:
+        copied = _copy_table(sources, targets, table, key, keep_ids, chunk_size)
+        print(f"Copied {copied} rows of {table.name}")
+
+    print("Building rollups, feedback counters, search index and data versions...")
+    for target in targets:
+        rollups.install(target)
+        feedback.install(target)
+        search.install(target)
+        data_versions.install(target)
+        with target.begin() as conn:
+            conn.execute(text("ANALYZE"))
+
+    for i, target in enumerate(targets):
+        with target.connect() as conn:
+            users = conn.execute(select(func.count()).select_from(User.__table__)).scalar()
+            transactions = conn.execute(select(func.count()).select_from(Transaction.__table__)).scalar()
+        print(f"  {_shard_path(i, to_count)}: {users} users, {transactions} transactions")
+    print(f"Rebalanced in {time.perf_counter() - start:.1f}s. Set SHARD_COUNT={to_count} and restart the API.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redistribute users across a new number of SQLite shards")
+    parser.add_argument("--to", type=int, required=True, dest="to_count", help="Target shard count")
+    parser.add_argument("--from", type=int, default=settings.SHARD_COUNT, dest="from_count",
+                        help="Current shard count (0 = the unsharded database)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows read per batch")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing target shard files")
+    args = parser.parse_args()
+
+    if args.to_count < 1:
+        parser.error("--to must be at least 1")
+    rebalance(args.from_count, args.to_count, args.chunk_size, args.force)
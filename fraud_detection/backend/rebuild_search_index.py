@@ -0,0 +1,39 @@
+import argparse
+import time
+
+from app import search
+from app.database import Base, user_engines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill or rebuild the full-text transaction search index")
+    parser.add_argument("--check", action="store_true", help="Only verify the index against the transactions table")
+    parser.add_argument("--no-optimize", action="store_true", help="Skip merging index segments after the rebuild")
+    args = parser.parse_args()
+
+    # Each shard has its own transactions table and index
+    engines = user_engines()
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+        # Creates the index and sync triggers if this database predates them
+        search.install(engine)
+
+    if args.check:
+        for engine in engines:
+            with engine.begin() as conn:
+                search.integrity_check(conn)
+        print("Search index is consistent with transactions.")
+        return
+
+    print("Rebuilding search index from transactions...")
+    start = time.perf_counter()
+    for engine in engines:
+        with engine.begin() as conn:
+            search.rebuild(conn)
+            if not args.no_optimize:
+                search.optimize(conn)
+    print(f"Search index rebuilt in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+import logging
+
+from app.config import settings
+from app.ml.inference_server import InferenceServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the local inference sidecar for the API workers")
+    parser.add_argument("--socket", default=settings.INFERENCE_SOCKET_PATH or "inference.sock",
+                        help="Unix socket path; point INFERENCE_SOCKET_PATH of the API at it")
+    parser.add_argument("--workers", type=int, default=settings.INFERENCE_WORKERS,
+                        help="Scoring processes, each holding one model copy")
+    parser.add_argument("--batch-max-rows", type=int, default=settings.INFERENCE_BATCH_MAX_ROWS,
+                        help="Rows coalesced into one model call")
+    parser.add_argument("--batch-wait-ms", type=float, default=settings.INFERENCE_BATCH_WAIT_MS,
+                        help="How long a batch waits to fill")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    server = InferenceServer(args.socket, args.workers, args.batch_max_rows, args.batch_wait_ms / 1000)
+    asyncio.run(server.serve())
+
+
+if __name__ == "__main__":
+    main()
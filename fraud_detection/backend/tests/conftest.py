@@ -0,0 +1,95 @@
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime
+
+import pytest
+
+# Settings are read when app modules are imported, so the test configuration
+# goes into the environment first: a throwaway main database, no limits and
+# every optional subsystem off unless a test switches it on itself.
+_tmp_dir = tempfile.mkdtemp(prefix="fraud-tests-")
+os.environ.update({
+    "SQLALCHEMY_DATABASE_URL": f"sqlite:///{_tmp_dir}/test.db",
+    "ARCHIVE_DIR": os.path.join(_tmp_dir, "archive"),
+    "RATE_LIMIT_ENABLED": "false",
+    "WRITE_BEHIND_ENABLED": "false",
+    "CASCADE_ENABLED": "false",
+    "SHARD_COUNT": "0",
+    "INFERENCE_SOCKET_PATH": "",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402  creates the schema, triggers and loads the model
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.models import User  # noqa: E402
+from app.utils.hashing import hash_password  # noqa: E402
+
+PASSWORD = "Passw0rd!"
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture
+def tx():
+    """A valid /fraud/predict body."""
+    return {
+        "amount": 250.0,
+        "merchant": "amazon",
+        "category": "shopping",
+        "hour": 3,
+        "user_age": 22,
+        "description": "late night laptop",
+    }
+
+
+@pytest.fixture
+def make_user():
+    """Factory for users with unique logins, committed to db (the main database by default)."""
+    def make(db=None, credits: int = 1000, is_admin: bool = False) -> User:
+        session = db or SessionLocal()
+        name = f"u{uuid.uuid4().hex[:12]}"
+        user = User(
+            name=name, email=f"{name}@example.com", username=name, password_hash=hash_password(PASSWORD),
+            credits=credits, is_admin=is_admin, last_credit_reset=datetime.utcnow()
+        )
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        if db is None:
+            session.expunge(user)
+            session.close()
+        return user
+    return make
+
+
+@pytest.fixture
+def login(client):
+    """Factory for a user's Authorization header."""
+    def headers(user) -> dict:
+        response = client.post("/auth/login", json={"email": user.email, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+    return headers
+
+
+@pytest.fixture
+def transaction_row():
+    """Factory for the column values of a scored Transaction, as the predict route builds them."""
+    def row(user_id: int, **overrides) -> dict:
+        now = datetime.utcnow()
+        values = dict(
+            user_id=user_id, amount=12.5, merchant="amazon", category="food", hour=12, user_age=30,
+            description=None, is_fraud=False, fraud_probability=0.1, confidence_score=0.1, risk_level="LOW",
+            model_version="test", created_at=now, processed_at=now
+        )
+        values.update(overrides)
+        return values
+    return row
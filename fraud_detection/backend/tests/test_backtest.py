@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+import backtest
+from app.database import Base, make_engine
+from app.models import Transaction
+
+
+def _counts(p, fraud, labeled):
+    """_score_chunk's histograms for stored probabilities, built the same way."""
+    thresholds = backtest._thresholds()
+    counts = backtest._empty_counts(len(thresholds))
+    above = np.searchsorted(thresholds, p, side="right")
+    counts["fraud"] += np.bincount(above[labeled & fraud], minlength=len(thresholds) + 1)
+    counts["legit"] += np.bincount(above[labeled & ~fraud], minlength=len(thresholds) + 1)
+    return counts
+
+
+def test_thresholds_cover_every_percent_and_the_live_threshold():
+    thresholds = backtest._thresholds()
+
+    assert thresholds[0] == 0.0 and thresholds[-1] == 1.0
+    assert len(thresholds) == 101
+    assert np.all(np.diff(thresholds) > 0)
+
+
+def test_curve_matches_brute_force():
+    rng = np.random.default_rng(7)
+    thresholds = backtest._thresholds()
+    # Include probabilities sitting exactly on thresholds: p >= t is flagged
+    p = np.concatenate([rng.random(500), thresholds[::7]])
+    fraud = rng.random(len(p)) < 0.3
+    labeled = rng.random(len(p)) < 0.8
+
+    curve = backtest._curve(_counts(p, fraud, labeled), fraud_cost=100.0, review_cost=5.0)
+
+    for k, t in enumerate(thresholds):
+        flagged = labeled & (p >= t)
+        tp = int((flagged & fraud).sum())
+        fp = int((flagged & ~fraud).sum())
+        fn = int((labeled & fraud & (p < t)).sum())
+        assert (curve["tp"][k], curve["fp"][k], curve["fn"][k]) == (tp, fp, fn)
+        assert curve["precision"][k] == pytest.approx(tp / (tp + fp) if tp + fp else 0.0)
+        assert curve["recall"][k] == pytest.approx(tp / (tp + fn) if tp + fn else 0.0)
+        assert curve["cost"][k] == 100.0 * fn + 5.0 * fp
+
+
+def test_curve_without_labels_is_all_zero():
+    counts = backtest._empty_counts(len(backtest._thresholds()))
+
+    curve = backtest._curve(counts, fraud_cost=100.0, review_cost=5.0)
+
+    assert not curve["tp"].any() and not curve["fp"].any() and not curve["fn"].any()
+    assert not curve["precision"].any() and not curve["recall"].any()
+
+
+def test_score_chunk_reads_an_id_range(tmp_path, transaction_row):
+    url = f"sqlite:///{tmp_path}/backtest.db"
+    engine = make_engine(url)
+    Base.metadata.create_all(bind=engine)
+    rows = [
+        # (is_fraud, fraud_probability, feedback_correct, merchant)
+        (True, 0.9, True, "amazon"),      # confirmed fraud, HIGH
+        (True, 0.5, False, "amazon"),     # flagged but legit, MEDIUM
+        (False, 0.2, False, "walmart"),   # missed fraud, LOW
+        (False, 0.1, True, "walmart"),    # confirmed legit, LOW
+        (False, 0.4, None, "target"),     # unlabelled, MEDIUM
+        (True, 0.95, True, "unknown"),    # skipped: unknown merchant
+        (False, 0.3, True, "amazon"),     # outside the id range
+    ]
+    with engine.begin() as conn:
+        conn.execute(Transaction.__table__.insert(), [
+            transaction_row(1, id=i + 1, is_fraud=is_fraud, fraud_probability=p, feedback_correct=correct,
+                            merchant=merchant, category="shopping")
+            for i, (is_fraud, p, correct, merchant) in enumerate(rows)
+        ])
+    engine.dispose()
+    backtest._init_worker([], None, None)
+
+    kind, scored, labeled, skipped, results = backtest._score_chunk((backtest.HOT, url, 1, len(rows)))
+
+    assert (kind, scored, labeled, skipped) == (backtest.HOT, 5, 4, 1)
+    assert list(results) == [backtest.STORED]
+    counts = results[backtest.STORED]
+    expected = _counts(
+        np.array([0.9, 0.5, 0.2, 0.1]), fraud=np.array([True, False, True, False]), labeled=np.ones(4, dtype=bool)
+    )
+    assert np.array_equal(counts["fraud"], expected["fraud"])
+    assert np.array_equal(counts["legit"], expected["legit"])
+    assert counts["bands"].tolist() == [2, 2, 1]
+    assert counts["band_labeled"].tolist() == [2, 1, 1]
+    assert counts["band_fraud"].tolist() == [1, 0, 1]
+
+    curve = backtest._curve(counts, fraud_cost=100.0, review_cost=5.0)
+    live = int(np.searchsorted(backtest._thresholds(), 0.5))
+    assert (curve["tp"][live], curve["fp"][live], curve["fn"][live]) == (1, 1, 1)
+    assert curve["cost"][live] == 105.0
@@ -0,0 +1,106 @@
+import uuid
+
+from sqlalchemy import text
+
+from app import feedback
+from app.database import SessionLocal, engine
+from app.models import Transaction
+
+
+def _transactions(make_user, transaction_row, *rows):
+    """(is_fraud, risk_level) rows of one user under a model version no other test uses."""
+    user = make_user()
+    version = f"test-{uuid.uuid4().hex[:8]}"
+    db = SessionLocal()
+    try:
+        created = [
+            Transaction(**transaction_row(user.id, is_fraud=is_fraud, risk_level=level, model_version=version))
+            for is_fraud, level in rows
+        ]
+        db.add_all(created)
+        db.commit()
+        return user, version, [t.id for t in created]
+    finally:
+        db.close()
+
+
+def _metrics(client, login, make_user, version):
+    admin = make_user(is_admin=True)
+    response = client.get("/admin/feedback/metrics", headers=login(admin))
+    assert response.status_code == 200
+    return response.json()["models"][version]
+
+
+def test_counters_follow_labels(client, login, make_user, transaction_row):
+    user, version, ids = _transactions(
+        make_user, transaction_row, (True, "HIGH"), (True, "HIGH"), (False, "LOW"), (False, "LOW")
+    )
+    headers = login(user)
+    for transaction_id, correct in zip(ids, (True, False, True, False)):
+        response = client.post(
+            f"/user/transactions/{transaction_id}/feedback", json={"feedback_correct": correct}, headers=headers
+        )
+        assert response.status_code == 200
+
+    metrics = _metrics(client, login, make_user, version)
+    overall = metrics["overall"]
+    assert (overall["true_positives"], overall["false_positives"]) == (1, 1)
+    assert (overall["true_negatives"], overall["false_negatives"]) == (1, 1)
+    assert overall["labelled"] == 4
+    assert overall["precision"] == 0.5
+    assert metrics["risk_levels"]["HIGH"]["labelled"] == 2
+
+
+def test_relabelling_moves_the_row_between_cells(client, login, make_user, transaction_row):
+    user, version, (transaction_id,) = _transactions(make_user, transaction_row, (True, "HIGH"))
+    headers = login(user)
+    for correct in (True, True, False):
+        client.post(f"/user/transactions/{transaction_id}/feedback", json={"feedback_correct": correct}, headers=headers)
+
+    overall = _metrics(client, login, make_user, version)["overall"]
+    assert overall["true_positives"] == 0
+    assert overall["false_positives"] == 1
+    assert overall["labelled"] == 1
+
+
+def test_bulk_feedback_reports_ids_it_cannot_label(client, login, make_user, transaction_row):
+    user, version, ids = _transactions(make_user, transaction_row, (False, "LOW"), (False, "LOW"))
+    _, _, (foreign_id,) = _transactions(make_user, transaction_row, (False, "LOW"))
+    items = [{"transaction_id": i, "feedback_correct": True} for i in ids + [foreign_id, 10 ** 9]]
+    # Repeated ids count once; the last label wins
+    items.append({"transaction_id": ids[0], "feedback_correct": False})
+
+    response = client.post("/user/transactions/feedback/bulk", json={"items": items}, headers=login(user))
+
+    assert response.json() == {"updated": 2, "not_found": [foreign_id, 10 ** 9]}
+    overall = _metrics(client, login, make_user, version)["overall"]
+    assert (overall["true_negatives"], overall["false_negatives"]) == (1, 1)
+
+
+def test_admin_labels_any_transaction(client, login, make_user, transaction_row):
+    _, version, (transaction_id,) = _transactions(make_user, transaction_row, (True, "MEDIUM"))
+    admin = make_user(is_admin=True)
+
+    response = client.post(
+        f"/user/transactions/{transaction_id}/feedback", json={"feedback_correct": True}, headers=login(admin)
+    )
+
+    assert response.status_code == 200
+    assert _metrics(client, login, make_user, version)["overall"]["true_positives"] == 1
+
+
+def test_rebuild_matches_the_trigger_counts(client, login, make_user, transaction_row):
+    user, _, ids = _transactions(make_user, transaction_row, (True, "HIGH"), (False, "LOW"), (False, "MEDIUM"))
+    client.post(
+        "/user/transactions/feedback/bulk",
+        json={"items": [{"transaction_id": i, "feedback_correct": i != ids[1]} for i in ids]},
+        headers=login(user)
+    )
+    query = text("SELECT * FROM feedback_counters ORDER BY model_version, risk_level")
+
+    with engine.begin() as conn:
+        maintained = conn.execute(query).all()
+        feedback.rebuild(conn)
+        rebuilt = conn.execute(query).all()
+
+    assert rebuilt == maintained
@@ -0,0 +1,133 @@
+import json
+from datetime import datetime, timedelta
+
+from app import idempotency, write_behind
+from app.database import SessionLocal
+from app.models import IdempotencyKey, Transaction, User
+
+
+def _balance(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(User, user_id).credits
+    finally:
+        db.close()
+
+
+def _transaction_count(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(Transaction).filter(Transaction.user_id == user_id).count()
+    finally:
+        db.close()
+
+
+def test_predict_retry_replays_the_stored_response(client, make_user, login, tx):
+    user = make_user(credits=100)
+    headers = {**login(user), "Idempotency-Key": "predict-1"}
+
+    first = client.post("/fraud/predict", json=tx, headers=headers)
+    retry = client.post("/fraud/predict", json=tx, headers=headers)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.json() == first.json()
+    assert _transaction_count(user.id) == 1
+    assert _balance(user.id) == 90
+
+
+def test_key_reused_with_a_different_body_is_rejected(client, make_user, login, tx):
+    user = make_user(credits=100)
+    headers = {**login(user), "Idempotency-Key": "predict-2"}
+
+    assert client.post("/fraud/predict", json=tx, headers=headers).status_code == 200
+    conflict = client.post("/fraud/predict", json={**tx, "amount": 1.0}, headers=headers)
+
+    assert conflict.status_code == 422
+    assert _transaction_count(user.id) == 1
+    assert _balance(user.id) == 90
+
+
+def test_keys_are_scoped_per_user_and_endpoint(client, make_user, login, tx):
+    alice, bob = make_user(credits=100), make_user(credits=100)
+
+    for user in (alice, bob):
+        response = client.post("/fraud/predict", json=tx, headers={**login(user), "Idempotency-Key": "shared"})
+        assert "Idempotent-Replayed" not in response.headers
+    purchase = client.post(
+        "/fraud/credits/purchase", json={"amount": 5}, headers={**login(alice), "Idempotency-Key": "shared"}
+    )
+
+    assert purchase.status_code == 200
+    assert "Idempotent-Replayed" not in purchase.headers
+    assert _balance(alice.id) == 90 + 100
+    assert _balance(bob.id) == 90
+
+
+def test_credit_purchase_retry_credits_once(client, make_user, login):
+    user = make_user(credits=0)
+    headers = {**login(user), "Idempotency-Key": "purchase-1"}
+
+    first = client.post("/fraud/credits/purchase", json={"amount": 5}, headers=headers)
+    retry = client.post("/fraud/credits/purchase", json={"amount": 5}, headers=headers)
+
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert _balance(user.id) == 100
+
+
+def test_expired_key_is_freed(client, make_user, login, tx):
+    user = make_user(credits=100)
+    db = SessionLocal()
+    db.add(IdempotencyKey(
+        user_id=user.id, scope="predict", key="old", request_hash="something else", status_code=200,
+        response="{}", created_at=datetime.utcnow() - timedelta(days=30)
+    ))
+    db.commit()
+    db.close()
+
+    response = client.post("/fraud/predict", json=tx, headers={**login(user), "Idempotency-Key": "old"})
+
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    assert _transaction_count(user.id) == 1
+
+
+class _PendingKeys:
+    """Stands in for the write-behind writer's journaled, uncommitted keys."""
+
+    def __init__(self, record):
+        self.record = record
+
+    def pending_idempotency(self, user_id, scope, key):
+        return self.record
+
+
+def test_pending_write_behind_key_replays(monkeypatch, make_user):
+    user = make_user()
+    record = idempotency.record(user.id, "predict", "k", "hash", {"ok": True})
+    monkeypatch.setattr(write_behind, "writer", _PendingKeys(record))
+
+    db = SessionLocal()
+    try:
+        replay = idempotency.lookup(db, user.id, "predict", "k", "hash")
+    finally:
+        db.close()
+
+    assert replay.status_code == 200
+    assert json.loads(replay.body) == {"ok": True}
+
+
+def test_expired_pending_write_behind_key_is_ignored(monkeypatch, make_user):
+    user = make_user()
+    record = idempotency.record(user.id, "predict", "k", "hash", {"ok": True})
+    record["created_at"] = datetime.utcnow() - timedelta(days=30)
+    monkeypatch.setattr(write_behind, "writer", _PendingKeys(record))
+
+    db = SessionLocal()
+    try:
+        assert idempotency.lookup(db, user.id, "predict", "k", "other hash") is None
+        db.commit()
+    finally:
+        db.close()
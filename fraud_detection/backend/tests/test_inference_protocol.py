@@ -0,0 +1,75 @@
+import socket
+import struct
+import threading
+
+import pytest
+
+from app.ml import inference_protocol as protocol
+
+
+def test_header_roundtrip():
+    message = protocol.pack(protocol.OP_EXPLAIN, 2 ** 32 - 1, b"payload", flags=3)
+
+    header, payload = message[:protocol.HEADER.size], message[protocol.HEADER.size:]
+
+    assert protocol.HEADER.size == 10
+    assert protocol.unpack_header(header) == (protocol.OP_EXPLAIN, 3, 2 ** 32 - 1, len(b"payload"))
+    assert payload == b"payload"
+
+
+def test_oversized_payload_is_rejected():
+    header = protocol.HEADER.pack(protocol.OP_PREDICT, 0, 1, protocol.MAX_PAYLOAD + 1)
+
+    with pytest.raises(protocol.ProtocolError):
+        protocol.unpack_header(header)
+    largest = protocol.HEADER.pack(protocol.OP_PREDICT, 0, 1, protocol.MAX_PAYLOAD)
+    assert protocol.unpack_header(largest)[3] == protocol.MAX_PAYLOAD
+
+
+def test_float_rows_are_little_endian_doubles():
+    rows = [[1.5, -2.0, 0.0, 1e300, 3.25], [0.1, 0.2, 0.3, 0.4, 0.5]]
+
+    payload = protocol.pack_rows(rows)
+
+    assert len(payload) == 8 * protocol.N_FEATURES * len(rows)
+    assert payload[:8] == struct.pack("<d", 1.5)
+    assert protocol.unpack_floats(payload) == [value for row in rows for value in row]
+    assert protocol.unpack_floats(b"") == []
+
+
+def test_misaligned_float_payload_is_rejected():
+    with pytest.raises(protocol.ProtocolError):
+        protocol.unpack_floats(protocol.pack_floats([1.0]) + b"\x00")
+
+
+def test_recv_exactly_reassembles_chunked_sends():
+    message = protocol.pack(protocol.STATUS_OK, 7, protocol.pack_floats([0.25, 0.75]))
+    left, right = socket.socketpair()
+
+    def send_in_pieces():
+        for i in range(0, len(message), 3):
+            right.sendall(message[i:i + 3])
+
+    sender = threading.Thread(target=send_in_pieces)
+    sender.start()
+    try:
+        status, _, request_id, length = protocol.unpack_header(protocol.recv_exactly(left, protocol.HEADER.size))
+        values = protocol.unpack_floats(protocol.recv_exactly(left, length))
+    finally:
+        sender.join()
+        left.close()
+        right.close()
+
+    assert (status, request_id, values) == (protocol.STATUS_OK, 7, [0.25, 0.75])
+
+
+def test_recv_exactly_raises_when_the_peer_closes_mid_message():
+    left, right = socket.socketpair()
+    right.sendall(protocol.pack(protocol.STATUS_OK, 1, b"1234")[:6])
+    right.close()
+
+    try:
+        with pytest.raises(ConnectionError):
+            protocol.recv_exactly(left, protocol.HEADER.size)
+    finally:
+        left.close()
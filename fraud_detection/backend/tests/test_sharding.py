@@ -0,0 +1,138 @@
+import uuid
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import data_versions, database, feedback, rollups, search
+from app.config import settings
+from app.database import Base, SessionLocal, make_engine, shard_index, upgrade_schema
+from app.models import Transaction, User, UserDirectory
+
+SHARDS = 2
+
+
+@pytest.fixture
+def shards(monkeypatch, tmp_path):
+    """Switch the app to two user shards in temp files for the duration of a test.
+
+    The engine lists are filled in place because the routers and ``sharding``
+    hold references to them from import time.
+    """
+    engines = [make_engine(f"sqlite:///{tmp_path}/shard-{i}.db") for i in range(SHARDS)]
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        rollups.install(engine)
+        feedback.install(engine)
+        search.install(engine)
+        data_versions.install(engine)
+
+    monkeypatch.setattr(settings, "SHARD_COUNT", SHARDS)
+    monkeypatch.setattr(database.shard_index, "__defaults__", (SHARDS,))
+    database.shard_engines[:] = engines
+    database.ShardSessions[:] = [
+        sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in engines
+    ]
+    yield engines
+    database.shard_engines.clear()
+    database.ShardSessions.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+def _register(client, is_admin: bool = False):
+    """Register through the API; returns (user id, Authorization header)."""
+    name = f"s{uuid.uuid4().hex[:12]}"
+    response = client.post("/auth/register", json={
+        "name": name, "email": f"{name}@example.com", "username": name, "password": "Passw0rd!"
+    })
+    assert response.status_code == 200, response.text
+    user_id = response.json()["user"]["id"]
+    if is_admin:
+        with database.session_for_user(user_id) as db:
+            db.get(User, user_id).is_admin = True
+            db.commit()
+    login = client.post("/auth/login", json={"email": f"{name}@example.com", "password": "Passw0rd!"})
+    assert login.status_code == 200
+    return user_id, {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+
+def _holders(user_id: int):
+    """Indexes of the shards that have a row for this user."""
+    holders = []
+    for i, Session_ in enumerate(database.ShardSessions):
+        with Session_() as db:
+            if db.get(User, user_id) is not None:
+                holders.append(i)
+    return holders
+
+
+def _users_in_shards(client, wanted=SHARDS):
+    """Register users until every shard holds one; returns them in shard order."""
+    by_shard = {}
+    while len(by_shard) < wanted:
+        user_id, headers = _register(client)
+        by_shard.setdefault(shard_index(user_id), (user_id, headers))
+    return [by_shard[i] for i in range(wanted)]
+
+
+def test_register_writes_the_directory_and_one_shard(client, shards):
+    for index, (user_id, headers) in enumerate(_users_in_shards(client)):
+        assert _holders(user_id) == [index]
+        with SessionLocal() as db:
+            assert db.get(UserDirectory, user_id) is not None
+        profile = client.get("/user/me", headers=headers)
+        assert profile.status_code == 200
+        assert profile.json()["id"] == user_id
+
+
+def test_predict_writes_to_the_users_shard(client, shards, tx):
+    users = _users_in_shards(client)
+    ids = []
+    for user_id, headers in users:
+        response = client.post("/fraud/predict", json=tx, headers=headers)
+        assert response.status_code == 200
+        ids.append(response.json()["transaction"]["id"])
+
+    assert len(set(ids)) == len(ids)
+    for (user_id, _), transaction_id, Session_ in zip(users, ids, database.ShardSessions):
+        with Session_() as db:
+            transaction = db.get(Transaction, transaction_id)
+            assert transaction.user_id == user_id
+            assert db.get(User, user_id).credits == 90
+    for other, Session_ in zip(reversed(ids), database.ShardSessions):
+        with Session_() as db:
+            assert db.get(Transaction, other) is None
+
+
+def test_admin_feedback_reaches_every_shard(client, shards, tx):
+    users = _users_in_shards(client)
+    ids = [
+        client.post("/fraud/predict", json=tx, headers=headers).json()["transaction"]["id"]
+        for _, headers in users
+    ]
+    _, admin = _register(client, is_admin=True)
+
+    single = client.post(f"/user/transactions/{ids[0]}/feedback", json={"feedback_correct": True}, headers=admin)
+    bulk = client.post("/user/transactions/feedback/bulk", headers=admin, json={
+        "items": [{"transaction_id": i, "feedback_correct": False} for i in ids + [10 ** 9]]
+    })
+
+    assert single.status_code == 200
+    assert bulk.json() == {"updated": len(ids), "not_found": [10 ** 9]}
+    for transaction_id, Session_ in zip(ids, database.ShardSessions):
+        with Session_() as db:
+            assert db.get(Transaction, transaction_id).feedback_correct is False
+    metrics = client.get("/admin/feedback/metrics", headers=admin).json()
+    assert sum(model["overall"]["labelled"] for model in metrics["models"].values()) == len(ids)
+
+
+def test_users_cannot_label_other_shards(client, shards, tx):
+    (owner, owner_headers), (_, other_headers) = _users_in_shards(client)
+    transaction_id = client.post("/fraud/predict", json=tx, headers=owner_headers).json()["transaction"]["id"]
+
+    response = client.post(
+        f"/user/transactions/{transaction_id}/feedback", json={"feedback_correct": True}, headers=other_headers
+    )
+
+    assert response.status_code == 404
@@ -0,0 +1,130 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app.database import SessionLocal, engine
+from app.models import Transaction, User
+from app.write_behind import WriteBehindWriter, worker_journal_path
+
+
+@pytest.fixture
+def writer(tmp_path):
+    writers = []
+
+    def start(**kwargs) -> WriteBehindWriter:
+        w = WriteBehindWriter(str(tmp_path / "write_behind.journal"), flush_interval=0.01, **kwargs)
+        w.start()
+        writers.append(w)
+        return w
+
+    yield start
+    for w in writers:
+        w.close()
+
+
+def _credits(user_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.get(User, user_id).credits
+    finally:
+        db.close()
+
+
+def _transactions(user_id: int) -> list:
+    db = SessionLocal()
+    try:
+        return db.query(Transaction).filter(Transaction.user_id == user_id).order_by(Transaction.id).all()
+    finally:
+        db.close()
+
+
+def _journal_record(seq: int, row: dict, debit: int = 10) -> str:
+    encoded = {k: v.isoformat() if hasattr(v, "isoformat") else v for k, v in row.items()}
+    return json.dumps({"seq": seq, "row": encoded, "debit": debit}) + "\n"
+
+
+def test_group_commit_inserts_rows_and_debits_credits(writer, make_user, transaction_row):
+    user = make_user(credits=100)
+    w = writer()
+
+    w.submit_many([transaction_row(user.id, amount=a) for a in (1.0, 2.0, 3.0)], debit_per_row=10)
+    w.flush()
+
+    assert [t.amount for t in _transactions(user.id)] == [1.0, 2.0, 3.0]
+    assert _credits(user.id) == 70
+    assert w.pending_debits(user.id) == 0
+
+
+def test_pending_debits_count_until_committed(writer, make_user, transaction_row):
+    user = make_user(credits=100)
+    w = writer()
+    # Hold the writer thread back so the rows stay queued
+    with w._cond:
+        w.submit(transaction_row(user.id), debit=10)
+        w.submit(transaction_row(user.id), debit=10)
+        assert w.pending_debits(user.id) == 20
+    w.flush()
+    assert w.pending_debits(user.id) == 0
+    assert _credits(user.id) == 80
+
+
+def test_debit_never_takes_credits_below_zero(writer, make_user, transaction_row):
+    # Another worker approved against the same balance: the rows land, the balance stops at zero
+    user = make_user(credits=15)
+    w = writer()
+
+    w.submit(transaction_row(user.id), debit=10)
+    w.flush()
+    w.submit(transaction_row(user.id), debit=10)
+    w.flush()
+
+    assert len(_transactions(user.id)) == 2
+    assert _credits(user.id) == 0
+
+
+def test_orphaned_journal_is_replayed_once(tmp_path, writer, make_user, transaction_row):
+    user = make_user(credits=100)
+    base = str(tmp_path / "write_behind.journal")
+    # A worker that died with three journaled rows, the first two already committed
+    orphan = worker_journal_path(base, 999999)
+    with open(orphan, "w") as f:
+        for seq in (1, 2, 3):
+            f.write(_journal_record(seq, transaction_row(user.id, amount=float(seq))))
+        f.write('{"seq": 4, "row": {"user_')  # torn final write, never acknowledged
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS write_behind_checkpoints (journal VARCHAR(255) PRIMARY KEY, seq INTEGER NOT NULL)"
+        ))
+        conn.execute(text("INSERT INTO write_behind_checkpoints (journal, seq) VALUES (:journal, 2)"),
+                     {"journal": orphan})
+
+    writer().close()
+
+    assert [t.amount for t in _transactions(user.id)] == [3.0]
+    assert _credits(user.id) == 90
+    assert not (tmp_path / "write_behind.999999.journal").exists()
+
+    # Starting again finds nothing left to replay
+    writer()
+    assert len(_transactions(user.id)) == 1
+
+
+def test_failing_row_is_dead_lettered_without_blocking_the_batch(writer, make_user, transaction_row):
+    user = make_user(credits=100)
+    w = writer()
+
+    w.submit_many([
+        transaction_row(user.id, amount=1.0),
+        transaction_row(user.id, amount=None),  # NOT NULL violation
+        transaction_row(user.id, amount=3.0),
+    ])
+    w.flush()
+
+    assert [t.amount for t in _transactions(user.id)] == [1.0, 3.0]
+    with engine.connect() as conn:
+        dead = conn.execute(
+            text("SELECT row FROM write_behind_dead_letters WHERE journal = :journal"), {"journal": w.journal_path}
+        ).scalars().all()
+    assert len(dead) == 1
+    assert json.loads(dead[0])["row"]["amount"] is None